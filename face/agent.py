@@ -21,9 +21,9 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional, Callable, Union
 
-from events import EventDispatcher
+from events import EventDispatcher, EventLogger
 from face_tracker import (
-    FaceTracker, FaceDatabase, EmotionDetector, FaceEvent, FaceEventType,
+    FaceTracker, FaceEvent, FaceEventType, build_from_config,
 )
 import numpy as np
 from voice_input import VoiceInput, AudioMonitor, ContinuousListener, EchoDetector
@@ -152,6 +152,7 @@ class Agent:
         self.voice_out = voice_output
         self.memory = memory
         self.llm = llm
+        self.memory.summarizer = llm.summarize_dialogue
 
         self._greeting_cooldown = greeting_cooldown_s
         self._ask_cooldown = ask_name_cooldown_s
@@ -186,9 +187,18 @@ class Agent:
 
         # Event system
         self._dispatcher = EventDispatcher(owner="agent")
-
-        # Subscribe to face events
-        self.tracker.subscribe(self._on_face_event)
+        self._event_log = EventLogger(logger)
+
+        # Subscribe to face events. Delivered on the dispatcher's worker
+        # thread so memory updates and greetings never stall the camera
+        # loop. A full queue blocks the tracker (without a timeout) rather
+        # than dropping: a lost FACE_DISAPPEARED or FACE_ENROLLED would
+        # leave memory with a ghost track or an unregistered person.
+        self._unsub_face = self.tracker.subscribe(
+            self._on_face_event,
+            event_types={FaceEventType.FACE_APPEARED, FaceEventType.FACE_DISAPPEARED,
+                         FaceEventType.IDENTITY_CONFIRMED, FaceEventType.FACE_ENROLLED},
+            mode="async", max_queue=256, overflow="block", block_timeout=None)
 
         # Watchdog: force-clears stale _busy, dumps thread stacks, and
         # resumes the listener. Runs every 5s on a daemon thread.
@@ -230,8 +240,8 @@ class Agent:
                 logger.warning(f"[WATCHDOG] resume failed: {e}")
 
     def subscribe(self, callback: AgentEventCallback,
-                  event_types: Optional[set] = None) -> Callable[[], None]:
-        return self._dispatcher.subscribe(callback, event_types)
+                  event_types: Optional[set] = None, **delivery) -> Callable[[], None]:
+        return self._dispatcher.subscribe(callback, event_types, **delivery)
 
     # --- Control ---
 
@@ -247,13 +257,22 @@ class Agent:
     def stop(self):
         """Stop continuous listening and clean up."""
         self._watchdog_stop.set()
+        self._unsub_face()
         if self._listener:
             self._listener.stop()
             # Cancel any blocking listen() so the thread exits promptly
             self.voice_in._cancel_listen = True
             self._listener = None
-        self.llm.stop()
         self.memory.save_all()
+        if not self.memory.flush():
+            logger.warning("Some people records could not be written")
+        st = self.memory.flush_stats
+        logger.info(f"People memory: {st['saves']} saves in {st['writes']} writes, "
+                    f"flush avg {st['avg_ms']:.1f} ms, max {st['max_ms']:.1f} ms")
+        self.memory.close()
+        self.llm.stop()
+        self._dispatcher.close()
+        self.tracker.db.close()
         logger.info("Agent stopped")
 
     @property
@@ -755,7 +774,7 @@ class Agent:
 
     def _emit(self, etype, payload):
         event = AgentEvent(type=etype, timestamp=time.time(), payload=payload)
-        logger.info(f"[{etype.name}] {payload}")
+        self._event_log.log(etype, payload)
         self._dispatcher.dispatch(event)
 
 
@@ -835,6 +854,8 @@ def main():
     parser = argparse.ArgumentParser(description="Standalone agent")
     parser.add_argument("--db-dir", default=os.path.join(_SOURCE_DIR, "known_faces"))
     parser.add_argument("--people-dir", default=os.path.join(_SOURCE_DIR, "people"))
+    parser.add_argument("--people-backend", choices=["json", "sqlite"], default="json",
+                        help="People memory storage: JSON files or SQLite/WAL (see people_store.py)")
     parser.add_argument("--camera", type=int, default=0)
     parser.add_argument("--fps", type=int, default=15)
     parser.add_argument("--no-auto-ask", action="store_true")
@@ -861,13 +882,13 @@ def main():
                         datefmt="%H:%M:%S")
 
     # Initialize all components
-    face_db = FaceDatabase(db_dir=args.db_dir)
-    face_db.load()
-    emotion_detector = EmotionDetector()
-    from face_config import get_tracker_config
-    _tc = get_tracker_config()
-    tracker = FaceTracker(db=face_db, emotion_detector=emotion_detector,
-                          max_missing_seconds=_tc.get("max_missing_seconds", 3.0))
+    tracker = build_from_config(args.db_dir)
+    face_db = tracker.db
+    from face_config import get_metrics_config
+    from metrics import start_exporters
+    _mc = get_metrics_config()
+    metrics_exporters = start_exporters(tracker.stage_metrics, _mc.get("port", 0),
+                                        _mc.get("jsonl", ""), _mc.get("interval_s", 10.0))
 
     voice_in = VoiceInput()
     voice_out = VoiceOutput(model_name=args.en_voice)
@@ -881,7 +902,7 @@ def main():
         print(f"ERROR: {voice_out.load_error}", file=sys.stderr)
         sys.exit(1)
 
-    memory = PeopleMemory(storage_dir=args.people_dir)
+    memory = PeopleMemory(storage_dir=args.people_dir, backend=args.people_backend)
     memory.load()
 
     from mcp_client import load_servers
@@ -1044,6 +1065,8 @@ def main():
     print("\nShutting down...")
     try:
         agent.stop()
+        for exporter in metrics_exporters:
+            exporter.close()
         monitor.stop()
         cap.release()
         cv2.destroyAllWindows()
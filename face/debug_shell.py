@@ -117,6 +117,8 @@ def run_shell(mem: PeopleMemory, agent: Optional[object] = None):
             if agent and hasattr(agent, 'stop'):
                 print("Shutting down agent...")
                 agent.stop()
+            else:
+                mem.flush()
             import os
             os._exit(0)
         elif cmd == "help":
@@ -212,8 +214,7 @@ def run_shell(mem: PeopleMemory, agent: Optional[object] = None):
                 person = find(name)
                 if person:
                     n = len(person.asked_topics)
-                    person.asked_topics = []
-                    mem._save(person)
+                    mem.reset_topics(person.persistent_id)
                     print(f"Cleared {n} asked topic(s) for {name}")
         elif cmd == "add-fact" and len(parts) >= 3:
             if find(parts[1]):
@@ -334,6 +335,10 @@ def run_shell(mem: PeopleMemory, agent: Optional[object] = None):
                       f"emotion={focus.emotion}")
             else:
                 print(f"  focus:       (none)")
+            ps = agent.tracker.db.persistence_stats
+            print(f"  db_writes:   depth={ps['depth']} max_depth={ps['max_depth']} "
+                  f"flush avg={ps['avg_flush_ms']:.1f}ms max={ps['max_flush_ms']:.1f}ms "
+                  f"errors={ps['errors']}")
 
             print("--- Greeted ---")
             greeted = getattr(agent, "_greeted", {})
@@ -0,0 +1,161 @@
+"""
+Compressed, append-only archive of old dialogue lines.
+
+``PeopleMemory`` keeps only a hot window of recent dialogue per person;
+entries that fall out of it are appended here. Each person gets a
+directory of gzip segments plus a small manifest:
+
+    {root}/{person_id}/segments.json     [{file, count, bytes, first_ts, last_ts}, ...]
+    {root}/{person_id}/000001.jsonl.gz   one JSON entry per line
+    {root}/{person_id}/000002.jsonl.gz   ...
+
+Every ``append`` adds one gzip member to the newest segment (gzip readers
+concatenate members) and starts a new segment once it holds
+``segment_size`` entries, so nothing already written is rewritten. The
+manifest records each segment's byte length; a segment that grew past it
+(crash between the data write and the manifest write) is truncated back
+before the next append. Entries not newer than the last archived
+timestamp are skipped, which makes re-archiving after such a crash
+harmless.
+
+Can be run standalone:
+    python dialogue_archive.py [--dir people/archive] PERSON_ID [--offset 0] [--limit 20]
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("dialogue_archive")
+
+MANIFEST = "segments.json"
+
+
+class DialogueArchive:
+    """Per-person gzip segments of dialogue dicts (``DialogueEntry.to_dict()``)."""
+
+    def __init__(self, root: str, segment_size: int = 1000):
+        self.root = root
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+
+    def _dir(self, person_id: str) -> str:
+        return os.path.join(self.root, person_id)
+
+    def _manifest(self, person_id: str) -> list:
+        try:
+            with open(os.path.join(self._dir(person_id), MANIFEST), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _write_manifest(self, person_id: str, segments: list):
+        path = os.path.join(self._dir(person_id), MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(segments, f)
+        os.replace(path + ".tmp", path)
+
+    # --- Writes ---
+
+    def append(self, person_id: str, entries: list) -> int:
+        """Archive ``entries`` (oldest first). Returns how many were written."""
+        with self._lock:
+            segments = self._manifest(person_id)
+            last_ts = segments[-1]["last_ts"] if segments else float("-inf")
+            entries = [e for e in entries if e.get("timestamp", 0.0) > last_ts]
+            if not entries:
+                return 0
+            os.makedirs(self._dir(person_id), exist_ok=True)
+            pos = 0
+            while pos < len(entries):
+                if not segments or segments[-1]["count"] >= self.segment_size:
+                    segments.append({"file": f"{len(segments) + 1:06d}.jsonl.gz",
+                                     "count": 0, "bytes": 0,
+                                     "first_ts": entries[pos].get("timestamp", 0.0),
+                                     "last_ts": 0.0})
+                seg = segments[-1]
+                chunk = entries[pos:pos + self.segment_size - seg["count"]]
+                path = os.path.join(self._dir(person_id), seg["file"])
+                if os.path.exists(path) and os.path.getsize(path) != seg["bytes"]:
+                    logger.warning(f"Truncating {path} to its last recorded size")
+                    with open(path, "r+b") as f:
+                        f.truncate(seg["bytes"])
+                data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in chunk)
+                with open(path, "ab") as f:
+                    f.write(gzip.compress(data.encode("utf-8")))
+                seg["count"] += len(chunk)
+                seg["bytes"] = os.path.getsize(path)
+                seg["last_ts"] = chunk[-1].get("timestamp", 0.0)
+                pos += len(chunk)
+            self._write_manifest(person_id, segments)
+            return len(entries)
+
+    def delete(self, person_id: str) -> bool:
+        with self._lock:
+            path = self._dir(person_id)
+            if not os.path.isdir(path):
+                return False
+            shutil.rmtree(path)
+            return True
+
+    # --- Reads ---
+
+    def count(self, person_id: str) -> int:
+        """Number of archived entries for ``person_id``."""
+        with self._lock:
+            return sum(s["count"] for s in self._manifest(person_id))
+
+    def read(self, person_id: str, offset: int = 0, limit: int = 50) -> list:
+        """Up to ``limit`` entries ending ``offset`` entries before the newest
+        archived one, oldest first. Only the segments covering that range
+        are decompressed."""
+        with self._lock:
+            segments = self._manifest(person_id)
+            total = sum(s["count"] for s in segments)
+            end = total - offset
+            start = max(0, end - limit)
+            if end <= 0 or limit <= 0:
+                return []
+            out, seg_start = [], 0
+            for seg in segments:
+                seg_end = seg_start + seg["count"]
+                if seg_end > start and seg_start < end:
+                    with gzip.open(os.path.join(self._dir(person_id), seg["file"]), "rt",
+                                   encoding="utf-8") as f:
+                        lines = f.read().splitlines()[:seg["count"]]
+                    lo, hi = max(start, seg_start) - seg_start, min(end, seg_end) - seg_start
+                    out.extend(json.loads(line) for line in lines[lo:hi])
+                seg_start = seg_end
+            return out
+
+
+# ---------------------------------------------------------------------------
+# Standalone
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Page through archived dialogue")
+    parser.add_argument("person_id")
+    parser.add_argument("--dir", default=os.path.join("people", "archive"),
+                        help="Archive directory")
+    parser.add_argument("--offset", type=int, default=0,
+                        help="Entries to skip back from the newest archived one")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    archive = DialogueArchive(args.dir)
+    entries = archive.read(args.person_id, args.offset, args.limit)
+    print(f"{args.person_id}: {archive.count(args.person_id)} archived entries, "
+          f"showing {len(entries)}")
+    for e in entries:
+        ts = datetime.fromtimestamp(e.get("timestamp", 0.0)).strftime("%Y-%m-%d %H:%M")
+        print(f"  [{ts}] {e.get('speaker', '?')}: {e.get('text', '')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,67 +5,359 @@ Provides a thread-safe publish/subscribe system. Any module can create
 an EventDispatcher, and consumers subscribe with a callback + optional
 event type filter.
 
+By default callbacks run synchronously on the producer's thread (the
+camera loop for FaceTracker, the audio threads for voice). A subscriber
+can opt into asynchronous delivery instead: events go into a bounded
+per-subscription queue drained by its own worker thread, so a slow
+consumer never adds latency to the producer. When the queue is full the
+``overflow`` policy decides what happens:
+
+    drop_oldest   discard the oldest queued event (default)
+    coalesce      drop the oldest queued event of the same type, else the
+                  oldest overall — consumers see the newest state per type
+    block         wait up to ``block_timeout`` for room, then drop the event
+                  (with a warning); ``block_timeout=None`` waits for as
+                  long as it takes, so nothing is ever dropped
+
 Usage:
     dispatcher = EventDispatcher()
     unsub = dispatcher.subscribe(my_callback, event_types={MyEventType.FOO})
+    unsub2 = dispatcher.subscribe(slow_ui, mode="async", overflow="coalesce")
     dispatcher.dispatch(some_event)
-    unsub()  # unsubscribe
+    dispatcher.stats()  # per-subscriber latency, queue depth, drops
+    unsub()  # unsubscribe (async workers drain their queue first)
+
+``EventLogger`` is the producers' log line for each event: rendered only
+when the record is emitted, with optional per-type sampling and rate
+limits.
 """
 
+import collections
 import logging
 import threading
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from typing import Any, Callable, Optional
 
 logger = logging.getLogger(__name__)
 
 EventCallback = Callable[[Any], None]
 
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "block")
+
 
 @dataclass
 class _Subscription:
     callback: EventCallback
     event_types: Optional[set]
+    delivery: Optional["_AsyncDelivery"] = None
+    # Sync-mode callback timing (async deliveries keep their own).
+    calls: int = field(default=0, repr=False)
+    total_ms: float = field(default=0.0, repr=False)
+    max_ms: float = field(default=0.0, repr=False)
+
+    @property
+    def name(self) -> str:
+        cb = self.callback
+        return getattr(cb, "__qualname__", None) or repr(cb)
+
+
+class _AsyncDelivery:
+    """Bounded queue + worker thread for one asynchronous subscription."""
+
+    def __init__(self, sub: _Subscription, owner: str, max_queue: int,
+                 overflow: str, block_timeout: Optional[float]):
+        self._sub = sub
+        self._owner = owner
+        self.max_queue = max(1, max_queue)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue: collections.deque = collections.deque()   # (event, enqueued_at)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {"delivered": 0, "dropped": 0, "coalesced": 0, "max_depth": 0,
+                      "total_lag_ms": 0.0, "max_lag_ms": 0.0,
+                      "total_callback_ms": 0.0, "max_callback_ms": 0.0}
+        self._thread = threading.Thread(
+            target=self._run, daemon=True,
+            name=f"events-{owner or 'dispatcher'}-{sub.name}")
+        self._thread.start()
+
+    def put(self, event):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) >= self.max_queue:
+                if self.overflow == "block":
+                    if self.block_timeout is None:
+                        while len(self._queue) >= self.max_queue and not self._closed:
+                            self._cond.wait()
+                    else:
+                        deadline = time.monotonic() + self.block_timeout
+                        while len(self._queue) >= self.max_queue and not self._closed:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0 or not self._cond.wait(remaining):
+                                break
+                    if self._closed:
+                        return
+                    if len(self._queue) >= self.max_queue:
+                        self.stats["dropped"] += 1
+                        owner = f" ({self._owner})" if self._owner else ""
+                        logger.warning(f"Event queue of {self._sub.name}{owner} still full "
+                                       f"after {self.block_timeout}s; dropped {event.type.name}")
+                        return
+                elif self.overflow == "coalesce" and self._coalesce(event):
+                    pass
+                else:
+                    self._queue.popleft()
+                    self.stats["dropped"] += 1
+            self._queue.append((event, time.monotonic()))
+            self.stats["max_depth"] = max(self.stats["max_depth"], len(self._queue))
+            self._cond.notify_all()
+
+    def _coalesce(self, event) -> bool:
+        """Drop the oldest queued event of the same type to make room, so
+        per-type order is kept. Caller holds the lock."""
+        for i, (queued, _) in enumerate(self._queue):
+            if queued.type == event.type:
+                del self._queue[i]
+                self.stats["coalesced"] += 1
+                return True
+        return False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                event, enqueued_at = self._queue.popleft()
+                self._cond.notify_all()   # room for a blocked producer
+            start = time.monotonic()
+            try:
+                self._sub.callback(event)
+            except Exception:
+                owner = f" ({self._owner})" if self._owner else ""
+                logger.exception(f"Exception in async event callback{owner} for {event.type.name}")
+            done = time.monotonic()
+            lag_ms = (start - enqueued_at) * 1000
+            cb_ms = (done - start) * 1000
+            with self._cond:
+                s = self.stats
+                s["delivered"] += 1
+                s["total_lag_ms"] += lag_ms
+                s["max_lag_ms"] = max(s["max_lag_ms"], lag_ms)
+                s["total_callback_ms"] += cb_ms
+                s["max_callback_ms"] = max(s["max_callback_ms"], cb_ms)
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def close(self, timeout: float = 2.0):
+        """Deliver what is queued, then stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+
+class _Snapshot:
+    """Immutable subscriber list plus a per-event-type cache of the
+    subscribers that match it. Replaced wholesale on every (un)subscribe,
+    so ``dispatch`` reads it without taking the lock."""
+
+    __slots__ = ("subs", "by_type")
+
+    def __init__(self, subs: tuple = ()):
+        self.subs = subs
+        self.by_type: dict = {}
+
+    def matching(self, etype) -> tuple:
+        subs = self.by_type.get(etype)
+        if subs is None:
+            subs = tuple(s for s in self.subs
+                         if s.event_types is None or etype in s.event_types)
+            self.by_type[etype] = subs
+        return subs
 
 
 class EventDispatcher:
-    """Thread-safe event dispatcher with optional type filtering."""
+    """Thread-safe event dispatcher with optional type filtering.
+
+    Subscriptions are copy-on-write: ``dispatch`` takes no lock and, after
+    the first event of each type, looks up its subscribers in one dict.
+    """
 
     def __init__(self, owner: str = ""):
-        self._subs: list[_Subscription] = []
-        self._lock = threading.Lock()
+        self._snapshot = _Snapshot()
+        self._lock = threading.Lock()   # serialises writers only
         self._owner = owner  # for log messages
 
     def subscribe(self, callback: EventCallback,
-                  event_types: Optional[set] = None) -> Callable[[], None]:
-        """Subscribe to events. Returns an unsubscribe function."""
-        sub = _Subscription(callback=callback, event_types=event_types)
+                  event_types: Optional[set] = None,
+                  mode: str = "sync", max_queue: int = 64,
+                  overflow: str = "drop_oldest",
+                  block_timeout: Optional[float] = 0.1) -> Callable[[], None]:
+        """Subscribe to events. Returns an unsubscribe function.
+
+        ``mode="async"`` delivers on a dedicated worker thread through a
+        queue of ``max_queue`` events; ``overflow`` is one of
+        ``OVERFLOW_POLICIES`` and ``block_timeout`` bounds how long
+        ``"block"`` may stall the producer (``None``: no bound, never drop).
+        """
+        if mode not in ("sync", "async"):
+            raise ValueError(f"unknown delivery mode {mode!r} (expected 'sync' or 'async')")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {overflow!r} "
+                             f"(expected one of {OVERFLOW_POLICIES})")
+        sub = _Subscription(callback=callback,
+                            event_types=frozenset(event_types) if event_types is not None else None)
+        if mode == "async":
+            sub.delivery = _AsyncDelivery(sub, self._owner, max_queue, overflow, block_timeout)
         with self._lock:
-            self._subs.append(sub)
+            self._snapshot = _Snapshot(self._snapshot.subs + (sub,))
 
         def _unsub():
             with self._lock:
-                try:
-                    self._subs.remove(sub)
-                except ValueError:
-                    pass
+                subs = self._snapshot.subs
+                if sub not in subs:
+                    return
+                self._snapshot = _Snapshot(tuple(s for s in subs if s is not sub))
+            if sub.delivery is not None:
+                sub.delivery.close()
         return _unsub
 
     def unsubscribe(self, callback: EventCallback) -> bool:
         """Remove all subscriptions for a given callback. Returns True if any were removed."""
         with self._lock:
-            before = len(self._subs)
-            self._subs = [s for s in self._subs if s.callback is not callback]
-            return len(self._subs) < before
+            subs = self._snapshot.subs
+            removed = [s for s in subs if s.callback is callback]
+            if removed:
+                self._snapshot = _Snapshot(tuple(s for s in subs if s.callback is not callback))
+        for s in removed:
+            if s.delivery is not None:
+                s.delivery.close()
+        return bool(removed)
+
+    def has_subscribers(self, etype) -> bool:
+        """True if an event of ``etype`` would reach anyone."""
+        return bool(self._snapshot.matching(etype))
 
     def dispatch(self, event):
         """Send an event to all matching subscribers."""
+        for sub in self._snapshot.matching(event.type):
+            if sub.delivery is not None:
+                sub.delivery.put(event)
+                continue
+            start = time.monotonic()
+            try:
+                sub.callback(event)
+            except Exception:
+                owner = f" ({self._owner})" if self._owner else ""
+                logger.exception(f"Exception in event callback{owner} for {event.type.name}")
+            ms = (time.monotonic() - start) * 1000
+            sub.calls += 1
+            sub.total_ms += ms
+            if ms > sub.max_ms:
+                sub.max_ms = ms
+
+    def stats(self) -> list[dict]:
+        """Per-subscriber delivery stats.
+
+        Sync subscribers report callback time (which the producer pays);
+        async ones also report queue depth, lag from dispatch to callback
+        start, and dropped/coalesced events.
+        """
+        out = []
+        for sub in self._snapshot.subs:
+            d = sub.delivery
+            if d is None:
+                out.append({"subscriber": sub.name, "mode": "sync", "delivered": sub.calls,
+                            "avg_callback_ms": sub.total_ms / sub.calls if sub.calls else 0.0,
+                            "max_callback_ms": sub.max_ms})
+                continue
+            with d._cond:
+                s = dict(d.stats)
+            n = s.pop("delivered")
+            total_lag, total_cb = s.pop("total_lag_ms"), s.pop("total_callback_ms")
+            out.append({"subscriber": sub.name, "mode": "async", "overflow": d.overflow,
+                        "depth": d.depth, "max_queue": d.max_queue, "delivered": n,
+                        "avg_lag_ms": total_lag / n if n else 0.0,
+                        "avg_callback_ms": total_cb / n if n else 0.0, **s})
+        return out
+
+    def close(self):
+        """Drain and stop every async subscription. Sync ones stay subscribed."""
         with self._lock:
-            subs = list(self._subs)
-        for sub in subs:
-            if sub.event_types is None or event.type in sub.event_types:
-                try:
-                    sub.callback(event)
-                except Exception:
-                    owner = f" ({self._owner})" if self._owner else ""
-                    logger.exception(f"Exception in event callback{owner} for {event.type.name}")
+            subs = self._snapshot.subs
+            deliveries = [s.delivery for s in subs if s.delivery is not None]
+            self._snapshot = _Snapshot(tuple(s for s in subs if s.delivery is None))
+        for d in deliveries:
+            d.close()
+
+
+# ---------------------------------------------------------------------------
+# Event logging
+# ---------------------------------------------------------------------------
+
+class EventLogger:
+    """Lazily rendered, rate-limited log lines for dispatched events.
+
+    Producers used to format every payload into an f-string before
+    dispatching, even with INFO disabled. ``log`` returns immediately when
+    the level is off, and otherwise passes the payload as a ``%s``
+    argument, so its repr is only built if a handler actually emits the
+    record. The record also carries ``event_type``, ``track_id`` and
+    ``payload`` attributes for structured handlers.
+
+    Per event type name:
+        sample      log only every Nth event (``{"EMOTION_CHANGED": 5}``)
+        rate_limit  at most N lines per second; suppressed events are
+                    counted and reported on the next line that gets through
+
+    Counters are updated without a lock; under contention a sampled or
+    suppressed count can be off by one, which is fine for log output.
+    """
+
+    def __init__(self, log: logging.Logger, level: int = logging.INFO,
+                 sample: Optional[dict] = None, rate_limit: Optional[dict] = None):
+        self._log = log
+        self.level = level
+        self.sample = dict(sample or {})
+        self.rate_limit = dict(rate_limit or {})
+        self._seen: dict = {}          # type name -> events seen (for sampling)
+        self._window: dict = {}        # type name -> (window start, lines in window)
+        self._suppressed: dict = {}    # type name -> events dropped since last line
+
+    def log(self, etype, payload, track_id: Optional[int] = None):
+        if not self._log.isEnabledFor(self.level):
+            return
+        name = etype.name
+        every = self.sample.get(name)
+        if every and every > 1:
+            n = self._seen.get(name, 0)
+            self._seen[name] = n + 1
+            if n % every:
+                return
+        limit = self.rate_limit.get(name)
+        if limit:
+            now = time.monotonic()
+            start, count = self._window.get(name, (now, 0))
+            if now - start >= 1.0:
+                start, count = now, 0
+            if count >= limit:
+                self._window[name] = (start, count)
+                self._suppressed[name] = self._suppressed.get(name, 0) + 1
+                return
+            self._window[name] = (start, count + 1)
+        skipped = self._suppressed.pop(name, 0)
+        extra = {"event_type": name, "track_id": track_id, "payload": payload}
+        note = f" (+{skipped} suppressed)" if skipped else ""
+        if track_id is None:
+            self._log.log(self.level, "[%s] %s%s", name, payload, note, extra=extra)
+        else:
+            self._log.log(self.level, "[%s] track=%s %s%s", name, track_id, payload, note,
+                          extra=extra)
@@ -24,3 +24,23 @@ _CONFIG = _load_config()
 
 def get_tracker_config() -> dict:
     return _CONFIG.get("tracker", {})
+
+
+def get_database_config() -> dict:
+    return _CONFIG.get("database", {})
+
+
+def get_detector_config() -> dict:
+    return _CONFIG.get("detector", {})
+
+
+def get_embedder_config() -> dict:
+    return _CONFIG.get("embedder", {})
+
+
+def get_emotion_config() -> dict:
+    return _CONFIG.get("emotion", {})
+
+
+def get_metrics_config() -> dict:
+    return _CONFIG.get("metrics", {})
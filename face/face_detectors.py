@@ -0,0 +1,287 @@
+"""
+Face detector backends for FaceTracker.
+
+Every backend takes the downscaled frame the tracker already builds (BGR
+and RGB views of the same image) and returns face boxes in that image's
+coordinates as ``(top, right, bottom, left)`` tuples — the same layout
+``face_recognition`` uses, so the dlib encoder can consume them directly.
+
+Backends:
+    hog    dlib HOG via ``face_recognition.face_locations`` (original path)
+    yunet  OpenCV's ``cv2.FaceDetectorYN`` (YuNet ONNX model)
+    onnx   Generic ONNX Runtime detector for UltraFace-style models
+           (``scores`` (1, N, 2) + normalized corner ``boxes`` (1, N, 4))
+
+Models for yunet/onnx are downloaded on first use, like the emotion model.
+
+Benchmark on a recorded clip (ms/frame and recall):
+    python face_detectors.py --video clip.mp4 [--backends hog yunet onnx]
+                             [--annotations boxes.json] [--scale 0.5]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import face_recognition
+import numpy as np
+
+logger = logging.getLogger("face_detectors")
+
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DETECTOR_MODEL_DIR = os.path.join(_SOURCE_DIR, "detector_model")
+YUNET_MODEL_URL = "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
+ULTRAFACE_MODEL_URL = "https://github.com/onnx/models/raw/main/validated/vision/body_analysis/ultraface/models/version-RFB-320.onnx"
+
+
+@dataclass
+class DetectorConfig:
+    """Settings shared by all backends.
+
+    ``input_size`` is (width, height) of the network input; the HOG backend
+    ignores it and YuNet resizes its input to the actual frame size, so it
+    only matters for fixed-size ONNX models.
+    """
+    input_size: tuple = (320, 240)
+    score_threshold: float = 0.7
+    nms_threshold: float = 0.3
+    top_k: int = 50
+    model_path: str = ""
+    upsample: int = 1           # HOG only: image pyramid upsampling
+
+
+def _ensure_model(path: str, url: str) -> str:
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger.info(f"Downloading detector model {os.path.basename(path)}...")
+        import urllib.request
+        urllib.request.urlretrieve(url, path)
+        logger.info("Detector model downloaded.")
+    return path
+
+
+def _xywh_to_trbl(boxes: np.ndarray, width: int, height: int) -> list:
+    """(x, y, w, h) float boxes -> clipped (top, right, bottom, left) ints."""
+    out = []
+    for x, y, w, h in boxes:
+        left, top = max(0, int(x)), max(0, int(y))
+        right, bottom = min(width, int(x + w)), min(height, int(y + h))
+        if right > left and bottom > top:
+            out.append((top, right, bottom, left))
+    return out
+
+
+class FaceDetector:
+    """Detector interface. Subclasses implement ``detect``."""
+
+    name = "base"
+
+    def __init__(self, config: Optional[DetectorConfig] = None):
+        self.config = config or DetectorConfig()
+
+    def detect(self, bgr: np.ndarray, rgb: np.ndarray) -> list:
+        """Return ``[(top, right, bottom, left), ...]`` in image coordinates."""
+        raise NotImplementedError
+
+
+class HogDetector(FaceDetector):
+    """dlib HOG detector — the tracker's original behaviour."""
+
+    name = "hog"
+
+    def detect(self, bgr, rgb):
+        return face_recognition.face_locations(
+            rgb, number_of_times_to_upsample=self.config.upsample)
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV ``FaceDetectorYN`` (YuNet). Fast on CPU, handles profile faces."""
+
+    name = "yunet"
+
+    def __init__(self, config: Optional[DetectorConfig] = None):
+        super().__init__(config)
+        path = self.config.model_path or _ensure_model(
+            os.path.join(DETECTOR_MODEL_DIR, "face_detection_yunet_2023mar.onnx"),
+            YUNET_MODEL_URL)
+        self._input_size = tuple(self.config.input_size)
+        self._net = cv2.FaceDetectorYN.create(
+            path, "", self._input_size,
+            self.config.score_threshold, self.config.nms_threshold, self.config.top_k)
+
+    def detect(self, bgr, rgb):
+        h, w = bgr.shape[:2]
+        if (w, h) != self._input_size:
+            self._net.setInputSize((w, h))
+            self._input_size = (w, h)
+        _, faces = self._net.detect(bgr)
+        if faces is None:
+            return []
+        return _xywh_to_trbl(faces[:, :4], w, h)
+
+
+class OnnxDetector(FaceDetector):
+    """ONNX Runtime detector for UltraFace-style outputs.
+
+    Expects an RGB NCHW input normalised as ``(x - 127) / 128`` and two
+    outputs: class scores ``(1, N, 2)`` and corner boxes ``(1, N, 4)`` in
+    ``[0, 1]`` coordinates. Non-maximum suppression runs here.
+    """
+
+    name = "onnx"
+
+    def __init__(self, config: Optional[DetectorConfig] = None):
+        super().__init__(config)
+        import onnxruntime as ort
+        path = self.config.model_path or _ensure_model(
+            os.path.join(DETECTOR_MODEL_DIR, "version-RFB-320.onnx"),
+            ULTRAFACE_MODEL_URL)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+        in_w, in_h = self.config.input_size
+        self._blob = np.empty((1, 3, in_h, in_w), dtype=np.float32)
+
+    def detect(self, bgr, rgb):
+        h, w = rgb.shape[:2]
+        in_w, in_h = self.config.input_size
+        resized = cv2.resize(rgb, (in_w, in_h))
+        np.subtract(resized.transpose(2, 0, 1), 127.0, out=self._blob[0], casting="unsafe")
+        self._blob *= 1.0 / 128.0
+        scores, boxes = self._session.run(None, {self._input_name: self._blob})
+        scores, boxes = scores[0, :, 1], boxes[0]
+        keep = scores > self.config.score_threshold
+        if not keep.any():
+            return []
+        scores, boxes = scores[keep], boxes[keep]
+        xywh = np.column_stack([
+            boxes[:, 0] * w, boxes[:, 1] * h,
+            (boxes[:, 2] - boxes[:, 0]) * w, (boxes[:, 3] - boxes[:, 1]) * h,
+        ])
+        idx = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(),
+                               self.config.score_threshold, self.config.nms_threshold,
+                               top_k=self.config.top_k)
+        idx = np.asarray(idx, dtype=int).reshape(-1)
+        return _xywh_to_trbl(xywh[idx], w, h)
+
+
+DETECTORS = {cls.name: cls for cls in (HogDetector, YuNetDetector, OnnxDetector)}
+
+
+def make_detector(config: dict) -> FaceDetector:
+    """Build the backend described by a ``[detector]`` config block."""
+    kind = config.get("backend", "hog")
+    if kind not in DETECTORS:
+        raise ValueError(f"unknown face detector {kind!r} (expected one of {sorted(DETECTORS)})")
+    dc = DetectorConfig()
+    for key in ("input_size", "score_threshold", "nms_threshold", "top_k",
+                "model_path", "upsample"):
+        if key in config:
+            setattr(dc, key, tuple(config[key]) if key == "input_size" else config[key])
+    return DETECTORS[kind](dc)
+
+
+def iou(a: tuple, b: tuple) -> float:
+    """Intersection over union of two ``(top, right, bottom, left)`` boxes."""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+# ---------------------------------------------------------------------------
+# Standalone: ms/frame and recall on a recorded clip
+# ---------------------------------------------------------------------------
+
+def _count_hits(found: list, truth: list, iou_thresh: float) -> int:
+    """Greedy one-to-one matching of detections to ground-truth boxes."""
+    used, hits = set(), 0
+    for t in truth:
+        best, best_iou = None, iou_thresh
+        for i, f in enumerate(found):
+            if i not in used and iou(f, t) >= best_iou:
+                best, best_iou = i, iou(f, t)
+        if best is not None:
+            used.add(best)
+            hits += 1
+    return hits
+
+
+def _load_annotations(path: str) -> dict:
+    """``{"<frame_index>": [[top, right, bottom, left], ...]}`` in full-frame pixels."""
+    with open(path) as f:
+        raw = json.load(f)
+    return {int(k): [tuple(b) for b in v] for k, v in raw.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detector benchmark")
+    parser.add_argument("--video", required=True, help="Recorded clip to run on")
+    parser.add_argument("--backends", nargs="+", default=list(DETECTORS),
+                        choices=list(DETECTORS))
+    parser.add_argument("--annotations",
+                        help="JSON ground truth; without it the first backend is the reference")
+    parser.add_argument("--scale", type=float, default=0.5, help="Detection scale factor")
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a detection to count as a hit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    from face_config import get_detector_config
+
+    frames = []
+    cap = cv2.VideoCapture(args.video)
+    while len(frames) < args.max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"no frames read from {args.video}")
+
+    truth = _load_annotations(args.annotations) if args.annotations else None
+    s = args.scale
+    results = {}
+    for name in args.backends:
+        # The configured thresholds, input size and model, as the app runs them.
+        detector = make_detector({**get_detector_config(), "backend": name})
+        boxes, elapsed = [], 0.0
+        for frame in frames:
+            small = cv2.resize(frame, (0, 0), fx=s, fy=s)
+            rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            t0 = time.perf_counter()
+            found = detector.detect(small, rgb)
+            elapsed += time.perf_counter() - t0
+            boxes.append([tuple(int(v / s) for v in b) for b in found])
+        results[name] = (elapsed * 1000 / len(frames), boxes)
+
+    if truth is None:
+        ref_name = args.backends[0]
+        truth = dict(enumerate(results[ref_name][1]))
+        print(f"(no annotations: recall is relative to {ref_name})")
+
+    print(f"{'backend':>8} {'ms/frame':>9} {'faces':>7} {'recall':>7}")
+    for name, (ms, boxes) in results.items():
+        n_truth = hits = 0
+        for i, found in enumerate(boxes):
+            if i in truth:
+                n_truth += len(truth[i])
+                hits += _count_hits(found, truth[i], args.iou)
+        recall = hits / n_truth if n_truth else float("nan")
+        total = sum(len(b) for b in boxes)
+        print(f"{name:>8} {ms:>8.1f} {total:>7} {recall:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
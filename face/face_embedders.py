@@ -0,0 +1,269 @@
+"""
+Face embedding backends for FaceTracker and FaceDatabase.
+
+An embedder turns face boxes in an RGB image into identity vectors and
+owns the distance semantics that go with them:
+
+    dlib   ``face_recognition.face_encodings`` — 128-d, Euclidean,
+           tolerance 0.6 (original path, one face at a time)
+    onnx   ArcFace-style ONNX model — every face in the frame is aligned to
+           the 112x112 ArcFace template and embedded in one batched
+           ``session.run``; vectors are L2-normalised and compared by
+           cosine distance (``1 - cos``)
+
+Galleries are not interchangeable between embedders. Re-embed the images
+saved under ``known_faces/<person_id>/`` into a new gallery with the
+embedder configured in ``[embedder]`` (flags override it):
+    python face_embedders.py migrate --src known_faces --dst known_faces_arcface [--backend onnx]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import face_recognition
+import numpy as np
+
+logger = logging.getLogger("face_embedders")
+
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+EMBEDDER_MODEL_DIR = os.path.join(_SOURCE_DIR, "embedder_model")
+ARCFACE_MODEL_URL = "https://github.com/onnx/models/raw/main/validated/vision/body_analysis/arcface/model/arcfaceresnet100-8.onnx"
+
+# ArcFace 112x112 reference positions: left eye, right eye, nose tip
+# (image coordinates, so "left" is the subject's right eye).
+_ARCFACE_TEMPLATE = np.array([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+], dtype=np.float32)
+_ARCFACE_SIZE = 112
+
+
+@dataclass
+class EmbedderConfig:
+    """Settings for ONNX embedders.
+
+    ``input_mean`` / ``input_std`` normalise RGB pixels before inference:
+    the ONNX model zoo ArcFace expects raw pixels (0 / 1), insightface
+    exports expect ``127.5`` / ``127.5``.
+    """
+    model_path: str = ""
+    input_mean: float = 0.0
+    input_std: float = 1.0
+    tolerance: float = 0.6
+    track_threshold: float = 0.5
+
+
+class FaceEmbedder:
+    """Embedder interface. Subclasses implement ``embed``."""
+
+    name = "base"
+    metric = "euclidean"
+    tolerance = 0.6           # recognition threshold for FaceDatabase
+    track_threshold = 0.5     # frame-to-frame association gate for FaceTracker
+
+    def embed(self, rgb: np.ndarray, locations: list) -> list:
+        """Return one vector per ``(top, right, bottom, left)`` box in ``rgb``."""
+        raise NotImplementedError
+
+
+class DlibEmbedder(FaceEmbedder):
+    """dlib ResNet embeddings via ``face_recognition``."""
+
+    name = "dlib"
+
+    def embed(self, rgb, locations):
+        if not locations:
+            return []
+        return face_recognition.face_encodings(rgb, locations)
+
+
+class OnnxEmbedder(FaceEmbedder):
+    """ArcFace-style ONNX embedder with landmark alignment and batching.
+
+    Landmarks come from dlib's 5-point shape predictor; when they are
+    unavailable the face box is cropped with a small margin instead.
+    Models exported with a fixed batch of 1 are run face by face.
+    """
+
+    name = "onnx"
+    metric = "cosine"
+
+    def __init__(self, config: Optional[EmbedderConfig] = None):
+        import onnxruntime as ort
+        self.config = config or EmbedderConfig()
+        self.tolerance = self.config.tolerance
+        self.track_threshold = self.config.track_threshold
+        path = self.config.model_path or os.path.join(EMBEDDER_MODEL_DIR, "arcfaceresnet100-8.onnx")
+        if not os.path.exists(path):
+            if self.config.model_path:
+                raise FileNotFoundError(path)
+            os.makedirs(EMBEDDER_MODEL_DIR, exist_ok=True)
+            logger.info("Downloading face embedding model...")
+            import urllib.request
+            urllib.request.urlretrieve(ARCFACE_MODEL_URL, path)
+            logger.info("Embedding model downloaded.")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        inp = self._session.get_inputs()[0]
+        self._input_name = inp.name
+        self._fixed_batch = isinstance(inp.shape[0], int) and inp.shape[0] == 1
+        self._batch = np.empty((0, 3, _ARCFACE_SIZE, _ARCFACE_SIZE), dtype=np.float32)
+
+    def embed(self, rgb, locations):
+        n = len(locations)
+        if n == 0:
+            return []
+        if len(self._batch) < n:
+            self._batch = np.empty((n, 3, _ARCFACE_SIZE, _ARCFACE_SIZE), dtype=np.float32)
+        batch = self._batch[:n]
+        landmarks = face_recognition.face_landmarks(rgb, locations, model="small")
+        for i, loc in enumerate(locations):
+            marks = landmarks[i] if i < len(landmarks) else None
+            aligned = self._align(rgb, loc, marks)
+            batch[i] = aligned.transpose(2, 0, 1)
+        batch -= self.config.input_mean
+        batch *= 1.0 / self.config.input_std
+
+        if self._fixed_batch:
+            out = np.concatenate([
+                self._session.run(None, {self._input_name: batch[i:i + 1]})[0]
+                for i in range(n)
+            ])
+        else:
+            out = self._session.run(None, {self._input_name: batch})[0]
+        out = out.reshape(n, -1).astype(np.float32)
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return list(out)
+
+    @staticmethod
+    def _align(rgb, location, marks) -> np.ndarray:
+        """Warp one face to the 112x112 ArcFace template."""
+        size = (_ARCFACE_SIZE, _ARCFACE_SIZE)
+        if marks and "left_eye" in marks and "right_eye" in marks and "nose_tip" in marks:
+            eyes = sorted([np.mean(marks["left_eye"], axis=0),
+                           np.mean(marks["right_eye"], axis=0)], key=lambda p: p[0])
+            src = np.array([eyes[0], eyes[1], np.mean(marks["nose_tip"], axis=0)],
+                           dtype=np.float32)
+            matrix, _ = cv2.estimateAffinePartial2D(src, _ARCFACE_TEMPLATE)
+            if matrix is not None:
+                return cv2.warpAffine(rgb, matrix, size, borderValue=0.0)
+        top, right, bottom, left = location
+        margin = int(0.1 * max(bottom - top, right - left))
+        h, w = rgb.shape[:2]
+        crop = rgb[max(0, top - margin):min(h, bottom + margin),
+                   max(0, left - margin):min(w, right + margin)]
+        if crop.size == 0:
+            return np.zeros((*size, 3), dtype=rgb.dtype)
+        return cv2.resize(crop, size)
+
+
+EMBEDDERS = {cls.name: cls for cls in (DlibEmbedder, OnnxEmbedder)}
+
+
+def make_embedder(config: dict) -> FaceEmbedder:
+    """Build the backend described by an ``[embedder]`` config block."""
+    kind = config.get("backend", "dlib")
+    if kind == "dlib":
+        return DlibEmbedder()
+    if kind == "onnx":
+        ec = EmbedderConfig()
+        for key in ("model_path", "input_mean", "input_std", "tolerance", "track_threshold"):
+            if key in config:
+                setattr(ec, key, config[key])
+        return OnnxEmbedder(ec)
+    raise ValueError(f"unknown face embedder {kind!r} (expected one of {sorted(EMBEDDERS)})")
+
+
+# ---------------------------------------------------------------------------
+# Standalone: re-embed a gallery's saved face images
+# ---------------------------------------------------------------------------
+
+def migrate(src_dir: str, dst_dir: str, embedder: FaceEmbedder) -> dict:
+    """Re-embed ``src_dir/<person_id>/*.jpg`` into a new gallery at ``dst_dir``.
+
+    The saved images are tight face crops, so each one is embedded with a
+    box covering the whole image. Only people still live in the source
+    gallery are migrated (``remove_person`` leaves snapshot images behind).
+    ``last_seen`` is carried over from the source gallery. Returns
+    ``{person_id: samples}``.
+    """
+    from face_store import read_gallery, read_last_seen, write_gallery
+
+    if os.path.abspath(src_dir) == os.path.abspath(dst_dir):
+        raise ValueError("destination must differ from source")
+    last_seen = read_last_seen(src_dir)
+    live = set(read_gallery(src_dir)[1])
+
+    encodings, person_ids, counts = [], [], {}
+    for person_id in sorted(live):
+        person_dir = os.path.join(src_dir, person_id)
+        if not os.path.isdir(person_dir):
+            continue
+        images = sorted(f for f in os.listdir(person_dir)
+                        if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        for name in images:
+            bgr = cv2.imread(os.path.join(person_dir, name))
+            if bgr is None or bgr.size == 0:
+                logger.warning(f"Skipping unreadable {person_id}/{name}")
+                continue
+            rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            h, w = rgb.shape[:2]
+            vectors = embedder.embed(rgb, [(0, w, h, 0)])
+            if not vectors:
+                continue
+            encodings.append(np.asarray(vectors[0], dtype=np.float32))
+            person_ids.append(person_id)
+            counts[person_id] = counts.get(person_id, 0) + 1
+            os.makedirs(os.path.join(dst_dir, person_id), exist_ok=True)
+            shutil.copy2(os.path.join(person_dir, name),
+                         os.path.join(dst_dir, person_id, name))
+
+    write_gallery(dst_dir, np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1),
+                  person_ids, metric=embedder.metric,
+                  last_seen={p: t for p, t in last_seen.items() if p in counts})
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face embedding backends")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("migrate", help="Re-embed saved face images into a new gallery")
+    p.add_argument("--src", default="known_faces", help="Source gallery directory")
+    p.add_argument("--dst", required=True, help="New gallery directory")
+    # Defaults come from [embedder] in face_config.toml, so the new gallery
+    # is encoded exactly as the tracker will encode live faces.
+    p.add_argument("--backend", choices=list(EMBEDDERS), default=None,
+                   help="Embedding backend (default: [embedder] backend)")
+    p.add_argument("--model", default=None,
+                   help="ONNX model path (default: [embedder] model_path, else downloaded ArcFace)")
+    p.add_argument("--input-mean", type=float, default=None)
+    p.add_argument("--input-std", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    from face_config import get_embedder_config
+    config = dict(get_embedder_config())
+    for key, value in (("backend", args.backend), ("model_path", args.model),
+                       ("input_mean", args.input_mean), ("input_std", args.input_std)):
+        if value is not None:
+            config[key] = value
+    embedder = make_embedder(config)
+    counts = migrate(args.src, args.dst, embedder)
+    total = sum(counts.values())
+    print(f"Re-embedded {total} images for {len(counts)} people into {args.dst} "
+          f"({embedder.name}, {embedder.metric})")
+    for person_id, n in sorted(counts.items()):
+        print(f"  {person_id}: {n}")
+
+
+if __name__ == "__main__":
+    main()
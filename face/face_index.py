@@ -0,0 +1,359 @@
+"""
+Approximate nearest-neighbour index for large face galleries.
+
+``FaceDatabase`` scores every query against every enrolled encoding. That
+is fine for a few thousand rows but grows linearly as auto-enrollment and
+``learn_face`` keep adding samples. ``IVFIndex`` is a pure-NumPy inverted
+file index: k-means coarse centroids partition the gallery, a query only
+probes the ``n_probe`` closest lists, and the database re-ranks those
+candidates with exact distances so tolerance semantics are unchanged.
+
+The index stores row numbers into the database's encoding matrix. The
+database owns the matrix and calls ``build`` / ``add`` / ``reassign`` under
+its lock; the index never keeps a copy of the encodings, except the
+snapshot a background retrain (triggered by ``add`` as the gallery grows)
+trains on.
+
+Benchmark against brute force:
+    python face_index.py [--sizes 1000 10000 100000] [--n-probe 16]
+"""
+
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("face_index")
+
+
+def _sq_distances(queries: np.ndarray, points: np.ndarray,
+                  point_sq_norms: np.ndarray) -> np.ndarray:
+    """Squared L2 distances via one matrix product (up to a per-row constant).
+
+    The ``||q||^2`` term is omitted — it does not change the argmin/argsort
+    along the point axis.
+    """
+    d = queries @ points.T
+    d *= -2.0
+    d += point_sq_norms[None, :]
+    return d
+
+
+class IVFIndex:
+    """Inverted-file (IVF-Flat) index with k-means coarse quantization.
+
+    Args:
+        n_lists: Number of coarse centroids. ``0`` picks ``4 * sqrt(n)``.
+        n_probe: Lists scanned per query. Higher is slower but closer to
+                 brute force.
+        min_rows: Below this gallery size the index stays untrained and the
+                  database falls back to brute force.
+        kmeans_iters: Lloyd iterations when training centroids.
+        train_sample: Max rows sampled for k-means training.
+        retrain_factor: Retrain once the gallery has grown by this factor
+                        since the last training.
+    """
+
+    def __init__(self, n_lists: int = 0, n_probe: int = 16,
+                 min_rows: int = 5000, kmeans_iters: int = 10,
+                 train_sample: int = 50000, retrain_factor: float = 4.0,
+                 seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_rows = min_rows
+        self.kmeans_iters = kmeans_iters
+        self.train_sample = train_sample
+        self.retrain_factor = retrain_factor
+        self._rng = np.random.default_rng(seed)
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_sq_norms: Optional[np.ndarray] = None
+        self._trained_rows = 0
+        self._lists: list[list[int]] = []
+        self._list_arrays: list[Optional[np.ndarray]] = []
+        # Background retraining: the structure above is swapped under
+        # ``_lock``; ``_generation`` changes whenever rows are renumbered so
+        # a retrain started before that knows its row lists are stale.
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._retrain_thread: Optional[threading.Thread] = None
+        self._added_since: list[tuple] = []
+        self._pending: Optional[tuple] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def retraining(self) -> bool:
+        return self._retrain_thread is not None
+
+    # --- Maintenance (called by FaceDatabase with its lock held) ---
+
+    def build(self, matrix: np.ndarray):
+        """Train centroids on ``matrix`` (n x d) and assign every row."""
+        n = len(matrix)
+        if n == 0 or n < self.min_rows:
+            with self._lock:
+                self._centroids = None
+                self._centroid_sq_norms = None
+                self._lists = []
+                self._list_arrays = []
+                self._trained_rows = 0
+                self._generation += 1
+            return
+        t0 = time.perf_counter()
+        centroids, norms, lists = self._train(matrix)
+        with self._lock:
+            self._install(centroids, norms, lists, n)
+            self._generation += 1
+        logger.info(f"IVF index trained: {n} rows, {len(centroids)} lists "
+                    f"({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+    def reassign(self, matrix: np.ndarray):
+        """Re-assign all rows to the existing centroids (after row renumbering)."""
+        with self._lock:
+            self._install_pending(matrix)
+            if not self.ready:
+                return
+            self._lists = self._assign(matrix, self._centroids, self._centroid_sq_norms)
+            self._list_arrays = [None] * len(self._lists)
+            self._generation += 1
+
+    def add(self, row: int, vector: np.ndarray, matrix: np.ndarray):
+        """Index a newly appended row. ``matrix`` is the full gallery.
+
+        (Re)training on growth runs on a background thread over a copy of
+        ``matrix``; until it finishes, the current index (or brute force,
+        before the first training) keeps serving queries.
+        """
+        n = row + 1
+        with self._lock:
+            fresh = self._install_pending(matrix)   # already covers ``row``
+            if self._retrain_thread is not None:
+                self._added_since.append((row, np.array(vector, dtype=np.float32)))
+            due = (n >= self.min_rows if not self.ready
+                   else n >= self.retrain_factor * self._trained_rows)
+            if due and self._retrain_thread is None:
+                self._retrain_thread = threading.Thread(
+                    target=self._retrain, args=(np.array(matrix[:n]), self._generation),
+                    daemon=True, name="ivf-retrain")
+                self._retrain_thread.start()
+            if not self.ready or fresh:
+                return
+            c = int(self._nearest_centroids(vector[None, :], 1)[0, 0])
+            self._lists[c].append(row)
+            self._list_arrays[c] = None
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until a background retrain (if any) has been swapped in."""
+        t = self._retrain_thread
+        if t is not None:
+            t.join(timeout)
+
+    def _retrain(self, snapshot: np.ndarray, generation: int):
+        t0 = time.perf_counter()
+        try:
+            centroids, norms, lists = self._train(snapshot)
+        except Exception as e:
+            logger.error(f"IVF index retrain failed: {e}")
+            with self._lock:
+                self._added_since = []
+                self._retrain_thread = None
+            return
+        with self._lock:
+            if self._generation == generation:
+                # Rows appended while training: assign them to the new centroids.
+                for row, vector in self._added_since:
+                    d = _sq_distances(vector[None, :], centroids, norms)
+                    lists[int(np.argmin(d[0]))].append(row)
+                self._install(centroids, norms, lists, len(snapshot) + len(self._added_since))
+            else:
+                # Rows were renumbered meanwhile; the next add()/reassign()
+                # assigns the current matrix to these centroids.
+                self._pending = (centroids, norms)
+            self._added_since = []
+            self._retrain_thread = None
+        logger.info(f"IVF index retrained in background: {len(snapshot)} rows, "
+                    f"{len(centroids)} lists ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+    # --- Search ---
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """Row numbers in the ``n_probe`` lists closest to ``query``."""
+        with self._lock:
+            probes = self._nearest_centroids(query[None, :], self.n_probe)[0]
+            parts = []
+            for c in probes:
+                arr = self._list_arrays[c]
+                if arr is None:
+                    arr = np.asarray(self._lists[c], dtype=np.intp)
+                    self._list_arrays[c] = arr
+                parts.append(arr)
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.intp)
+
+    # --- Internal ---
+
+    def _train(self, matrix: np.ndarray) -> tuple:
+        """k-means centroids, their squared norms and the row lists for ``matrix``."""
+        n = len(matrix)
+        k = self.n_lists or int(4 * np.sqrt(n))
+        k = max(1, min(k, n))
+        centroids = self._kmeans(matrix, k)
+        norms = np.einsum("ij,ij->i", centroids, centroids)
+        return centroids, norms, self._assign(matrix, centroids, norms)
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray, norms: np.ndarray) -> list:
+        k = len(centroids)
+        if len(matrix):
+            assign = np.argmin(_sq_distances(matrix, centroids, norms), axis=1)
+        else:
+            assign = np.zeros(0, int)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(k + 1))
+        return [order[bounds[c]:bounds[c + 1]].tolist() for c in range(k)]
+
+    def _install(self, centroids: np.ndarray, norms: np.ndarray, lists: list, rows: int):
+        """Swap in a trained index. Caller holds ``_lock``."""
+        self._centroids = centroids
+        self._centroid_sq_norms = norms
+        self._lists = lists
+        self._list_arrays = [None] * len(lists)
+        self._trained_rows = rows
+        self._pending = None
+
+    def _install_pending(self, matrix: np.ndarray) -> bool:
+        """Install centroids whose background training raced a renumbering,
+        assigning every row of ``matrix``. Caller holds ``_lock``."""
+        if self._pending is None:
+            return False
+        centroids, norms = self._pending
+        self._install(centroids, norms, self._assign(matrix, centroids, norms), len(matrix))
+        self._generation += 1
+        return True
+
+    def _nearest_centroids(self, vectors: np.ndarray, k: int) -> np.ndarray:
+        d = _sq_distances(vectors, self._centroids, self._centroid_sq_norms)
+        k = min(k, d.shape[1])
+        if k == 1:
+            return np.argmin(d, axis=1)[:, None]
+        part = np.argpartition(d, k - 1, axis=1)[:, :k]
+        return part
+
+    def _kmeans(self, matrix: np.ndarray, k: int) -> np.ndarray:
+        n = len(matrix)
+        sample_n = min(n, max(self.train_sample, k))
+        idx = self._rng.choice(n, size=sample_n, replace=False) if sample_n < n else np.arange(n)
+        data = np.asarray(matrix[idx], dtype=np.float32)
+        centroids = data[self._rng.choice(len(data), size=k, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            c_norms = np.einsum("ij,ij->i", centroids, centroids)
+            assign = np.argmin(_sq_distances(data, centroids, c_norms), axis=1)
+            counts = np.bincount(assign, minlength=k)
+            nonempty = counts > 0
+            order = np.argsort(assign, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+            sums = np.add.reduceat(data[order], starts, axis=0)
+            centroids[nonempty] = sums / counts[nonempty, None]
+            empty = np.flatnonzero(~nonempty)
+            if len(empty):
+                centroids[empty] = data[self._rng.choice(len(data), size=len(empty))]
+        return centroids
+
+
+def make_index(config: dict) -> Optional[IVFIndex]:
+    """Build the index described by a ``[database]`` config block, or None."""
+    kind = config.get("index", "none")
+    if kind in ("none", "", None):
+        return None
+    if kind == "ivf":
+        return IVFIndex(
+            n_lists=config.get("n_lists", 0),
+            n_probe=config.get("n_probe", 16),
+            min_rows=config.get("index_min_rows", 5000),
+        )
+    raise ValueError(f"unknown face index {kind!r} (expected 'none' or 'ivf')")
+
+
+# ---------------------------------------------------------------------------
+# Standalone: recall/latency benchmark against brute force
+# ---------------------------------------------------------------------------
+
+def _synthetic_gallery(n: int, samples_per_person: int, rng) -> tuple:
+    """Clustered 128-d encodings roughly shaped like dlib's.
+
+    Different people end up ~0.9-1.0 apart, samples of one person ~0.3.
+    """
+    n_people = max(1, n // samples_per_person)
+    centers = rng.normal(0.0, 0.06, (n_people, 128)).astype(np.float32)
+    owners = rng.integers(0, n_people, n)
+    encodings = centers[owners] + rng.normal(0.0, 0.02, (n, 128)).astype(np.float32)
+    person_ids = [f"p{o + 1:03d}" for o in owners]
+    return centers, encodings, person_ids
+
+
+def _bench_one(n: int, n_queries: int, n_probe: int, rng) -> dict:
+    from face_tracker import FaceDatabase
+
+    centers, encodings, person_ids = _synthetic_gallery(n, 20, rng)
+    from face_store import write_gallery
+
+    with tempfile.TemporaryDirectory(prefix="face_index_bench_") as db_dir:
+        write_gallery(db_dir, encodings, person_ids)
+        brute = FaceDatabase(db_dir=db_dir)
+        ivf = FaceDatabase(db_dir=db_dir, index=IVFIndex(n_probe=n_probe, min_rows=0))
+        try:
+            brute.load()
+            t0 = time.perf_counter()
+            ivf.load()
+            build_ms = (time.perf_counter() - t0) * 1000
+
+            # Half the queries are fresh samples of enrolled people, half strangers.
+            known = centers[rng.integers(0, len(centers), n_queries // 2)]
+            strangers = rng.normal(0.0, 0.06, (n_queries - len(known), 128))
+            queries = np.vstack([known, strangers]).astype(np.float32)
+            queries += rng.normal(0.0, 0.02, queries.shape).astype(np.float32)
+
+            def timed(db):
+                out, t0 = [], time.perf_counter()
+                for q in queries:
+                    out.append(db.recognize(q))
+                return out, (time.perf_counter() - t0) * 1000 / len(queries)
+
+            ref, brute_ms = timed(brute)
+            got, ivf_ms = timed(ivf)
+        finally:
+            brute.close()
+            ivf.close()
+    agree = sum(1 for a, b in zip(ref, got) if a[0] == b[0])
+    return {
+        "n": n, "build_ms": build_ms, "brute_ms": brute_ms, "ivf_ms": ivf_ms,
+        "recall": agree / len(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF face index benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-probe", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'encodings':>10} {'build':>9} {'brute/q':>9} {'ivf/q':>9} {'speedup':>8} {'recall':>7}")
+    for n in args.sizes:
+        r = _bench_one(n, args.queries, args.n_probe, rng)
+        speedup = r["brute_ms"] / r["ivf_ms"] if r["ivf_ms"] > 0 else float("inf")
+        print(f"{r['n']:>10} {r['build_ms']:>7.0f}ms {r['brute_ms']:>7.3f}ms "
+              f"{r['ivf_ms']:>7.3f}ms {speedup:>7.1f}x {r['recall']:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Multi-process face pipeline with shared-memory frames.
+
+Detection and encoding are the expensive part of ``FaceTracker`` and run
+on one Python thread. ``FacePipeline`` moves them into worker processes:
+
+    capture  -> SharedFrameRing slot (one memcpy, no pickling)
+    workers  -> read the slot, detect + encode, send back boxes/encodings
+    tracker  -> merge results strictly in frame order via
+                ``FaceTracker.process_detections``
+
+Only slot numbers, boxes and encodings cross process boundaries. Workers
+pull from one shared task queue, so consecutive frames land on different
+workers and a slow frame does not stall the others. Results are reordered
+before merging so track association always sees frames in capture order.
+A worker that dies is respawned; a frame whose result has not arrived
+within ``task_timeout`` seconds is skipped (counted as an error) so one
+lost frame cannot hold up the ones behind it.
+
+In this mode every submitted frame is detected: the tracker's adaptive
+detection cadence, optical-flow propagation and lazy encoding need track
+state and only apply to ``FaceTracker.process_frame``.
+
+Used by ``face_tracker.py --workers N``.
+"""
+
+import logging
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("face_pipeline")
+
+
+class SharedFrameRing:
+    """Fixed number of equally shaped uint8 frames in one shared-memory block."""
+
+    def __init__(self, slots: int, shape: tuple, name: Optional[str] = None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self._frame_bytes = int(np.prod(self.shape))
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=slots * self._frame_bytes)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self._array = np.ndarray((slots, *self.shape), dtype=np.uint8, buffer=self._shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(self, slot: int, frame: np.ndarray):
+        self._array[slot] = frame
+
+    def view(self, slot: int) -> np.ndarray:
+        """Zero-copy view of a slot. Valid until the slot is rewritten."""
+        return self._array[slot]
+
+    def close(self):
+        self._array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _worker_main(ring_name: str, slots: int, shape: tuple, frame_scale: float,
+                 detector_config: dict, embedder_config: dict,
+                 tasks, results):
+    """Worker process: detect + encode frames named by ``(seq, slot)`` tasks."""
+    from face_detectors import make_detector
+    from face_embedders import make_embedder
+
+    detector = make_detector(detector_config)
+    embedder = make_embedder(embedder_config)
+    ring = SharedFrameRing(slots, shape, name=ring_name)
+    s = frame_scale
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot = task
+            try:
+                small = cv2.resize(ring.view(slot), (0, 0), fx=s, fy=s)
+                rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+                small_locations = detector.detect(small, rgb_small)
+                encodings = embedder.embed(rgb_small, small_locations)
+                locations = [(int(t / s), int(r / s), int(b / s), int(l / s))
+                             for t, r, b, l in small_locations]
+                results.put((seq, slot, locations, [np.asarray(e) for e in encodings], None))
+            except Exception as e:
+                results.put((seq, slot, [], [], f"{type(e).__name__}: {e}"))
+    finally:
+        ring.close()
+
+
+class FacePipeline:
+    """Feeds frames to worker processes and merges results into a tracker.
+
+    Args:
+        tracker: The ``FaceTracker`` that owns tracks, identities and events.
+        workers: Number of detection/encoding processes.
+        detector_config: ``[detector]``-style dict for the workers.
+        embedder_config: ``[embedder]``-style dict; must match the tracker's
+                         embedder so encodings are comparable.
+        slots: Frames in flight (ring size). Default ``2 * workers + 1``.
+        task_timeout: Seconds after submission before a frame with no
+                      result is given up on and its slot reused.
+    """
+
+    def __init__(self, tracker, workers: int = 2,
+                 detector_config: Optional[dict] = None,
+                 embedder_config: Optional[dict] = None,
+                 slots: int = 0, task_timeout: float = 5.0):
+        self.tracker = tracker
+        self.workers = max(1, workers)
+        self.slots = slots or 2 * self.workers + 1
+        self._detector_config = detector_config or {}
+        self._embedder_config = embedder_config or {}
+        self.task_timeout = task_timeout
+        self._ctx = mp.get_context("spawn")
+        self._ring: Optional[SharedFrameRing] = None
+        self._shape: tuple = ()
+        self._procs: list = []
+        self._tasks = None
+        self._results = None
+        self._free_slots: list[int] = []
+        self._submit_time: dict[int, float] = {}
+        self._slot_of: dict[int, int] = {}
+        self._reorder: dict[int, tuple] = {}
+        self._next_seq = 0
+        self._next_merge = 0
+        self.stats = {"submitted": 0, "dropped": 0, "merged": 0, "errors": 0,
+                      "timeouts": 0, "respawned": 0}
+
+    def _spawn(self, i: int):
+        p = self._ctx.Process(
+            target=_worker_main, name=f"face-pipeline-{i}", daemon=True,
+            args=(self._ring.name, self.slots, self._shape, self.tracker.frame_scale,
+                  self._detector_config, self._embedder_config,
+                  self._tasks, self._results),
+        )
+        p.start()
+        return p
+
+    def _start(self, shape: tuple):
+        self._shape = tuple(shape)
+        self._ring = SharedFrameRing(self.slots, shape)
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._free_slots = list(range(self.slots))
+        self._procs = [self._spawn(i) for i in range(self.workers)]
+        logger.info(f"Face pipeline started: {self.workers} workers, "
+                    f"{self.slots} slots of {shape}")
+
+    @property
+    def in_flight(self) -> int:
+        return self.slots - len(self._free_slots) if self._ring else 0
+
+    def submit(self, frame: np.ndarray) -> bool:
+        """Queue a frame for detection. Returns False (and counts a drop)
+        when every slot is still in flight or the frame size changed."""
+        if self._ring is None:
+            self._start(frame.shape)
+        if frame.shape != self._ring.shape or not self._free_slots:
+            self.stats["dropped"] += 1
+            return False
+        slot = self._free_slots.pop()
+        self._ring.write(slot, frame)
+        seq = self._next_seq
+        self._next_seq += 1
+        self._submit_time[seq] = time.time()
+        self._slot_of[seq] = slot
+        self._tasks.put((seq, slot))
+        self.stats["submitted"] += 1
+        return True
+
+    def poll(self, timeout: float = 0.0) -> list[tuple]:
+        """Merge every result that is ready, in frame order.
+
+        Returns ``[(seq, faces, latency_ms), ...]`` where ``faces`` is what
+        ``FaceTracker.process_detections`` returned for that frame.
+        """
+        if self._results is None:
+            return []
+        self._check_workers()
+        try:
+            item = self._results.get(timeout=timeout) if timeout > 0 else self._results.get_nowait()
+            while True:
+                if item[0] >= self._next_merge:   # else: late result of a skipped frame
+                    self._reorder[item[0]] = item
+                item = self._results.get_nowait()
+        except queue.Empty:
+            pass
+
+        merged = []
+        while True:
+            seq = self._next_merge
+            if seq not in self._reorder:
+                if not self._expire(seq):
+                    break
+                continue
+            seq, slot, locations, encodings, error = self._reorder.pop(seq)
+            self._next_merge += 1
+            self._slot_of.pop(seq, None)
+            latency_ms = (time.time() - self._submit_time.pop(seq)) * 1000.0
+            if error:
+                self.stats["errors"] += 1
+                logger.warning(f"Pipeline worker failed on frame {seq}: {error}")
+                self._free_slots.append(slot)
+                continue
+            # The tracker copies out the face crops it keeps, so it can
+            # read the slot in place; release it once the merge is done.
+            faces = self.tracker.process_detections(self._ring.view(slot), locations, encodings)
+            self._free_slots.append(slot)
+            self.stats["merged"] += 1
+            merged.append((seq, faces, latency_ms))
+        return merged
+
+    def _check_workers(self):
+        """Respawn worker processes that died (OOM, a crash in native code).
+        Whatever frame a dead worker held is recovered by ``_expire``."""
+        for i, p in enumerate(self._procs):
+            if not p.is_alive():
+                logger.error(f"Pipeline worker {p.name} died (exit code {p.exitcode}), "
+                             f"respawning")
+                self._procs[i] = self._spawn(i)
+                self.stats["respawned"] += 1
+
+    def _expire(self, seq: int) -> bool:
+        """Skip frame ``seq`` if it is past its deadline; frees its slot."""
+        submitted = self._submit_time.get(seq)
+        if submitted is None or time.time() - submitted < self.task_timeout:
+            return False
+        del self._submit_time[seq]
+        self._free_slots.append(self._slot_of.pop(seq))
+        self._next_merge += 1
+        self.stats["errors"] += 1
+        self.stats["timeouts"] += 1
+        logger.warning(f"Pipeline frame {seq} got no result in {self.task_timeout:.1f}s, skipped")
+        return True
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        if self._ring is None:
+            return
+        for _ in self._procs:
+            self._tasks.put(None)
+        for p in self._procs:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        self._procs = []
+        self._ring.close()
+        self._ring = None
+        logger.info(f"Face pipeline stopped: {self.stats}")
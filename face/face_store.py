@@ -0,0 +1,800 @@
+"""
+Append-only, memory-mapped storage for the face gallery.
+
+Replaces re-pickling ``faces.pkl`` on every enrollment. A gallery
+directory holds one *generation* of files plus a pointer to it:
+
+    gallery.json            {"version", "generation", "dim", "metric"} — the pointer
+    encodings.<gen>.f32     float32 rows, ``dim`` per row, append-only
+    rows.<gen>.bin          per-row (person index int32, squared norm float32)
+    journal.<gen>.jsonl     person table and removals, one JSON op per line
+    last_seen.json          {person_id: timestamp}, rewritten atomically
+    <person_id>/*.jpg       face snapshots (unchanged)
+
+Enrollment appends one row to each column file (plus a journal line the
+first time a person appears). Loading maps both column files, so startup
+cost does not grow with the gallery. ``remove_person`` only journals the
+removal; the person's rows stay on disk as tombstones until ``compact``
+writes a new generation without them and switches ``gallery.json`` over
+atomically. ``compact_async`` runs that in a background thread.
+
+``prune`` bounds the gallery per person: frequent visitors otherwise
+accumulate hundreds of near-identical encodings. Each person keeps at most
+K rows chosen by farthest-point sampling (``select_representatives``), so
+the kept set spans their poses and lighting instead of repeating the most
+common one.
+
+A legacy ``faces.pkl`` is imported on first load and renamed to
+``faces.pkl.migrated``.
+
+Can be run standalone:
+    python face_store.py info [--db-dir known_faces]
+    python face_store.py compact [--db-dir known_faces]
+    python face_store.py prune --max-per-person 20 [--db-dir known_faces]
+"""
+
+import argparse
+import json
+import logging
+import os
+import pickle
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("face_store")
+
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STORE_VERSION = 1
+ROW_DTYPE = np.dtype([("person", "<i4"), ("sq_norm", "<f4")])
+
+
+@dataclass
+class GalleryState:
+    """What ``GalleryStore.open`` hands to ``FaceDatabase``.
+
+    ``encodings`` and ``rows`` are read-only memory maps (or empty arrays);
+    ``people[i]`` is the person id for person index ``i``; rows whose
+    person index is in ``removed`` are tombstones.
+    """
+    dim: int
+    metric: str
+    encodings: np.ndarray
+    rows: np.ndarray
+    people: list = field(default_factory=list)
+    removed: set = field(default_factory=set)
+    last_seen: dict = field(default_factory=dict)
+
+    @property
+    def tombstones(self) -> int:
+        if not self.removed or len(self.rows) == 0:
+            return 0
+        return int(np.isin(self.rows["person"], list(self.removed)).sum())
+
+
+def _atomic_write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _map(path: str, dtype, shape_tail: tuple, count: int) -> np.ndarray:
+    if count == 0:
+        return np.zeros((0, *shape_tail), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count, *shape_tail))
+
+
+def select_representatives(encodings: np.ndarray, k: int) -> np.ndarray:
+    """Indices of at most ``k`` rows that cover ``encodings``.
+
+    Farthest-point sampling: start from the row nearest the centroid, then
+    repeatedly take the row farthest from everything picked so far.
+    Returned in ascending order so enrollment order is preserved.
+    """
+    n = len(encodings)
+    if n <= k:
+        return np.arange(n)
+    x = np.asarray(encodings, dtype=np.float32)
+    sq = np.einsum("ij,ij->i", x, x)
+    centroid = x.mean(axis=0)
+    picked = [int(np.argmin(sq - 2.0 * (x @ centroid)))]
+    nearest = np.full(n, np.inf, dtype=np.float32)
+    for _ in range(k - 1):
+        p = picked[-1]
+        np.minimum(nearest, sq + sq[p] - 2.0 * (x @ x[p]), out=nearest)
+        nearest[picked] = -1.0
+        picked.append(int(np.argmax(nearest)))
+    return np.sort(np.asarray(picked))
+
+
+def prune_rows(encodings: np.ndarray, row_person: np.ndarray, max_per_person: int,
+               persons: Optional[set] = None) -> np.ndarray:
+    """Boolean keep-mask limiting every person (or just ``persons``) to
+    ``max_per_person`` rows picked by ``select_representatives``."""
+    keep = np.ones(len(row_person), dtype=bool)
+    if max_per_person <= 0 or len(row_person) == 0:
+        return keep
+    uniq, counts = np.unique(row_person, return_counts=True)
+    for p in uniq[counts > max_per_person]:
+        if persons is not None and int(p) not in persons:
+            continue
+        rows = np.flatnonzero(row_person == p)
+        keep[rows] = False
+        keep[rows[select_representatives(encodings[rows], max_per_person)]] = True
+    return keep
+
+
+class GalleryStore:
+    """On-disk face gallery. Not thread-safe on its own except for
+    ``compact_async``; ``FaceDatabase`` calls it under its lock."""
+
+    def __init__(self, db_dir: str, fsync: bool = False,
+                 compact_min_tombstones: int = 64, compact_fraction: float = 0.1):
+        self.db_dir = db_dir
+        self.fsync = fsync
+        self.compact_min_tombstones = compact_min_tombstones
+        self.compact_fraction = compact_fraction
+        self._lock = threading.RLock()
+        self._meta: Optional[dict] = None
+        self._enc_f = None
+        self._rows_f = None
+        self._journal_f = None
+        self._count = 0
+        self._people: list = []
+        self._removed: set = set()
+        self._tombstones = 0
+        self._compact_thread: Optional[threading.Thread] = None
+
+    # --- Paths ---
+
+    @property
+    def _pointer_path(self) -> str:
+        return os.path.join(self.db_dir, "gallery.json")
+
+    def _path(self, kind: str, gen: Optional[int] = None) -> str:
+        gen = self._meta["generation"] if gen is None else gen
+        ext = {"encodings": "f32", "rows": "bin", "journal": "jsonl"}[kind]
+        return os.path.join(self.db_dir, f"{kind}.{gen}.{ext}")
+
+    def exists(self) -> bool:
+        return os.path.exists(self._pointer_path)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._meta["dim"] if self._meta else None
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def tombstones(self) -> int:
+        return self._tombstones
+
+    # --- Open / create ---
+
+    def create(self, dim: int, metric: str = "euclidean"):
+        """Start an empty gallery (generation 0)."""
+        with self._lock:
+            os.makedirs(self.db_dir, exist_ok=True)
+            self._close_files()
+            self._meta = {"version": STORE_VERSION, "generation": 0,
+                          "dim": int(dim), "metric": metric}
+            for kind in ("encodings", "rows", "journal"):
+                open(self._path(kind), "wb").close()
+            _atomic_write_json(self._pointer_path, self._meta)
+            self._count = 0
+            self._people = []
+            self._removed = set()
+            self._tombstones = 0
+            self._open_files()
+
+    def open(self) -> GalleryState:
+        """Map the current generation. Truncates a torn trailing append."""
+        with self._lock:
+            self._close_files()
+            with open(self._pointer_path) as f:
+                self._meta = json.load(f)
+            dim = self._meta["dim"]
+            self._people, self._removed = self._replay_journal(self._path("journal"))
+
+            row_bytes = dim * 4
+            enc_rows = os.path.getsize(self._path("encodings")) // row_bytes
+            meta_rows = os.path.getsize(self._path("rows")) // ROW_DTYPE.itemsize
+            n = min(enc_rows, meta_rows)
+            # An interrupted append leaves one column longer than the other.
+            for kind, size in (("encodings", n * row_bytes), ("rows", n * ROW_DTYPE.itemsize)):
+                if os.path.getsize(self._path(kind)) != size:
+                    with open(self._path(kind), "r+b") as f:
+                        f.truncate(size)
+            self._count = n
+            self._open_files()
+
+            state = GalleryState(
+                dim=dim, metric=self._meta.get("metric", "euclidean"),
+                encodings=_map(self._path("encodings"), np.float32, (dim,), n),
+                rows=_map(self._path("rows"), ROW_DTYPE, (), n),
+                people=list(self._people), removed=set(self._removed),
+                last_seen=self._read_last_seen(),
+            )
+            self._tombstones = state.tombstones
+            return state
+
+    @staticmethod
+    def _replay_journal(path: str) -> tuple[list, set]:
+        people: list = []
+        removed: set = set()
+        if not os.path.exists(path):
+            return people, removed
+        with open(path) as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn last line
+                if op["op"] == "person":
+                    idx = op["idx"]
+                    people.extend([None] * (idx + 1 - len(people)))
+                    people[idx] = op["id"]
+                elif op["op"] == "remove":
+                    removed.add(op["idx"])
+        return people, removed
+
+    def _open_files(self):
+        self._enc_f = open(self._path("encodings"), "ab")
+        self._rows_f = open(self._path("rows"), "ab")
+        self._journal_f = open(self._path("journal"), "a")
+
+    def _close_files(self):
+        for f in (self._enc_f, self._rows_f, self._journal_f):
+            if f is not None:
+                f.close()
+        self._enc_f = self._rows_f = self._journal_f = None
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    # --- Writes ---
+
+    def _sync(self, *files):
+        for f in files:
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def flush(self):
+        """Push buffered appends to the OS (and disk, with ``fsync``)."""
+        with self._lock:
+            if self._enc_f is not None:
+                self._sync(self._enc_f, self._rows_f, self._journal_f)
+
+    def add_person(self, person_id: str, idx: Optional[int] = None, sync: bool = True) -> int:
+        """Journal person index ``idx`` (default: next free) for ``person_id``."""
+        with self._lock:
+            if idx is None:
+                idx = len(self._people)
+            self._people.extend([None] * (idx + 1 - len(self._people)))
+            self._people[idx] = person_id
+            self._journal_f.write(json.dumps({"op": "person", "idx": idx, "id": person_id}) + "\n")
+            if sync:
+                self._sync(self._journal_f)
+            return idx
+
+    def append(self, encodings: np.ndarray, person_idx, sq_norms: np.ndarray,
+               sync: bool = True):
+        """Append rows. ``encodings`` is (k, dim) float32; ``person_idx`` and
+        ``sq_norms`` have k entries. With ``sync=False`` the caller flushes."""
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        rows = np.empty(len(encodings), dtype=ROW_DTYPE)
+        rows["person"] = person_idx
+        rows["sq_norm"] = sq_norms
+        with self._lock:
+            # Encodings first: a torn append is detected as a longer
+            # encodings column and trimmed on the next open.
+            self._enc_f.write(encodings.tobytes())
+            if sync:
+                self._sync(self._enc_f)
+            self._rows_f.write(rows.tobytes())
+            if sync:
+                self._sync(self._rows_f)
+            self._count += len(encodings)
+
+    def remove_person(self, person_idx: int, row_count: int):
+        """Journal a removal; the ``row_count`` rows become tombstones."""
+        with self._lock:
+            self._removed.add(person_idx)
+            self._journal_f.write(json.dumps({"op": "remove", "idx": person_idx}) + "\n")
+            self._sync(self._journal_f)
+            self._tombstones += row_count
+
+    def save_last_seen(self, last_seen: dict):
+        os.makedirs(self.db_dir, exist_ok=True)
+        _atomic_write_json(os.path.join(self.db_dir, "last_seen.json"), last_seen)
+
+    def _read_last_seen(self) -> dict:
+        path = os.path.join(self.db_dir, "last_seen.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def clear(self):
+        """Drop every row by switching to a fresh, empty generation."""
+        with self._lock:
+            old_gen = self._meta["generation"]
+            self._write_generation(old_gen + 1, np.zeros((0, self.dim), np.float32),
+                                   np.zeros(0, ROW_DTYPE), [], set())
+            self._discard_generation(old_gen)
+
+    def rewrite(self, encodings: np.ndarray, rows: np.ndarray):
+        """Replace every row with ``encodings`` / ``rows`` as a new generation.
+
+        The person table and removals are kept. Used after ``prune``-style
+        maintenance where the caller already holds the rows it wants.
+        """
+        with self._lock:
+            old_gen = self._meta["generation"]
+            self._write_generation(old_gen + 1, encodings, rows, self._people, self._removed)
+            self._discard_generation(old_gen)
+
+    def prune(self, max_per_person: int) -> dict:
+        """Drop tombstones and keep at most ``max_per_person`` rows per person."""
+        with self._lock:
+            state = self.open()
+            n = len(state.rows)
+            live = (~np.isin(state.rows["person"], list(state.removed))
+                    if state.removed else np.ones(n, bool))
+            encodings = np.asarray(state.encodings[live])
+            rows = np.asarray(state.rows[live])
+            del state
+            keep = prune_rows(encodings, rows["person"], max_per_person)
+            self.rewrite(encodings[keep], rows[keep])
+            return {"before": n, "after": int(keep.sum())}
+
+    # --- Compaction ---
+
+    def needs_compaction(self) -> bool:
+        return (self._tombstones >= self.compact_min_tombstones
+                and self._tombstones >= self.compact_fraction * max(1, self._count))
+
+    def compact(self) -> dict:
+        """Rewrite the gallery without tombstones as a new generation.
+
+        Rows appended while the bulk copy runs are picked up under the lock
+        before switching over. Returns before/after row counts.
+        """
+        with self._lock:
+            if self._meta is None:
+                return {"before": 0, "after": 0}
+            old_gen = self._meta["generation"]
+            # Rows appended with sync=False may still sit in the file
+            # buffers; push them out before mapping ``_count`` rows.
+            self._sync(self._enc_f, self._rows_f)
+            n = self._count
+            removed = set(self._removed)
+            dim = self.dim
+        t0 = time.perf_counter()
+        encodings = _map(self._path("encodings", old_gen), np.float32, (dim,), n)
+        rows = _map(self._path("rows", old_gen), ROW_DTYPE, (), n)
+        keep = ~np.isin(rows["person"], list(removed)) if removed else np.ones(n, bool)
+        kept_enc = [np.asarray(encodings[keep])]
+        kept_rows = [np.asarray(rows[keep])]
+        del encodings, rows
+
+        with self._lock:
+            if self._meta["generation"] != old_gen:
+                return {"before": n, "after": self._count}  # cleared meanwhile
+            self._sync(self._enc_f, self._rows_f)
+            n2 = self._count
+            removed = set(self._removed)
+            if n2 > n:
+                tail_enc = _map(self._path("encodings"), np.float32, (dim,), n2)[n:]
+                tail_rows = _map(self._path("rows"), ROW_DTYPE, (), n2)[n:]
+                tail_keep = ~np.isin(tail_rows["person"], list(removed))
+                kept_enc.append(np.asarray(tail_enc[tail_keep]))
+                kept_rows.append(np.asarray(tail_rows[tail_keep]))
+            new_enc = np.concatenate(kept_enc)
+            new_rows = np.concatenate(kept_rows)
+            # Removed persons stay in the journal (with their removal) so
+            # person indices and ids are never handed out twice.
+            self._write_generation(old_gen + 1, new_enc, new_rows, self._people, removed)
+            self._discard_generation(old_gen)
+            result = {"before": n2, "after": len(new_enc),
+                      "ms": (time.perf_counter() - t0) * 1000}
+        logger.info(f"Gallery compacted: {result['before']} -> {result['after']} rows "
+                    f"({result['ms']:.0f} ms)")
+        return result
+
+    def compact_async(self) -> bool:
+        """Start ``compact`` in a background thread if it is worthwhile."""
+        with self._lock:
+            if not self.needs_compaction():
+                return False
+            if self._compact_thread is not None and self._compact_thread.is_alive():
+                return False
+            self._compact_thread = threading.Thread(
+                target=self.compact, daemon=True, name="gallery-compact")
+            self._compact_thread.start()
+            return True
+
+    def _write_generation(self, gen: int, encodings, rows, people: list, removed: set):
+        """Write a complete generation and point ``gallery.json`` at it. Caller holds the lock."""
+        meta = dict(self._meta, generation=gen)
+        with open(self._path("encodings", gen), "wb") as f:
+            f.write(np.ascontiguousarray(encodings, dtype=np.float32).tobytes())
+            os.fsync(f.fileno())
+        with open(self._path("rows", gen), "wb") as f:
+            f.write(np.ascontiguousarray(rows, dtype=ROW_DTYPE).tobytes())
+            os.fsync(f.fileno())
+        with open(self._path("journal", gen), "w") as f:
+            for idx, pid in enumerate(people):
+                if pid is not None:
+                    f.write(json.dumps({"op": "person", "idx": idx, "id": pid}) + "\n")
+            for idx in sorted(removed):
+                f.write(json.dumps({"op": "remove", "idx": idx}) + "\n")
+            os.fsync(f.fileno())
+        _atomic_write_json(self._pointer_path, meta)
+
+        self._close_files()
+        self._meta = meta
+        self._count = len(rows)
+        self._people = list(people)
+        self._removed = set(removed)
+        self._tombstones = int(np.isin(rows["person"], list(removed)).sum()) if removed else 0
+        self._open_files()
+
+    def _discard_generation(self, gen: int):
+        for kind in ("encodings", "rows", "journal"):
+            try:
+                os.remove(self._path(kind, gen))
+            except FileNotFoundError:
+                pass
+
+    # --- Legacy import ---
+
+    def import_pickle(self, pkl_path: str, default_dim: int = 128):
+        """Create the gallery from a legacy ``faces.pkl`` and rename the pickle."""
+        with open(pkl_path, "rb") as f:
+            db = pickle.load(f)
+        encodings = np.asarray(db.get("encodings", []), dtype=np.float32)
+        person_ids = list(db.get("person_ids", []))
+        dim = encodings.shape[1] if len(encodings) else default_dim
+        self.create(dim, db.get("metric", "euclidean"))
+        idx_of: dict = {}
+        person_idx = np.empty(len(person_ids), dtype=np.int32)
+        for i, pid in enumerate(person_ids):
+            if pid not in idx_of:
+                idx_of[pid] = self.add_person(pid)
+            person_idx[i] = idx_of[pid]
+        if len(encodings):
+            self.append(encodings, person_idx, np.einsum("ij,ij->i", encodings, encodings))
+        self.save_last_seen(db.get("last_seen", {}))
+        os.replace(pkl_path, pkl_path + ".migrated")
+        logger.info(f"Imported {len(encodings)} encodings from {pkl_path}")
+
+
+def read_gallery(db_dir: str) -> tuple[np.ndarray, list]:
+    """Live ``(encodings, person_ids)`` of a gallery, for offline tools.
+
+    Falls back to a legacy ``faces.pkl`` when the directory has not been
+    migrated yet.
+    """
+    store = GalleryStore(db_dir)
+    if not store.exists():
+        path = os.path.join(db_dir, "faces.pkl")
+        if not os.path.exists(path):
+            return np.zeros((0, 128), np.float32), []
+        with open(path, "rb") as f:
+            db = pickle.load(f)
+        return np.asarray(db.get("encodings", []), np.float32), list(db.get("person_ids", []))
+    state = store.open()
+    store.close()
+    keep = (~np.isin(state.rows["person"], list(state.removed))
+            if state.removed else np.ones(len(state.rows), bool))
+    people = state.people
+    return (np.asarray(state.encodings[keep]),
+            [people[i] for i in state.rows["person"][keep]])
+
+
+class GalleryWriter:
+    """Write-behind queue for gallery appends and face snapshots.
+
+    ``FaceDatabase`` updates its in-memory state immediately and submits
+    the matching disk operations here, so enrollment on the tracking path
+    never waits for disk. A daemon thread collects operations for up to
+    ``flush_interval`` seconds after the first one arrives, coalesces
+    consecutive row appends into one write, encodes JPEG snapshots, and
+    flushes the store once per batch. Operations are applied in order.
+
+    With ``enabled=False`` every operation is applied inline (synchronous
+    behaviour, for tools and tests).
+    """
+
+    def __init__(self, store: GalleryStore, flush_interval: float = 0.5,
+                 max_batch: int = 256, enabled: bool = True):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"ops": 0, "batches": 0, "max_depth": 0, "errors": 0,
+                       "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0}
+
+    # --- Producer side ---
+
+    def submit(self, op: tuple):
+        """Queue ``(kind, *args)``. Kinds: create, person, append, remove,
+        clear, rewrite, last_seen, snapshot."""
+        if not self.enabled:
+            self._apply_batch([op])
+            return
+        self._ensure_thread()
+        self._queue.put(op)
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats["max_depth"] = max(self._stats["max_depth"], depth)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is on disk. Returns False on timeout."""
+        if not self.enabled or self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Flush and stop the worker thread."""
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out["depth"] = self._queue.qsize()
+        out["avg_flush_ms"] = out["total_flush_ms"] / out["batches"] if out["batches"] else 0.0
+        return out
+
+    # --- Worker side ---
+
+    def _ensure_thread(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="gallery-writer")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while first[0] != "flush" and batch[-1] is not None and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    op = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(op)
+                if op is None or op[0] == "flush":
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            self._apply_batch(batch)
+            if stop:
+                return
+
+    def _apply_batch(self, batch: list):
+        t0 = time.perf_counter()
+        waiters = []
+        pending_rows: list = []   # consecutive appends, written as one block
+        last_seen = None
+
+        def write_rows():
+            if pending_rows:
+                enc = np.vstack([r[0] for r in pending_rows])
+                self.store.append(enc, [r[1] for r in pending_rows],
+                                  [r[2] for r in pending_rows], sync=False)
+                pending_rows.clear()
+
+        for op in batch:
+            kind = op[0]
+            try:
+                if kind == "append":
+                    _, person_idx, encoding, sq_norm = op
+                    pending_rows.append((encoding.reshape(1, -1), person_idx, sq_norm))
+                    continue
+                write_rows()
+                if kind == "flush":
+                    waiters.append(op[1])
+                elif kind == "person":
+                    self.store.add_person(op[2], idx=op[1], sync=False)
+                elif kind == "create":
+                    self.store.create(op[1], op[2])
+                elif kind == "remove":
+                    self.store.remove_person(op[1], op[2])
+                elif kind == "clear":
+                    self.store.clear()
+                elif kind == "rewrite":
+                    self.store.rewrite(op[1], op[2])
+                elif kind == "last_seen":
+                    last_seen = op[1]   # only the newest one matters
+                elif kind == "snapshot":
+                    _, path, image = op
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    cv2.imwrite(path, image)
+            except Exception:
+                logger.exception(f"Gallery write failed ({kind})")
+                with self._stats_lock:
+                    self._stats["errors"] += 1
+        try:
+            write_rows()
+            self.store.flush()
+            if last_seen is not None:
+                self.store.save_last_seen(last_seen)
+            if any(op[0] == "remove" for op in batch):
+                self.store.compact_async()
+        except Exception:
+            logger.exception("Gallery flush failed")
+            with self._stats_lock:
+                self._stats["errors"] += 1
+
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        with self._stats_lock:
+            self._stats["ops"] += sum(1 for op in batch if op[0] != "flush")
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+        for done in waiters:
+            done.set()
+
+
+def write_gallery(db_dir: str, encodings, person_ids: list,
+                  metric: str = "euclidean", last_seen: Optional[dict] = None):
+    """Create a new gallery in ``db_dir`` from whole arrays (migration, benchmarks)."""
+    encodings = np.asarray(encodings, dtype=np.float32)
+    store = GalleryStore(db_dir)
+    store.create(encodings.shape[1] if len(encodings) else 128, metric)
+    idx_of: dict = {}
+    person_idx = np.empty(len(person_ids), dtype=np.int32)
+    for i, pid in enumerate(person_ids):
+        if pid not in idx_of:
+            idx_of[pid] = store.add_person(pid)
+        person_idx[i] = idx_of[pid]
+    if len(encodings):
+        store.append(encodings, person_idx, np.einsum("ij,ij->i", encodings, encodings))
+    store.save_last_seen(last_seen or {})
+    store.close()
+
+
+def read_last_seen(db_dir: str) -> dict:
+    """``last_seen`` of a gallery, migrated or legacy."""
+    path = os.path.join(db_dir, "last_seen.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    legacy = os.path.join(db_dir, "faces.pkl")
+    if os.path.exists(legacy):
+        with open(legacy, "rb") as f:
+            return pickle.load(f).get("last_seen", {})
+    return {}
+
+
+def read_metric(db_dir: str) -> str:
+    """Distance metric a gallery was built for, migrated or legacy."""
+    store = GalleryStore(db_dir)
+    if store.exists():
+        with open(store._pointer_path) as f:
+            return json.load(f).get("metric", "euclidean")
+    legacy = os.path.join(db_dir, "faces.pkl")
+    if os.path.exists(legacy):
+        with open(legacy, "rb") as f:
+            return pickle.load(f).get("metric", "euclidean")
+    return "euclidean"
+
+
+# ---------------------------------------------------------------------------
+# Standalone
+# ---------------------------------------------------------------------------
+
+def _gallery_bytes(store: GalleryStore) -> int:
+    return sum(os.path.getsize(store._path(kind)) for kind in ("encodings", "rows", "journal"))
+
+
+def _nearest_person_ms(encodings: np.ndarray, row_person: np.ndarray,
+                       queries: np.ndarray) -> tuple[float, np.ndarray]:
+    """Brute-force 1-NN one query at a time, as the tracker's per-frame
+    batches are small. Returns (ms/query, nearest person per query)."""
+    sq = np.einsum("ij,ij->i", encodings, encodings)
+    out = np.empty(len(queries), dtype=np.int32)
+    t0 = time.perf_counter()
+    for i, q in enumerate(queries):
+        out[i] = row_person[int(np.argmin(sq - 2.0 * (encodings @ q)))]
+    return (time.perf_counter() - t0) * 1000 / max(1, len(queries)), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face gallery store")
+    parser.add_argument("--db-dir", default=os.path.join(_SOURCE_DIR, "known_faces"))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("info", help="Rows, people, tombstones, file sizes")
+    sub.add_parser("compact", help="Rewrite the gallery without tombstones")
+    p = sub.add_parser("prune", help="Keep at most K representative encodings per person")
+    p.add_argument("--max-per-person", type=int, required=True)
+    p.add_argument("--queries", type=int, default=500,
+                   help="Gallery rows replayed as queries for the latency report")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    store = GalleryStore(args.db_dir)
+    if not store.exists():
+        pkl = os.path.join(args.db_dir, "faces.pkl")
+        if not os.path.exists(pkl):
+            raise SystemExit(f"no gallery in {args.db_dir}")
+        store.import_pickle(pkl)
+    state = store.open()
+
+    if args.cmd == "info":
+        live = len(state.rows) - state.tombstones
+        people = len({p for i, p in enumerate(state.people)
+                      if p is not None and i not in state.removed})
+        print(f"gallery:    {args.db_dir} (generation {store._meta['generation']})")
+        print(f"dim/metric: {state.dim} / {state.metric}")
+        print(f"rows:       {len(state.rows)} ({live} live, {state.tombstones} tombstones)")
+        print(f"people:     {people}")
+        for kind in ("encodings", "rows", "journal"):
+            path = store._path(kind)
+            print(f"  {os.path.basename(path):<20} {os.path.getsize(path):>12,d} bytes")
+    elif args.cmd == "compact":
+        r = store.compact()
+        print(f"{r['before']} -> {r['after']} rows")
+    elif args.cmd == "prune":
+        live = (~np.isin(state.rows["person"], list(state.removed))
+                if state.removed else np.ones(len(state.rows), bool))
+        enc_before = np.asarray(state.encodings[live])
+        person_before = np.asarray(state.rows["person"][live])
+        rng = np.random.default_rng(0)
+        pick = rng.choice(len(enc_before), min(args.queries, len(enc_before)), replace=False)
+        queries = enc_before[pick]
+        bytes_before = _gallery_bytes(store)
+        ms_before, _ = _nearest_person_ms(enc_before, person_before, queries)
+        del state
+
+        r = store.prune(args.max_per_person)
+        state = store.open()
+        ms_after, nearest = _nearest_person_ms(np.asarray(state.encodings),
+                                               np.asarray(state.rows["person"]), queries)
+        same = float((nearest == person_before[pick]).mean()) if len(pick) else 1.0
+        print(f"rows:     {r['before']:>8} -> {r['after']}")
+        print(f"bytes:    {bytes_before:>8,d} -> {_gallery_bytes(store):,d}")
+        print(f"ms/query: {ms_before:>8.3f} -> {ms_after:.3f}  (brute force, {len(pick)} queries)")
+        print(f"same nearest person for {same:.1%} of replayed rows")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,15 +15,16 @@ itself only knows stable person IDs.
 
 Can be run standalone:
     python face_tracker.py [--db-dir known_faces] [--camera 0]
+    python face_tracker.py --replay clip.mp4 [--annotations clip.json]   (benchmark, see replay.py)
 """
 
 import copy
 import cv2
-import face_recognition
+from collections import OrderedDict
 import numpy as np
 import os
-import pickle
 import re
+import shutil
 import time
 import threading
 import logging
@@ -34,8 +35,13 @@ from datetime import datetime
 from typing import Optional, Callable, Union
 
 import onnxruntime as ort
+from scipy.optimize import linear_sum_assignment
 
-from events import EventDispatcher
+from events import EventDispatcher, EventLogger
+from metrics import StageMetrics
+from face_detectors import FaceDetector, HogDetector
+from face_embedders import FaceEmbedder, DlibEmbedder
+from face_store import GalleryStore, GalleryWriter, ROW_DTYPE, prune_rows
 
 logger = logging.getLogger("face_tracker")
 
@@ -207,133 +213,502 @@ class Identity:
 
 
 # ---------------------------------------------------------------------------
-# FaceDatabase and EmotionDetector (unchanged)
+# FaceDatabase and EmotionDetector
 # ---------------------------------------------------------------------------
 
 class FaceDatabase:
-    """Persistent face encoding database keyed by stable person_id."""
+    """Persistent face encoding database keyed by stable person_id.
+
+    Encodings are persisted by ``face_store.GalleryStore``: enrollment
+    appends one row, and loading memory-maps the gallery instead of
+    unpickling it. Disk writes (rows, journal, snapshots) go through a
+    write-behind ``GalleryWriter`` so enrollment on the tracking path
+    only touches memory; call ``flush`` or ``close`` before exiting.
+
+    In memory the encodings live in a growable float32 matrix with
+    precomputed squared norms and a per-row person index, so recognition
+    is a single matrix product. Right after ``load`` the matrix is the
+    read-only memory map itself; the first append copies it into RAM with
+    spare capacity.
+
+    An optional ``index`` (see ``face_index.IVFIndex``) narrows each query
+    to a candidate set that is then re-ranked exactly, for galleries large
+    enough that brute force shows up in the frame budget.
+
+    ``metric`` is ``"euclidean"`` (dlib encodings) or ``"cosine"`` for
+    L2-normalised embeddings such as ArcFace, where the distance is
+    ``1 - cos`` — half the squared Euclidean distance, so the same matrix
+    product (and index) serves both.
+
+    ``max_per_person`` bounds the gallery: once a person has twice that
+    many encodings, a background thread runs ``compact_gallery`` to keep
+    the most diverse ``max_per_person`` of them. With ``centroid_candidates`` set and no
+    ready index, each query is first compared against per-person centroids
+    and only the closest people's encodings are scored exactly.
+    """
 
-    SCHEMA_VERSION = 2
+    _INITIAL_CAPACITY = 256
 
-    def __init__(self, db_dir: str = _KNOWN_FACES_DIR, tolerance: float = 0.6):
+    def __init__(self, db_dir: str = _KNOWN_FACES_DIR, tolerance: float = 0.6,
+                 index=None, metric: str = "euclidean",
+                 write_behind: bool = True, flush_interval: float = 0.5,
+                 max_per_person: int = 0, centroid_candidates: int = 0):
+        if metric not in ("euclidean", "cosine"):
+            raise ValueError(f"unknown metric {metric!r} (expected 'euclidean' or 'cosine')")
         self.db_dir = db_dir
         self.tolerance = tolerance
-        self._db = {
-            "encodings": [],
-            "person_ids": [],
-            "last_seen": {},
-            "schema_version": self.SCHEMA_VERSION,
-        }
+        self.index = index
+        self.metric = metric
+        self.max_per_person = max_per_person
+        self.centroid_candidates = centroid_candidates
+        self._store = GalleryStore(db_dir)
+        self._store_ready = False
+        self._writer = GalleryWriter(self._store, flush_interval, enabled=write_behind)
         self._lock = threading.Lock()
+        self._matrix = np.zeros((0, 128), dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._row_person = np.zeros(0, dtype=np.int32)   # row -> person index
+        self._count = 0
+        self._people: list = []                # person index -> person_id (incl. removed)
+        self._person_idx: dict[str, int] = {}  # live person_id -> person index
+        self._last_seen: dict[str, float] = {}
+
+        # Derived indexes, kept incrementally on add and rebuilt lazily
+        # (None) after remove/clear/load: person index -> row numbers, and
+        # the set of person ids that have at least one row.
+        self._rows_by_person: Optional[dict[int, list[int]]] = None
+        self._known_ids: Optional[frozenset] = None
+        self._centroids: Optional[tuple] = None   # (person indices, centroid matrix)
+        self._next_person_number = 1   # for allocate_person_id, never reused
+        self._prune_pending: set = set()   # person ids waiting for compact_gallery
+        self._prune_thread: Optional[threading.Thread] = None
 
     def load(self):
-        db_file = os.path.join(self.db_dir, "faces.pkl")
-        if os.path.exists(db_file):
-            with open(db_file, "rb") as f:
-                self._db = pickle.load(f)
-            self._db.setdefault("last_seen", {})
-            self._db.setdefault("person_ids", [])
-            self._db.setdefault("schema_version", self.SCHEMA_VERSION)
+        legacy = os.path.join(self.db_dir, "faces.pkl")
+        if not self._store.exists() and os.path.exists(legacy):
+            self._store.import_pickle(legacy)
+        with self._lock:
+            if self._store.exists():
+                self._adopt_state(self._store.open())
+            elif self.index is not None:
+                self.index.build(self._matrix[:self._count])
         logger.info(
             f"Database loaded: {len(self.known_person_ids)} people, "
             f"{self.encoding_count} encodings"
         )
 
+    def _adopt_state(self, state):
+        """Take over the people, rows and last-seen times of an opened
+        gallery and (re)build the index. Caller holds the lock."""
+        self._store_ready = True
+        if state.metric != self.metric:
+            logger.warning(
+                f"Gallery {self.db_dir} was built for {state.metric!r} distances "
+                f"but the database is configured for {self.metric!r}; "
+                f"re-embed it with face_embedders.py migrate"
+            )
+        self._people = state.people
+        self._person_idx = {pid: i for i, pid in enumerate(state.people)
+                            if pid is not None and i not in state.removed}
+        for pid in state.people:
+            self._bump_person_number(pid)
+        self._last_seen = state.last_seen
+        if state.tombstones:
+            keep = ~np.isin(state.rows["person"], list(state.removed))
+            self._set_rows(state.encodings[keep], state.rows["sq_norm"][keep],
+                           state.rows["person"][keep])
+            self._store.compact_async()
+        else:
+            self._matrix = state.encodings
+            self._sq_norms = state.rows["sq_norm"]
+            self._row_person = state.rows["person"]
+            self._count = len(state.rows)
+            self._rows_by_person = None
+            self._known_ids = None
+            self._centroids = None
+        if self.index is not None:
+            self.index.build(self._matrix[:self._count])
+
     def save(self):
-        os.makedirs(self.db_dir, exist_ok=True)
-        db_file = os.path.join(self.db_dir, "faces.pkl")
+        """Persist ``last_seen``. Encodings are written as they are added."""
         with self._lock:
-            with open(db_file, "wb") as f:
-                pickle.dump(self._db, f)
+            last_seen = dict(self._last_seen)
+        self._writer.submit(("last_seen", last_seen))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all queued gallery writes are on disk."""
+        return self._writer.flush(timeout)
+
+    def close(self):
+        """Finish pending pruning, flush pending writes and stop the writer thread."""
+        thread = self._prune_thread
+        if thread is not None:
+            thread.join(5.0)
+        self.save()
+        self._writer.close()
+
+    @property
+    def persistence_stats(self) -> dict:
+        """Write-behind queue depth, batches and flush latency."""
+        return self._writer.stats
 
     def recognize(self, encoding: np.ndarray) -> tuple:
+        return self.recognize_batch([encoding])[0]
+
+    def recognize_batch(self, encodings) -> list[tuple]:
+        """Recognize several encodings with one matrix product.
+
+        Returns a ``(person_id, confidence)`` tuple per input encoding,
+        ``(None, 0.0)`` where nothing is within ``tolerance``. Euclidean
+        distances match ``face_recognition.face_distance``.
+        """
+        if len(encodings) == 0:
+            return []
+        # Snapshot under the lock. Rows are only ever appended past
+        # ``_count`` or replaced wholesale, so the views stay consistent
+        # after the lock is released.
+        queries = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
         with self._lock:
-            if not self._db["encodings"]:
-                return (None, 0.0)
-            distances = face_recognition.face_distance(self._db["encodings"], encoding)
-            best_idx = np.argmin(distances)
-            best_dist = distances[best_idx]
-            if best_dist < self.tolerance:
-                person_id = self._db["person_ids"][best_idx]
-                confidence = max(0.0, 1.0 - best_dist) * 100
-                return (person_id, confidence)
+            n = self._count
+            matrix = self._matrix[:n]
+            sq_norms = self._sq_norms[:n]
+            row_person = self._row_person[:n]
+            people = self._people
+            candidates = None
+            if self.index is not None and self.index.ready:
+                candidates = [self.index.candidates(q) for q in queries]
+            elif self.centroid_candidates and n:
+                candidates = self._centroid_candidates(queries)
+        if n == 0:
+            return [(None, 0.0)] * len(encodings)
+        if candidates is not None:
+            return [self._rerank(q, rows, matrix, sq_norms, row_person, people)
+                    for q, rows in zip(queries, candidates)]
+
+        # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g
+        sq_dist = queries @ matrix.T
+        sq_dist *= -2.0
+        sq_dist += sq_norms[None, :]
+        sq_dist += np.einsum("ij,ij->i", queries, queries)[:, None]
+        best_idx = np.argmin(sq_dist, axis=1)
+        best_dist = self._from_sq(np.maximum(sq_dist[np.arange(len(queries)), best_idx], 0.0))
+
+        return [self._verdict(people[row_person[idx]], dist)
+                for idx, dist in zip(best_idx, best_dist)]
+
+    def _centroid_candidates(self, queries: np.ndarray) -> Optional[list]:
+        """Rows of the ``centroid_candidates`` people whose centroids are
+        nearest each query. None when that would not narrow anything.
+        Caller holds the lock."""
+        if self._centroids is None:
+            groups = self._person_rows()
+            persons = np.fromiter(groups, dtype=np.int32, count=len(groups))
+            cents = np.stack([self._matrix[groups[p]].mean(axis=0) for p in persons]).astype(np.float32)
+            self._centroids = (persons, cents, np.einsum("ij,ij->i", cents, cents))
+        persons, cents, cent_sq = self._centroids
+        c = self.centroid_candidates
+        if len(persons) <= c:
+            return None
+        groups = self._person_rows()
+        scores = cent_sq[None, :] - 2.0 * (queries @ cents.T)
+        nearest = np.argpartition(scores, c - 1, axis=1)[:, :c]
+        return [np.concatenate([groups[int(persons[j])] for j in row]).astype(np.intp)
+                for row in nearest]
+
+    def _rerank(self, query, rows, matrix, sq_norms, row_person, people) -> tuple:
+        """Exact distances over the index's candidate rows for one query."""
+        if len(rows) == 0:
             return (None, 0.0)
+        sq_dist = sq_norms[rows] - 2.0 * (matrix[rows] @ query) + float(query @ query)
+        best = int(np.argmin(sq_dist))
+        return self._verdict(people[row_person[rows[best]]],
+                             self._from_sq(max(float(sq_dist[best]), 0.0)))
+
+    def _from_sq(self, sq_dist):
+        """Squared Euclidean distance -> the configured metric."""
+        return sq_dist / 2.0 if self.metric == "cosine" else np.sqrt(sq_dist)
+
+    def _verdict(self, person_id, dist) -> tuple:
+        if dist < self.tolerance:
+            return (person_id, max(0.0, 1.0 - float(dist)) * 100)
+        return (None, 0.0)
+
+    def _set_rows(self, encodings, sq_norms, row_person, capacity: int = 0):
+        """Replace the in-memory rows with fresh arrays. Caller holds the lock.
+
+        Always allocates so snapshots taken by concurrent ``recognize_batch``
+        calls are never mutated underneath them.
+        """
+        n = len(encodings)
+        capacity = max(self._INITIAL_CAPACITY, capacity, 2 * n)
+        dim = encodings.shape[1] if encodings.ndim == 2 and encodings.shape[1] else self._matrix.shape[1]
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        matrix[:n] = encodings
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:n] = sq_norms
+        persons = np.zeros(capacity, dtype=np.int32)
+        persons[:n] = row_person
+        self._matrix, self._sq_norms, self._row_person = matrix, norms, persons
+        self._count = n
+        self._rows_by_person = None
+        self._known_ids = None
+        self._centroids = None
+
+    def _person_rows(self) -> dict[int, list[int]]:
+        """Person index -> row numbers, built on first use. Caller holds the lock."""
+        if self._rows_by_person is None:
+            persons = np.asarray(self._row_person[:self._count])
+            order = np.argsort(persons, kind="stable")
+            uniq, starts = np.unique(persons[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            self._rows_by_person = {int(p): order[s:e].tolist()
+                                    for p, s, e in zip(uniq, starts, ends)}
+        return self._rows_by_person
+
+    def _bump_person_number(self, person_id: Optional[str]):
+        m = re.match(r"^p(\d+)$", person_id or "")
+        if m:
+            self._next_person_number = max(self._next_person_number, int(m.group(1)) + 1)
+
+    def allocate_person_id(self) -> str:
+        """Reserve the next ``pNNN`` id. Ids are never handed out twice."""
+        with self._lock:
+            n = self._next_person_number
+            self._next_person_number += 1
+        return f"p{n:03d}"
+
+    def _append_row(self, encoding: np.ndarray, person_idx: int) -> float:
+        """Append one encoding, doubling capacity when full. Returns its
+        squared norm. Caller holds the lock."""
+        row = np.asarray(encoding, dtype=np.float32).reshape(-1)
+        if self._count and self._matrix.shape[1] != len(row):
+            raise ValueError(f"encoding has {len(row)} dims, gallery has {self._matrix.shape[1]}")
+        n = self._count
+        if n >= len(self._matrix) or not self._matrix.flags.writeable:
+            if n == 0:
+                self._matrix = np.zeros((0, len(row)), dtype=np.float32)
+            self._set_rows(self._matrix[:n], self._sq_norms[:n], self._row_person[:n],
+                           capacity=2 * (n + 1))
+        sq_norm = float(row @ row)
+        self._matrix[n] = row
+        self._sq_norms[n] = sq_norm
+        self._row_person[n] = person_idx
+        self._count = n + 1
+        if self._rows_by_person is not None:
+            self._rows_by_person.setdefault(person_idx, []).append(n)
+        self._centroids = None
+        if self.index is not None:
+            self.index.add(n, self._matrix[n], self._matrix[:self._count])
+        return sq_norm
 
     def add_face(self, person_id: str, encoding: np.ndarray,
                  frame: np.ndarray, bbox: tuple):
         with self._lock:
-            self._db["encodings"].append(encoding)
-            self._db["person_ids"].append(person_id)
-            sample_count = self._db["person_ids"].count(person_id)
-        self.save()
+            self._ensure_store(len(encoding))
+            idx = self._person_idx.get(person_id)
+            if idx is None:
+                idx = len(self._people)
+                self._people = self._store_people(idx, person_id)
+                self._person_idx[person_id] = idx
+                self._bump_person_number(person_id)
+                self._writer.submit(("person", idx, person_id))
+            sq_norm = self._append_row(encoding, idx)
+            self._writer.submit(("append", idx, self._matrix[self._count - 1].copy(), sq_norm))
+            sample_count = len(self._person_rows().get(idx, ()))
+            if self._known_ids is not None and person_id not in self._known_ids:
+                self._known_ids = self._known_ids | {person_id}
         self._save_face_image(person_id, frame, bbox)
         logger.info(f"Added face for {person_id!r} ({sample_count} samples)")
+        if self.max_per_person and sample_count >= 2 * self.max_per_person:
+            self._prune_async(person_id)
+
+    def _prune_async(self, person_id: str):
+        """Queue ``person_id`` for ``compact_gallery`` on a background thread,
+        so farthest-point sampling never runs on the tracking path."""
+        with self._lock:
+            self._prune_pending.add(person_id)
+            if self._prune_thread is not None and self._prune_thread.is_alive():
+                return
+            self._prune_thread = threading.Thread(target=self._prune_loop, daemon=True,
+                                                  name="gallery-prune")
+            self._prune_thread.start()
+
+    def _prune_loop(self):
+        while True:
+            with self._lock:
+                person_ids = list(self._prune_pending)
+                self._prune_pending.clear()
+                if not person_ids:
+                    self._prune_thread = None
+                    return
+            try:
+                self.compact_gallery(person_ids=person_ids)
+            except Exception as e:
+                logger.error(f"Gallery pruning failed for {person_ids}: {e}")
+
+    def compact_gallery(self, max_per_person: Optional[int] = None,
+                        person_ids: Optional[list] = None) -> dict:
+        """Keep at most ``max_per_person`` diverse encodings per person.
+
+        Representatives are picked by farthest-point sampling
+        (``face_store.select_representatives``). Only ``person_ids`` are
+        touched when given. Safe to call while tracking: memory is updated
+        at once and the store rewrite goes through the write-behind queue.
+        Returns row counts and the time spent in memory.
+        """
+        k = max_per_person or self.max_per_person
+        if k <= 0:
+            raise ValueError("max_per_person must be positive")
+        t0 = time.perf_counter()
+        with self._lock:
+            n = self._count
+            persons = None
+            if person_ids is not None:
+                persons = {self._person_idx[p] for p in person_ids if p in self._person_idx}
+            matrix = self._matrix[:n]
+            keep = prune_rows(matrix, self._row_person[:n], k, persons)
+            dropped = int(n - keep.sum())
+            if dropped:
+                self._set_rows(matrix[keep], self._sq_norms[:n][keep], self._row_person[:n][keep])
+                if self.index is not None:
+                    self.index.reassign(self._matrix[:self._count])
+                if self._store_ready:
+                    rows = np.empty(self._count, dtype=ROW_DTYPE)
+                    rows["person"] = self._row_person[:self._count]
+                    rows["sq_norm"] = self._sq_norms[:self._count]
+                    self._writer.submit(("rewrite", self._matrix[:self._count].copy(), rows))
+        result = {"before": n, "after": n - dropped,
+                  "ms": (time.perf_counter() - t0) * 1000}
+        if dropped:
+            logger.info(f"Gallery compacted to {k}/person: {n} -> {n - dropped} encodings "
+                        f"({result['ms']:.1f} ms)")
+        return result
+
+    def _ensure_store(self, dim: int):
+        """Open the on-disk gallery, creating it on first enrollment. Caller holds the lock."""
+        if self._store_ready:
+            return
+        if self._store.exists():
+            # load() was skipped: adopt the journal's people and rows so
+            # new person indexes and ids do not collide with stored ones.
+            logger.warning(f"Gallery {self.db_dir} opened without load(); loading it now")
+            self._adopt_state(self._store.open())
+            return
+        self._writer.submit(("create", dim, self.metric))
+        self._store_ready = True
+
+    def _store_people(self, idx: int, person_id: str) -> list:
+        """Person table with ``idx`` set, as a new list (snapshots keep the old one)."""
+        people = list(self._people)
+        people.extend([None] * (idx + 1 - len(people)))
+        people[idx] = person_id
+        return people
 
     def update_last_seen(self, person_id: str):
         with self._lock:
-            self._db["last_seen"][person_id] = datetime.now().timestamp()
+            self._last_seen[person_id] = datetime.now().timestamp()
 
     def get_last_seen(self, person_id: str) -> Optional[float]:
-        return self._db["last_seen"].get(person_id)
+        return self._last_seen.get(person_id)
 
     def clear(self):
         with self._lock:
-            self._db = {
-                "encodings": [],
-                "person_ids": [],
-                "last_seen": {},
-                "schema_version": self.SCHEMA_VERSION,
-            }
+            if self._store_ready or self._store.exists():
+                self._ensure_store(self._matrix.shape[1])
+                self._writer.submit(("clear",))
+            self._set_rows(np.zeros((0, self._matrix.shape[1]), np.float32),
+                           np.zeros(0, np.float32), np.zeros(0, np.int32))
+            self._people = []
+            self._person_idx = {}
+            self._last_seen = {}
+            if self.index is not None:
+                self.index.build(self._matrix[:0])
         self.save()
         logger.info("Database cleared")
 
     def remove_person(self, person_id: str) -> int:
-        """Drop all encodings for ``person_id``. Returns number removed."""
+        """Drop all encodings for ``person_id``. Returns number removed.
+
+        The rows become tombstones on disk; the store compacts them away in
+        the background once enough have accumulated.
+        """
         with self._lock:
-            keep_enc = []
-            keep_ids = []
-            removed = 0
-            for enc, pid in zip(self._db["encodings"], self._db["person_ids"]):
-                if pid == person_id:
-                    removed += 1
-                else:
-                    keep_enc.append(enc)
-                    keep_ids.append(pid)
-            self._db["encodings"] = keep_enc
-            self._db["person_ids"] = keep_ids
-            self._db["last_seen"].pop(person_id, None)
+            idx = self._person_idx.pop(person_id, None)
+            if idx is None:
+                return 0
+            n = self._count
+            removed = len(self._person_rows().get(idx, ()))
+            self._writer.submit(("remove", idx, removed))
+            self._last_seen.pop(person_id, None)
+            if removed:
+                keep = self._row_person[:n] != idx
+                self._set_rows(self._matrix[:n][keep], self._sq_norms[:n][keep],
+                               self._row_person[:n][keep])
+                if self.index is not None:
+                    self.index.reassign(self._matrix[:self._count])
+        self.save()
         if removed:
-            self.save()
             logger.info(f"Removed {removed} encodings for {person_id!r}")
         return removed
 
     @property
-    def known_person_ids(self) -> set:
-        return set(self._db["person_ids"])
+    def known_person_ids(self) -> frozenset:
+        """Person ids with at least one encoding (cached)."""
+        known = self._known_ids
+        if known is None:
+            with self._lock:
+                if self._known_ids is None:
+                    self._known_ids = frozenset(self._people[i] for i in self._person_rows())
+                known = self._known_ids
+        return known
+
+    def sample_count(self, person_id: str) -> int:
+        """Number of encodings stored for ``person_id``."""
+        with self._lock:
+            idx = self._person_idx.get(person_id)
+            return len(self._person_rows().get(idx, ())) if idx is not None else 0
+
+    def rows_for_person(self, person_id: str) -> list[int]:
+        """Matrix row numbers holding ``person_id``'s encodings."""
+        with self._lock:
+            idx = self._person_idx.get(person_id)
+            return list(self._person_rows().get(idx, ())) if idx is not None else []
 
     @property
     def encoding_count(self) -> int:
-        return len(self._db["encodings"])
+        return self._count
 
     @property
     def last_seen_map(self) -> dict:
-        return dict(self._db["last_seen"])
+        return dict(self._last_seen)
 
     def _save_face_image(self, person_id, frame, bbox):
         top, right, bottom, left = bbox
-        face_img = frame[top:bottom, left:right]
-        person_dir = os.path.join(self.db_dir, person_id)
-        os.makedirs(person_dir, exist_ok=True)
+        face_img = frame[max(0, top):bottom, max(0, left):right].copy()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        cv2.imwrite(os.path.join(person_dir, f"{timestamp}.jpg"), face_img)
+        path = os.path.join(self.db_dir, person_id, f"{timestamp}.jpg")
+        self._writer.submit(("snapshot", path, face_img))
 
 
 class EmotionDetector:
-    """ONNX-based facial emotion detection."""
+    """ONNX-based facial emotion detection.
 
-    def __init__(self, model_dir: str = EMOTION_MODEL_DIR):
+    ``detect_batch`` preprocesses every face into one preallocated
+    N x 1 x 64 x 64 buffer and runs a single ``session.run`` when the model
+    accepts a dynamic batch. The stock FER+ model is exported with a fixed
+    batch of 1, so it is fed one row at a time from the same buffer.
+    """
+
+    _SIZE = 64
+
+    def __init__(self, model_dir: str = EMOTION_MODEL_DIR,
+                 intra_op_threads: int = 0, optimize_graph: bool = True):
         self.model_dir = model_dir
         self.session = None
+        self._intra_op_threads = intra_op_threads
+        self._optimize_graph = optimize_graph
+        self._buffer = np.empty((0, 1, self._SIZE, self._SIZE), dtype=np.float32)
+        self._gray = np.empty((self._SIZE, self._SIZE), dtype=np.uint8)
         self._ensure_model()
 
     def _ensure_model(self):
@@ -344,19 +719,173 @@ class EmotionDetector:
             import urllib.request
             urllib.request.urlretrieve(EMOTION_MODEL_URL, model_path)
             logger.info("Emotion model downloaded.")
-        self.session = ort.InferenceSession(model_path)
+        opts = ort.SessionOptions()
+        if self._intra_op_threads:
+            opts.intra_op_num_threads = self._intra_op_threads
+        opts.graph_optimization_level = (ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                                         if self._optimize_graph
+                                         else ort.GraphOptimizationLevel.ORT_DISABLE_ALL)
+        self.session = ort.InferenceSession(model_path, opts,
+                                            providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self._input_name = inp.name
+        self._fixed_batch = isinstance(inp.shape[0], int) and inp.shape[0] == 1
 
     def detect(self, face_bgr: np.ndarray) -> tuple:
-        gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY)
-        resized = cv2.resize(gray, (64, 64))
-        input_data = resized.astype(np.float32).reshape(1, 1, 64, 64)
-        input_name = self.session.get_inputs()[0].name
-        result = self.session.run(None, {input_name: input_data})
-        scores = result[0][0]
-        exp_scores = np.exp(scores - np.max(scores))
-        probs = exp_scores / exp_scores.sum()
-        idx = np.argmax(probs)
-        return EMOTION_LABELS[idx], float(probs[idx])
+        return self.detect_batch([face_bgr])[0]
+
+    def detect_batch(self, faces_bgr: list) -> list[tuple]:
+        """Classify several BGR face crops. Returns ``(label, prob)`` per crop."""
+        n = len(faces_bgr)
+        if n == 0:
+            return []
+        if len(self._buffer) < n:
+            self._buffer = np.empty((n, 1, self._SIZE, self._SIZE), dtype=np.float32)
+        batch = self._buffer[:n]
+        size = (self._SIZE, self._SIZE)
+        for i, face in enumerate(faces_bgr):
+            # Resize first so the colour conversion touches 64x64 pixels only.
+            small = cv2.resize(face, size, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            batch[i, 0] = self._gray
+
+        if self._fixed_batch:
+            scores = np.concatenate([
+                self.session.run(None, {self._input_name: batch[i:i + 1]})[0]
+                for i in range(n)
+            ])
+        else:
+            scores = self.session.run(None, {self._input_name: batch})[0]
+        scores = scores.reshape(n, -1)
+        exp_scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        probs = exp_scores / exp_scores.sum(axis=1, keepdims=True)
+        idx = probs.argmax(axis=1)
+        return [(EMOTION_LABELS[k], float(probs[i, k])) for i, k in enumerate(idx)]
+
+
+class FlowPropagator:
+    """Moves track bboxes between detections with sparse optical flow.
+
+    On detection frames ``reseed`` picks corner features inside each face
+    box; on the frames in between ``propagate`` follows them with
+    pyramidal Lucas-Kanade on a downscaled grayscale frame and returns the
+    median translation and scale change per track. Coordinates are in the
+    downscaled frame.
+    """
+
+    def __init__(self, max_corners: int = 30, min_points: int = 4):
+        self._max_corners = max_corners
+        self._min_points = min_points
+        self._prev_gray: Optional[np.ndarray] = None
+        self._points: dict[int, np.ndarray] = {}  # track_id -> (N, 1, 2) float32
+
+    def reseed(self, gray: np.ndarray, boxes: dict[int, tuple]):
+        """Pick fresh features for ``{track_id: (top, right, bottom, left)}``."""
+        self._prev_gray = gray
+        self._points = {}
+        h, w = gray.shape[:2]
+        for track_id, (top, right, bottom, left) in boxes.items():
+            top, left = max(0, int(top)), max(0, int(left))
+            bottom, right = min(h, int(bottom)), min(w, int(right))
+            if bottom - top < 8 or right - left < 8:
+                continue
+            corners = cv2.goodFeaturesToTrack(
+                gray[top:bottom, left:right], maxCorners=self._max_corners,
+                qualityLevel=0.01, minDistance=3)
+            if corners is not None and len(corners) >= self._min_points:
+                corners[:, 0, 0] += left
+                corners[:, 0, 1] += top
+                self._points[track_id] = corners.astype(np.float32)
+
+    def propagate(self, gray: np.ndarray) -> dict[int, Optional[tuple]]:
+        """Track features into ``gray``.
+
+        Returns ``{track_id: (dx, dy, scale)}``, or ``None`` for a track
+        whose features were lost (caller should re-detect).
+        """
+        motion: dict[int, Optional[tuple]] = {}
+        if self._prev_gray is None or not self._points:
+            self._prev_gray = gray
+            return motion
+        for track_id, p0 in list(self._points.items()):
+            p1, status, _ = cv2.calcOpticalFlowPyrLK(
+                self._prev_gray, gray, p0, None, winSize=(15, 15), maxLevel=2)
+            good = status.reshape(-1) == 1 if p1 is not None else np.zeros(0, bool)
+            if good.sum() < self._min_points:
+                del self._points[track_id]
+                motion[track_id] = None
+                continue
+            old = p0[good].reshape(-1, 2)
+            new = p1[good].reshape(-1, 2)
+            dx, dy = np.median(new - old, axis=0)
+            old_spread = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+            new_spread = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+            scale = float(new_spread / old_spread) if old_spread > 1e-3 else 1.0
+            motion[track_id] = (float(dx), float(dy), float(np.clip(scale, 0.8, 1.25)))
+            self._points[track_id] = new.reshape(-1, 1, 2).astype(np.float32)
+        self._prev_gray = gray
+        return motion
+
+    def drop(self, track_id: int):
+        self._points.pop(track_id, None)
+
+
+class CropPool:
+    """Bounded store of padded face crops for tracks awaiting enrollment.
+
+    Holding the whole BGR frame per track keeps ~6 MB alive for every
+    passer-by at 1080p. The pool keeps only a padded crop around the face
+    and evicts the least recently written entries once ``max_bytes`` is
+    exceeded.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, padding: float = 0.25):
+        self.max_bytes = max_bytes
+        self.padding = padding
+        self._entries: OrderedDict[int, tuple] = OrderedDict()  # track_id -> (crop, bbox)
+        self._bytes = 0
+        self._peak_bytes = 0
+        self._evictions = 0
+
+    def put(self, track_id: int, frame: np.ndarray, bbox: tuple):
+        """Store a crop of ``frame`` around ``bbox`` (top, right, bottom, left)."""
+        self.pop(track_id)
+        h, w = frame.shape[:2]
+        top, right, bottom, left = bbox
+        pad_y = int((bottom - top) * self.padding)
+        pad_x = int((right - left) * self.padding)
+        y0, y1 = max(0, top - pad_y), min(h, bottom + pad_y)
+        x0, x1 = max(0, left - pad_x), min(w, right + pad_x)
+        if y1 <= y0 or x1 <= x0:
+            return
+        crop = frame[y0:y1, x0:x1].copy()
+        rel_bbox = (top - y0, right - x0, bottom - y0, left - x0)
+        self._entries[track_id] = (crop, rel_bbox)
+        self._bytes += crop.nbytes
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self.pop(oldest)
+            self._evictions += 1
+        self._peak_bytes = max(self._peak_bytes, self._bytes)
+
+    def get(self, track_id: int) -> Optional[tuple]:
+        """``(crop, bbox_in_crop)`` for a track, or None."""
+        return self._entries.get(track_id)
+
+    def pop(self, track_id: int):
+        entry = self._entries.pop(track_id, None)
+        if entry is not None:
+            self._bytes -= entry[0].nbytes
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "peak_bytes": self._peak_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+        }
 
 
 # ---------------------------------------------------------------------------
@@ -373,12 +902,16 @@ class FaceTracker:
     Subscribe to typed FaceEvent callbacks via subscribe().
     """
 
+    # Cost assigned to detection/track pairs that fail both gates.
+    _GATED_COST = 1e6
+
     def __init__(self,
                  db: FaceDatabase,
                  emotion_detector: EmotionDetector,
                  frame_scale: float = 0.5,
-                 track_encoding_threshold: float = 0.5,
+                 track_encoding_threshold: Optional[float] = None,
                  track_iou_threshold: float = 0.3,
+                 track_iou_weight: float = 0.5,
                  max_missing_seconds: float = 2.0,
                  recognition_confirm_seconds: float = 0.15,
                  recognition_revoke_seconds: float = 0.25,
@@ -386,12 +919,38 @@ class FaceTracker:
                  focus_switch_seconds: float = 0.5,
                  emotion_debounce_seconds: float = 0.3,
                  auto_enroll: bool = True,
-                 enroll_min_frames: int = 10):
+                 enroll_min_frames: int = 10,
+                 lazy_encoding: bool = False,
+                 encoding_refresh_frames: int = 5,
+                 encoding_reuse_iou: float = 0.5,
+                 encoding_min_frames: int = 3,
+                 min_detect_interval: int = 1,
+                 max_detect_interval: int = 4,
+                 motion_propagation: bool = True,
+                 motion_redetect_fraction: float = 0.15,
+                 scene_change_threshold: float = 6.0,
+                 detector: Optional[FaceDetector] = None,
+                 embedder: Optional[FaceEmbedder] = None,
+                 emotion_interval_frames: int = 5,
+                 emotion_redetect_iou: float = 0.6,
+                 crop_pool_bytes: int = 32 * 1024 * 1024,
+                 crop_padding: float = 0.25,
+                 clock: Callable[[], float] = time.time):
         self.db = db
+        # Wall clock for track/identity/focus/event timestamps. Replay
+        # (replay.py) injects a clock driven by frame timestamps so that
+        # hysteresis and time-to-confirm do not depend on processing speed.
+        self._clock = clock
         self.emotion_detector = emotion_detector
+        self.detector = detector or HogDetector()
+        self.embedder = embedder or DlibEmbedder()
         self.frame_scale = frame_scale
-        self._track_enc_thresh = track_encoding_threshold
+        self._cosine = self.embedder.metric == "cosine"
+        self._track_enc_thresh = (track_encoding_threshold
+                                  if track_encoding_threshold is not None
+                                  else self.embedder.track_threshold)
         self._track_iou_thresh = track_iou_threshold
+        self._track_iou_weight = track_iou_weight
         self._max_missing_s = max_missing_seconds
         self._confirm_s = recognition_confirm_seconds
         self._revoke_s = recognition_revoke_seconds
@@ -399,12 +958,39 @@ class FaceTracker:
         self._auto_enroll = auto_enroll
         self._enroll_min_frames = enroll_min_frames
 
+        # Lazy encoding: established tracks that a detection overlaps
+        # unambiguously reuse their encoding instead of running the dlib
+        # encoder; each track is re-encoded at least every
+        # ``encoding_refresh_frames`` detections.
+        self._lazy_encoding = lazy_encoding
+        self._encoding_refresh_frames = encoding_refresh_frames
+        self._encoding_reuse_iou = encoding_reuse_iou
+        self._encoding_min_frames = encoding_min_frames
+        self._encode_age: dict[int, int] = {}  # track_id -> detections since last encode
+        self._encoding_stats = {"computed": 0, "skipped": 0}
+
         self._tracks: list[TrackedFace] = []
         self._identities: dict[int, Identity] = {}
-        self._last_frames: dict[int, np.ndarray] = {}
+        # Padded face crops of unidentified tracks, for auto-enrollment.
+        self._crops = CropPool(crop_pool_bytes, crop_padding)
         self._next_id = 1
         self._lock = threading.Lock()
-        self._skip_frame = False
+
+        # Adaptive detection cadence: the HOG detector runs every
+        # ``_detect_interval`` frames, between ``min_detect_interval`` and
+        # ``max_detect_interval``. Static scenes back off; motion, new or
+        # lost faces, or a global scene change snap back to the minimum.
+        # In between, ``FlowPropagator`` keeps bboxes moving.
+        self._min_detect_interval = max(1, min_detect_interval)
+        self._max_detect_interval = max(self._min_detect_interval, max_detect_interval)
+        self._detect_interval = self._min_detect_interval
+        self._frames_since_detect = 0
+        self._force_detect = True
+        self._motion_redetect_fraction = motion_redetect_fraction
+        self._scene_change_threshold = scene_change_threshold
+        self._propagator = FlowPropagator() if motion_propagation else None
+        self._motion_since_detect: dict[int, float] = {}  # track_id -> bbox widths moved
+        self._detect_gray: Optional[np.ndarray] = None
 
         # Focus hysteresis
         self._focus_id: Optional[int] = None
@@ -416,51 +1002,142 @@ class FaceTracker:
         # Emotion debounce: track_id -> (emotion, since_timestamp)
         self._emotion_stable: dict[int, tuple[str, float]] = {}
 
+        # Emotion scheduling: the focus face is classified on every
+        # detection, other faces every ``emotion_interval_frames`` or when
+        # their bbox has moved (IoU with the last classified bbox below
+        # ``emotion_redetect_iou``). New faces are always classified.
+        self._emotion_interval = max(1, emotion_interval_frames)
+        self._emotion_redetect_iou = emotion_redetect_iou
+        self._emotion_age: dict[int, int] = {}       # track_id -> detections since last run
+        self._emotion_bbox: dict[int, tuple] = {}    # track_id -> bbox at last run
+
         # Event system
         self._dispatcher = EventDispatcher(owner="face_tracker")
+        # Focus and emotion changes fire many times a second with several
+        # faces in view; cap their log lines (see EventLogger).
+        self.event_log = EventLogger(logger, rate_limit={"FOCUS_CHANGED": 2, "EMOTION_CHANGED": 2})
+
+        # Per-stage timings, see metrics() and metrics.py exporters
+        self._metrics = StageMetrics()
 
     # --- Public API ---
 
     def subscribe(self, callback: FaceEventCallback,
-                  event_types: Optional[set] = None) -> Callable[[], None]:
+                  event_types: Optional[set] = None, **delivery) -> Callable[[], None]:
         """Register a callback to receive face events.
 
         Args:
             callback: Called with a FaceEvent.
             event_types: If provided, only these event types are delivered.
                          If None, all events are delivered.
+            **delivery: ``mode="async"``, ``max_queue``, ``overflow``, ...
+                        (see ``EventDispatcher.subscribe``). Use async
+                        delivery for anything slower than a log line, so it
+                        runs off the frame loop.
         Returns:
             An unsubscribe function.
         """
-        return self._dispatcher.subscribe(callback, event_types)
+        return self._dispatcher.subscribe(callback, event_types, **delivery)
 
     def unsubscribe(self, callback: FaceEventCallback) -> bool:
         return self._dispatcher.unsubscribe(callback)
 
+    @property
+    def event_stats(self) -> list[dict]:
+        """Per-subscriber callback latency and async queue stats."""
+        return self._dispatcher.stats()
+
     def process_frame(self, frame: np.ndarray) -> list[TrackedFace]:
         """Process a video frame. Returns tracked faces sorted by focus score."""
         frame_h, frame_w = frame.shape[:2]
         pending: list[FaceEvent] = []
+        m = self._metrics
+        t_start = time.perf_counter()
 
-        self._skip_frame = not self._skip_frame
-        if self._skip_frame:
+        small = cv2.resize(frame, (0, 0), fx=self.frame_scale, fy=self.frame_scale)
+        gray_small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        self._frames_since_detect += 1
+        t = time.perf_counter()
+        m.observe("resize", t - t_start)
+        m.count("frames")
+        if not self._should_detect(gray_small):
             with self._lock:
+                self._propagate_tracks(gray_small)
+                t = self._lap("propagate", t)
                 focus_events = self._update_focus_scores(frame_w, frame_h)
                 pending.extend(focus_events)
                 result = sorted(self._tracks, key=lambda f: f.focus_score, reverse=True)
+                t = self._lap("focus", t)
             self._dispatch_all(pending)
+            t = self._lap("dispatch", t)
+            m.observe("frame", t - t_start)
             return result
 
-        locations, encodings = self._detect_faces(frame)
+        locations, encodings, fresh = self._detect_faces(frame, small)
+        result = self.process_detections(frame, locations, encodings, fresh, gray_small)
+        m.observe("frame", time.perf_counter() - t_start)
+        m.count("detect_frames")
+        return result
+
+    def _lap(self, stage: str, since: float) -> float:
+        """Record the time since ``since`` for ``stage``; returns now."""
+        now = time.perf_counter()
+        self._metrics.observe(stage, now - since)
+        return now
+
+    def metrics(self) -> dict:
+        """Rolling per-stage timings (ms percentiles) and counters.
+
+        Stages: resize (downscale + gray), convert (RGB), detect, encode,
+        match, recognize, emotion, track (track/identity bookkeeping and
+        events), focus, dispatch, propagate (optical-flow frames) and frame
+        (all of ``process_frame``). See ``metrics.StageMetrics.snapshot``.
+        """
+        return self._metrics.snapshot()
+
+    @property
+    def stage_metrics(self) -> StageMetrics:
+        """The underlying recorder, for ``metrics.start_exporters``."""
+        return self._metrics
+
+    def process_detections(self, frame: np.ndarray, locations: list, encodings: list,
+                           fresh: Optional[set] = None,
+                           gray_small: Optional[np.ndarray] = None) -> list[TrackedFace]:
+        """Merge detections computed elsewhere into the tracks.
+
+        ``locations`` are full-frame ``(top, right, bottom, left)`` boxes and
+        ``encodings`` their embeddings, e.g. from a ``face_pipeline`` worker
+        process. ``fresh`` marks detections that were actually encoded
+        (default: all). ``gray_small`` seeds optical-flow propagation; it is
+        only available when ``process_frame`` did the detection itself.
+        Returns tracked faces sorted by focus score.
+        """
+        frame_h, frame_w = frame.shape[:2]
+        pending: list[FaceEvent] = []
+        if fresh is None:
+            fresh = set(range(len(locations)))
         detections = list(zip(locations, encodings))
-        now = time.time()
+        now = self._clock()
+        t = time.perf_counter()
 
         with self._lock:
             matches, unmatched_dets, unmatched_tracks = self._match(detections)
+            t = self._lap("match", t)
+
+            # --- Recognize every matched and new face in one batch ---
+            queries = [self._smoothed_encoding(self._tracks[track_idx], detections[det_idx][1])
+                       for det_idx, track_idx in matches]
+            queries += [detections[det_idx][1] for det_idx in unmatched_dets]
+            recognized = self.db.recognize_batch(queries)
+            t = self._lap("recognize", t)
+
+            # --- Emotion for the faces that are due, in one batch ---
+            emotions = self._classify_emotions(frame, detections, matches, unmatched_dets)
+            t = self._lap("emotion", t)
 
             # --- Update matched tracks ---
             identity_changes = []
-            for det_idx, track_idx in matches:
+            for (det_idx, track_idx), recognition in zip(matches, recognized):
                 bbox, enc = detections[det_idx]
                 track = self._tracks[track_idx]
                 was_occluded = not track.is_visible
@@ -468,7 +1145,12 @@ class FaceTracker:
                 old_pid = prev_ident.person_id if prev_ident else None
                 old_emotion = track.emotion
 
-                self._update_track(track, enc, bbox, frame)
+                self._update_track(track, enc, bbox, frame, recognition,
+                                   emotions.get(det_idx))
+                if det_idx in fresh:
+                    self._encode_age[track.track_id] = 0
+                else:
+                    self._encode_age[track.track_id] = self._encode_age.get(track.track_id, 0) + 1
 
                 # Recovery event
                 if was_occluded:
@@ -525,7 +1207,11 @@ class FaceTracker:
             for track in lost:
                 ident = self._identities.pop(track.track_id, None)
                 self._emotion_stable.pop(track.track_id, None)
-                self._last_frames.pop(track.track_id, None)
+                self._emotion_age.pop(track.track_id, None)
+                self._emotion_bbox.pop(track.track_id, None)
+                self._crops.pop(track.track_id)
+                self._encode_age.pop(track.track_id, None)
+                self._motion_since_detect.pop(track.track_id, None)
                 pending.append(self._make_event(
                     FaceEventType.FACE_DISAPPEARED, track.track_id,
                     FaceDisappearedPayload(
@@ -540,9 +1226,10 @@ class FaceTracker:
                 self._tracks = [t for t in self._tracks if t.track_id not in lost_ids]
 
             # --- New tracks ---
-            for det_idx in unmatched_dets:
+            for det_idx, recognition in zip(unmatched_dets, recognized[len(matches):]):
                 bbox, enc = detections[det_idx]
-                track = self._create_track(enc, bbox, frame)
+                track = self._create_track(enc, bbox, frame, recognition,
+                                           emotions.get(det_idx))
                 self._tracks.append(track)
                 ident = self._identities.get(track.track_id)
                 pending.append(self._make_event(
@@ -583,16 +1270,37 @@ class FaceTracker:
                         )
                     ))
 
+            # --- Detection cadence + motion features for the next frames ---
+            self._adapt_detect_interval(
+                scene_changed=bool(unmatched_dets) or bool(unmatched_tracks))
+            self._detect_gray = gray_small
+            if self._propagator is not None and gray_small is not None:
+                s = self.frame_scale
+                self._propagator.reseed(gray_small, {
+                    t.track_id: tuple(v * s for v in t.bbox)
+                    for t in self._tracks if t.is_visible
+                })
+
+            t = self._lap("track", t)
+
             # --- Focus ---
             focus_events = self._update_focus_scores(frame_w, frame_h)
             pending.extend(focus_events)
 
             result = sorted(self._tracks, key=lambda f: f.focus_score, reverse=True)
+            t = self._lap("focus", t)
 
         # Dispatch all events outside lock
         self._dispatch_all(pending)
+        self._lap("dispatch", t)
         return result
 
+    @property
+    def encoding_stats(self) -> dict:
+        """Counts of encodings computed vs. reused from established tracks."""
+        with self._lock:
+            return dict(self._encoding_stats)
+
     @property
     def focus_track_id(self) -> Optional[int]:
         return self._focus_id
@@ -655,15 +1363,6 @@ class FaceTracker:
         ))
         return True
 
-    def _allocate_person_id(self) -> str:
-        """Pick the next free pNNN id by scanning the face database."""
-        max_n = 0
-        for pid in self.db.known_person_ids:
-            m = re.match(r"^p(\d+)$", pid)
-            if m:
-                max_n = max(max_n, int(m.group(1)))
-        return f"p{max_n + 1:03d}"
-
     def _auto_enroll_unknown(self) -> list[FaceEvent]:
         """Save any visible, unrecognized, stable faces to the face DB.
 
@@ -678,11 +1377,13 @@ class FaceTracker:
                 continue
             if track.frames_visible < self._enroll_min_frames:
                 continue
-            frame = self._last_frames.get(track.track_id)
-            if frame is None:
+            stored = self._crops.get(track.track_id)
+            if stored is None:
                 continue
-            person_id = self._allocate_person_id()
-            self.db.add_face(person_id, track.encoding, frame, track.bbox)
+            crop, crop_bbox = stored
+            person_id = self.db.allocate_person_id()
+            self.db.add_face(person_id, track.encoding, crop, crop_bbox)
+            self._crops.pop(track.track_id)
             self._identities[track.track_id] = Identity(
                 person_id=person_id, confidence=100.0,
                 _matching_since=0.0, _confirmed=True,
@@ -701,18 +1402,18 @@ class FaceTracker:
     # --- Internal ---
 
     def _make_event(self, etype, track_id, payload):
-        return FaceEvent(type=etype, timestamp=time.time(),
+        return FaceEvent(type=etype, timestamp=self._clock(),
                          track_id=track_id, payload=payload)
 
     def _dispatch_all(self, events):
         for e in events:
-            logger.info(f"[{e.type.name}] track={e.track_id} {e.payload}")
+            self.event_log.log(e.type, e.payload, e.track_id)
             self._dispatcher.dispatch(e)
 
     def _update_focus_scores(self, frame_w, frame_h) -> list[FaceEvent]:
         """Compute focus scores and return any focus-change events."""
         events = []
-        now = time.time()
+        now = self._clock()
 
         if not self._tracks:
             if self._focus_id is not None:
@@ -798,123 +1499,301 @@ class FaceTracker:
 
         return events
 
-    def _detect_faces(self, frame):
-        small = cv2.resize(frame, (0, 0), fx=self.frame_scale, fy=self.frame_scale)
+    @property
+    def crop_pool_stats(self) -> dict:
+        """Entries, bytes, peak bytes, cap and evictions of the crop pool."""
+        with self._lock:
+            return self._crops.stats
+
+    @property
+    def detect_interval(self) -> int:
+        """Current detector cadence in frames (1 = every frame)."""
+        return self._detect_interval
+
+    def _should_detect(self, gray_small) -> bool:
+        """Decide whether this frame runs the detector or only propagation."""
+        if self._force_detect or self._propagator is None and self._min_detect_interval == 1:
+            return True
+        if self._frames_since_detect >= self._detect_interval:
+            return True
+        # Something entering an otherwise static scene: compare against the
+        # last detection frame (cheap on the downscaled grayscale image).
+        if self._detect_gray is not None and self._detect_gray.shape == gray_small.shape:
+            change = float(cv2.absdiff(gray_small, self._detect_gray).mean())
+            if change > self._scene_change_threshold:
+                return True
+        return False
+
+    def _propagate_tracks(self, gray_small):
+        """Shift visible track bboxes by optical flow. Caller holds the lock."""
+        if self._propagator is None:
+            return
+        motion = self._propagator.propagate(gray_small)
+        s = self.frame_scale
+        for track in self._tracks:
+            if track.track_id not in motion:
+                continue
+            m = motion[track.track_id]
+            if m is None:
+                self._force_detect = True
+                continue
+            dx, dy, scale = m[0] / s, m[1] / s, m[2]
+            top, right, bottom, left = track.bbox
+            cx, cy = (left + right) / 2 + dx, (top + bottom) / 2 + dy
+            half_w, half_h = (right - left) * scale / 2, (bottom - top) * scale / 2
+            track.bbox = (int(cy - half_h), int(cx + half_w), int(cy + half_h), int(cx - half_w))
+            width = max(1, right - left)
+            moved = self._motion_since_detect.get(track.track_id, 0.0) + np.hypot(dx, dy) / width
+            self._motion_since_detect[track.track_id] = moved
+            if moved > self._motion_redetect_fraction:
+                self._force_detect = True
+
+    def _adapt_detect_interval(self, scene_changed: bool):
+        """Back off on static scenes, snap to the minimum on change.
+
+        Caller holds the lock. ``scene_changed`` is True when the detection
+        just created or lost tracks.
+        """
+        moving = any(m > self._motion_redetect_fraction / 2
+                     for m in self._motion_since_detect.values())
+        if scene_changed or moving:
+            self._detect_interval = self._min_detect_interval
+        else:
+            self._detect_interval = min(self._max_detect_interval, self._detect_interval + 1)
+        self._frames_since_detect = 0
+        self._force_detect = False
+        self._motion_since_detect.clear()
+
+    def _detect_faces(self, frame, small):
+        """Detect faces and encode the ones that need it.
+
+        Returns ``(locations, encodings, fresh)`` where ``fresh`` is the set
+        of detection indices that were actually run through the encoder.
+        With lazy encoding off every detection is fresh.
+        """
+        t = time.perf_counter()
         rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
-        locations = face_recognition.face_locations(rgb_small)
-        encodings = face_recognition.face_encodings(rgb_small, locations)
+        t = self._lap("convert", t)
+        small_locations = self.detector.detect(small, rgb_small)
+        t = self._lap("detect", t)
         s = self.frame_scale
         locations = [
             (int(t / s), int(r / s), int(b / s), int(l / s))
-            for t, r, b, l in locations
+            for t, r, b, l in small_locations
         ]
-        return locations, encodings
+
+        reused = self._plan_encodings(locations) if self._lazy_encoding else {}
+        need = [i for i in range(len(locations)) if i not in reused]
+        computed = self.embedder.embed(
+            rgb_small, [small_locations[i] for i in need]) if need else []
+        self._lap("encode", t)
+        encodings = [None] * len(locations)
+        for i, enc in zip(need, computed):
+            encodings[i] = enc
+        for i, enc in reused.items():
+            encodings[i] = enc
+
+        with self._lock:
+            self._encoding_stats["computed"] += len(need)
+            self._encoding_stats["skipped"] += len(reused)
+        return locations, encodings, set(need)
+
+    def _plan_encodings(self, locations) -> dict:
+        """Pick detections that can reuse an established track's encoding.
+
+        A detection qualifies when it overlaps exactly one visible track
+        with IoU >= ``encoding_reuse_iou``, nothing else overlaps either of
+        them (ambiguity forces a fresh encoding), and the track is past its
+        first frames, has a confirmed identity with no different candidate
+        pending, and is not yet due for its periodic refresh. Unknown
+        tracks (no identity yet) are always encoded so they can be
+        recognized or enrolled. Returns ``{det_idx: encoding}``.
+        """
+        with self._lock:
+            visible = [t for t in self._tracks if t.is_visible]
+            if not locations or not visible:
+                return {}
+            iou = self._pairwise_iou(
+                np.asarray(locations, dtype=np.float64),
+                np.asarray([t.bbox for t in visible], dtype=np.float64),
+            )
+            overlapping = iou > self._track_iou_thresh
+            reused = {}
+            for i in range(len(locations)):
+                j = int(np.argmax(iou[i]))
+                if iou[i, j] < self._encoding_reuse_iou:
+                    continue
+                if overlapping[i].sum() > 1 or overlapping[:, j].sum() > 1:
+                    continue
+                track = visible[j]
+                if track.frames_visible < self._encoding_min_frames:
+                    continue
+                ident = self._identities.get(track.track_id)
+                if (ident is None or not ident._confirmed
+                        or ident._candidate_person_id != ident.person_id):
+                    continue
+                if self._encode_age.get(track.track_id, 0) + 1 >= self._encoding_refresh_frames:
+                    continue
+                reused[i] = track.encoding.copy()
+            return reused
 
     def _match(self, detections):
+        """Associate detections with tracks by optimal assignment.
+
+        Encoding distances and pairwise IoU are computed as broadcast matrix
+        operations and combined into one cost. A pair is only admissible if
+        it passes either gate (encoding distance below the track threshold,
+        or IoU above the IoU threshold); the Hungarian solver then picks the
+        assignment with minimum total cost, which avoids the identity swaps
+        a greedy pass produces when faces cross in a crowd.
+        """
         if not detections or not self._tracks:
             return ([], list(range(len(detections))), list(range(len(self._tracks))))
 
         n_det = len(detections)
         n_trk = len(self._tracks)
-        costs = np.zeros((n_det, n_trk))
-        for i, (bbox_d, enc_d) in enumerate(detections):
-            for j, track in enumerate(self._tracks):
-                costs[i, j] = np.linalg.norm(enc_d - track.encoding)
-
-        matches = []
-        used_dets = set()
-        used_tracks = set()
-        candidates = sorted(
-            ((costs[i, j], i, j) for i in range(n_det) for j in range(n_trk))
+        det_enc = np.asarray([enc for _, enc in detections], dtype=np.float64)
+        trk_enc = np.asarray([t.encoding for t in self._tracks], dtype=np.float64)
+        enc_dist = self._pairwise_distances(det_enc, trk_enc, self._cosine)
+        iou = self._pairwise_iou(
+            np.asarray([bbox for bbox, _ in detections], dtype=np.float64),
+            np.asarray([t.bbox for t in self._tracks], dtype=np.float64),
         )
-        for dist, i, j in candidates:
-            if i in used_dets or j in used_tracks:
-                continue
-            if dist < self._track_enc_thresh:
-                matches.append((i, j))
-                used_dets.add(i)
-                used_tracks.add(j)
 
+        admissible = (enc_dist < self._track_enc_thresh) | (iou > self._track_iou_thresh)
+        costs = enc_dist + self._track_iou_weight * (1.0 - iou)
+        costs[~admissible] = self._GATED_COST
+
+        rows, cols = linear_sum_assignment(costs)
+        keep = admissible[rows, cols]
+        matches = list(zip(rows[keep].tolist(), cols[keep].tolist()))
+
+        used_dets = set(rows[keep].tolist())
+        used_tracks = set(cols[keep].tolist())
         remaining_dets = [i for i in range(n_det) if i not in used_dets]
         remaining_tracks = [j for j in range(n_trk) if j not in used_tracks]
-        for i in list(remaining_dets):
-            best_iou, best_j = 0.0, -1
-            for j in remaining_tracks:
-                iou = self._compute_iou(detections[i][0], self._tracks[j].bbox)
-                if iou > best_iou:
-                    best_iou, best_j = iou, j
-            if best_iou > self._track_iou_thresh and best_j >= 0:
-                matches.append((i, best_j))
-                remaining_dets.remove(i)
-                remaining_tracks.remove(best_j)
-
         return matches, remaining_dets, remaining_tracks
 
-    def _compute_iou(self, bbox1, bbox2):
-        t1, r1, b1, l1 = bbox1
-        t2, r2, b2, l2 = bbox2
-        it, il = max(t1, t2), max(l1, l2)
-        ib, ir = min(b1, b2), min(r1, r2)
-        if ib <= it or ir <= il:
-            return 0.0
-        inter = (ib - it) * (ir - il)
+    @staticmethod
+    def _pairwise_distances(a, b, cosine: bool = False):
+        """Distance matrix between the rows of ``a`` and ``b``.
+
+        Euclidean, or ``1 - cos`` for unit-norm embeddings when ``cosine``.
+        """
+        sq = (np.einsum("ij,ij->i", a, a)[:, None]
+              + np.einsum("ij,ij->i", b, b)[None, :]
+              - 2.0 * (a @ b.T))
+        sq = np.maximum(sq, 0.0)
+        return sq / 2.0 if cosine else np.sqrt(sq)
+
+    @staticmethod
+    def _pairwise_iou(boxes_a, boxes_b):
+        """IoU matrix between two arrays of (top, right, bottom, left) boxes."""
+        t1, r1, b1, l1 = (boxes_a[:, k, None] for k in range(4))
+        t2, r2, b2, l2 = (boxes_b[None, :, k] for k in range(4))
+        inter_h = np.clip(np.minimum(b1, b2) - np.maximum(t1, t2), 0.0, None)
+        inter_w = np.clip(np.minimum(r1, r2) - np.maximum(l1, l2), 0.0, None)
+        inter = inter_h * inter_w
         union = (b1 - t1) * (r1 - l1) + (b2 - t2) * (r2 - l2) - inter
-        return inter / union if union > 0 else 0.0
+        return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    def _smoothed_encoding(self, track, encoding):
+        blended = 0.3 * encoding + 0.7 * track.encoding
+        if self._cosine:
+            blended /= max(float(np.linalg.norm(blended)), 1e-12)
+        return blended
+
+    def _classify_emotions(self, frame, detections, matches, unmatched_dets) -> dict:
+        """Run the emotion model on the detections that are due this frame.
 
-    def _update_track(self, track, encoding, bbox, frame):
-        now = time.time()
-        track.encoding = 0.3 * encoding + 0.7 * track.encoding
+        Returns ``{det_idx: (label, confidence)}``. Caller holds the lock.
+        """
+        if not self.emotion_detector:
+            return {}
+        due = list(unmatched_dets)
+        for det_idx, track_idx in matches:
+            tid = self._tracks[track_idx].track_id
+            age = self._emotion_age.get(tid, 0) + 1
+            self._emotion_age[tid] = age
+            last_bbox = self._emotion_bbox.get(tid)
+            moved = last_bbox is None or self._pairwise_iou(
+                np.asarray([detections[det_idx][0]], dtype=np.float64),
+                np.asarray([last_bbox], dtype=np.float64),
+            )[0, 0] < self._emotion_redetect_iou
+            if tid == self._focus_id or age >= self._emotion_interval or moved:
+                due.append(det_idx)
+
+        rois, roi_dets = [], []
+        for det_idx in due:
+            top, right, bottom, left = detections[det_idx][0]
+            roi = frame[max(0, top):bottom, max(0, left):right]
+            if roi.size > 0:
+                rois.append(roi)
+                roi_dets.append(det_idx)
+        if not rois:
+            return {}
+        try:
+            results = self.emotion_detector.detect_batch(rois)
+        except Exception:
+            logger.debug("Emotion detection failed", exc_info=True)
+            return {}
+        done = set(roi_dets)
+        for det_idx, track_idx in matches:
+            if det_idx in done:
+                tid = self._tracks[track_idx].track_id
+                self._emotion_age[tid] = 0
+                self._emotion_bbox[tid] = detections[det_idx][0]
+        return dict(zip(roi_dets, results))
+
+    def _update_track(self, track, encoding, bbox, frame, recognition, emotion=None):
+        now = self._clock()
+        track.encoding = self._smoothed_encoding(track, encoding)
         track.bbox = bbox
         track.last_seen = now
         track.frames_visible += 1
         track.frames_since_seen = 0
-        self._last_frames[track.track_id] = frame
+        if emotion is not None:
+            track.emotion, track.emotion_confidence = emotion
 
-        top, right, bottom, left = bbox
-        face_roi = frame[top:bottom, left:right]
-        if face_roi.size > 0 and self.emotion_detector:
-            try:
-                label, conf = self.emotion_detector.detect(face_roi)
-                track.emotion = label
-                track.emotion_confidence = conf
-            except Exception:
-                pass
+        self._recognize_and_stabilize(track, recognition)
+        self._retain_crop(track, frame)
 
-        self._recognize_and_stabilize(track)
+    def _retain_crop(self, track, frame):
+        """Keep a face crop only while the track could still be auto-enrolled."""
+        if (self._auto_enroll and track.track_id not in self._identities
+                and track.frames_visible >= self._enroll_min_frames):
+            self._crops.put(track.track_id, frame, track.bbox)
+        else:
+            self._crops.pop(track.track_id)
 
-    def _create_track(self, encoding, bbox, frame):
-        now = time.time()
+    def _create_track(self, encoding, bbox, frame, recognition, emotion=None):
+        now = self._clock()
         track = TrackedFace(
             track_id=self._next_id, encoding=encoding.copy(), bbox=bbox,
             first_seen=now, last_seen=now, frames_visible=1,
         )
         self._next_id += 1
-        self._last_frames[track.track_id] = frame
+        if emotion is not None:
+            track.emotion, track.emotion_confidence = emotion
+            self._emotion_age[track.track_id] = 0
+            self._emotion_bbox[track.track_id] = bbox
 
-        top, right, bottom, left = bbox
-        face_roi = frame[top:bottom, left:right]
-        if face_roi.size > 0 and self.emotion_detector:
-            try:
-                label, conf = self.emotion_detector.detect(face_roi)
-                track.emotion = label
-                track.emotion_confidence = conf
-            except Exception:
-                pass
-
-        person_id, confidence = self.db.recognize(encoding)
+        person_id, confidence = recognition
         if person_id is not None:
             self._identities[track.track_id] = Identity(
                 person_id=person_id, confidence=confidence,
                 _matching_since=now, _candidate_person_id=person_id,
                 _candidate_confidence=confidence,
             )
+        self._retain_crop(track, frame)
 
         return track
 
-    def _recognize_and_stabilize(self, track):
-        raw_pid, raw_conf = self.db.recognize(track.encoding)
+    def _recognize_and_stabilize(self, track, recognition):
+        """Apply confirm/revoke hysteresis to a raw ``(person_id, confidence)``."""
+        raw_pid, raw_conf = recognition
         tid = track.track_id
-        now = time.time()
+        now = self._clock()
         ident = self._identities.get(tid)
 
         if raw_pid is not None:
@@ -944,6 +1823,46 @@ class FaceTracker:
                     del self._identities[tid]
 
 
+def build_from_config(db_dir: str, clock: Callable[[], float] = time.time) -> FaceTracker:
+    """Loaded ``FaceDatabase`` + ``FaceTracker`` as set up in face_config.toml
+    (``[embedder]``, ``[detector]``, ``[database]``, ``[emotion]``,
+    ``[tracker]``). Shared by the agent and UI entry points so both run the
+    same backends; the database is ``tracker.db``."""
+    from face_config import (get_tracker_config, get_database_config,
+                             get_detector_config, get_embedder_config,
+                             get_emotion_config)
+    from face_index import make_index
+    from face_detectors import make_detector
+    from face_embedders import make_embedder
+
+    embedder = make_embedder(get_embedder_config())
+    dc = get_database_config()
+    face_db = FaceDatabase(db_dir=db_dir,
+                           index=make_index(dc),
+                           tolerance=embedder.tolerance, metric=embedder.metric,
+                           flush_interval=dc.get("flush_interval_s", 0.5),
+                           max_per_person=dc.get("max_encodings_per_person", 0),
+                           centroid_candidates=dc.get("centroid_candidates", 0))
+    face_db.load()
+    ec = get_emotion_config()
+    emotion_detector = EmotionDetector(intra_op_threads=ec.get("intra_op_threads", 0),
+                                       optimize_graph=ec.get("optimize_graph", True))
+    tc = get_tracker_config()
+    return FaceTracker(db=face_db, emotion_detector=emotion_detector,
+                       detector=make_detector(get_detector_config()),
+                       embedder=embedder,
+                       max_missing_seconds=tc.get("max_missing_seconds", 3.0),
+                       lazy_encoding=tc.get("lazy_encoding", False),
+                       encoding_refresh_frames=tc.get("encoding_refresh_frames", 5),
+                       min_detect_interval=tc.get("min_detect_interval", 1),
+                       max_detect_interval=tc.get("max_detect_interval", 4),
+                       motion_propagation=tc.get("motion_propagation", True),
+                       emotion_interval_frames=ec.get("interval_frames", 5),
+                       crop_pool_bytes=int(tc.get("crop_pool_mb", 32) * 1024 * 1024),
+                       crop_padding=tc.get("crop_padding", 0.25),
+                       clock=clock)
+
+
 # ---------------------------------------------------------------------------
 # Standalone mode
 # ---------------------------------------------------------------------------
@@ -1070,6 +1989,33 @@ def main():
     parser.add_argument("--fps", type=int, default=0, help="Max FPS (0 = unlimited)")
     parser.add_argument("--no-emotion", action="store_true", help="Disable emotion detection")
     parser.add_argument("--no-log-window", action="store_true", help="Disable log window")
+    parser.add_argument("--index", choices=["none", "ivf"], default="none",
+                        help="Approximate nearest-neighbour index for large galleries")
+    parser.add_argument("--lazy-encoding", action="store_true",
+                        help="Reuse encodings of established tracks; only encode new, "
+                             "ambiguous or stale tracks")
+    parser.add_argument("--encoding-refresh", type=int, default=5,
+                        help="With --lazy-encoding, re-encode each track at least every N detections")
+    parser.add_argument("--detector", choices=["hog", "yunet", "onnx"], default="hog",
+                        help="Face detector backend")
+    parser.add_argument("--embedder", choices=["dlib", "onnx"], default=None,
+                        help="Face embedding backend (default: [embedder] in face_config.toml; "
+                             "the gallery must match, see face_embedders.py)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Run detection + encoding in N worker processes (0 = in-process)")
+    parser.add_argument("--max-detect-interval", type=int, default=4,
+                        help="Run the detector at most every N frames on static scenes (1 = every frame)")
+    parser.add_argument("--no-motion", action="store_true",
+                        help="Disable optical-flow bbox propagation between detections")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve per-stage timings in Prometheus format on this port")
+    parser.add_argument("--metrics-jsonl", default="",
+                        help="Append a per-stage timing snapshot to this file every 10s")
+    parser.add_argument("--replay", default="",
+                        help="Replay a video file or image directory instead of the camera "
+                             "and print a benchmark report (see replay.py)")
+    from replay import add_replay_arguments
+    add_replay_arguments(parser)
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
@@ -1095,15 +2041,55 @@ def main():
             msg = str(p)[:60]
         log_lines.append((ts, event.type.name, msg))
 
-    face_db = FaceDatabase(db_dir=args.db_dir)
+    from face_index import make_index
+    from face_config import get_embedder_config
+    from face_embedders import make_embedder
+    embedder_config = dict(get_embedder_config())
+    if args.embedder:
+        embedder_config["backend"] = args.embedder
+    embedder = make_embedder(embedder_config)
+    clock = time.time
+    db_dir = args.db_dir
+    if args.replay:
+        from replay import ReplayClock, scratch_db_dir
+        clock = ReplayClock()
+        if not args.keep_db:
+            db_dir = scratch_db_dir(args.db_dir)
+    face_db = FaceDatabase(db_dir=db_dir, index=make_index({"index": args.index}),
+                           tolerance=embedder.tolerance, metric=embedder.metric)
     face_db.load()
 
     emotion_detector = None
     if not args.no_emotion:
         emotion_detector = EmotionDetector()
 
+    from face_detectors import make_detector
     tracker = FaceTracker(db=face_db, emotion_detector=emotion_detector,
-                          frame_scale=args.scale)
+                          frame_scale=args.scale,
+                          detector=make_detector({"backend": args.detector}),
+                          embedder=embedder,
+                          lazy_encoding=args.lazy_encoding,
+                          encoding_refresh_frames=args.encoding_refresh,
+                          max_detect_interval=args.max_detect_interval,
+                          motion_propagation=not args.no_motion,
+                          clock=clock)
+
+    from metrics import start_exporters, format_summary
+    exporters = start_exporters(tracker.stage_metrics, args.metrics_port, args.metrics_jsonl)
+
+    if args.replay:
+        import replay
+        try:
+            result = replay.run(tracker, clock,
+                                replay.FrameSource(args.replay, args.replay_fps, args.max_frames))
+        finally:
+            for e in exporters:
+                e.close()
+            face_db.close()
+            if db_dir != args.db_dir:
+                shutil.rmtree(db_dir, ignore_errors=True)
+        raise SystemExit(replay.finish(result, args.annotations, args.events, args.report))
+
     tracker.subscribe(on_event_display)
 
     cap = cv2.VideoCapture(args.camera)
@@ -1146,39 +2132,64 @@ def main():
         "detector_busy_s": 0.0,
     }
 
+    def publish(faces, elapsed_ms):
+        faces_snap = [copy.copy(f) for f in faces]
+        idents = {}
+        for f in faces_snap:
+            pid = tracker.get_person_id(f.track_id)
+            if pid is not None:
+                idents[f.track_id] = (pid, tracker.get_confidence(f.track_id))
+        focus_id_local = tracker.focus_track_id
+        with state_lock:
+            latest["faces"] = faces_snap
+            latest["identities"] = idents
+            latest["focus_id"] = focus_id_local
+            latest["result_id"] += 1
+            latest["process_ms"] = elapsed_ms
+            latest["result_time"] = time.time()
+        with stats_lock:
+            stats["processed"] += 1
+            stats["detector_busy_s"] += elapsed_ms / 1000.0
+
+    def take_pending():
+        with state_lock:
+            work = pending_frame[0]
+            pending_frame[0] = None
+        return work
+
     def detector_worker():
-        local_result_id = 0
         while not stop_event.is_set():
             frame_signal.wait(timeout=0.1)
             frame_signal.clear()
-            with state_lock:
-                work = pending_frame[0]
-                pending_frame[0] = None
+            work = take_pending()
             if work is None:
                 continue
             t0 = time.time()
             faces = tracker.process_frame(work)
-            elapsed_ms = (time.time() - t0) * 1000.0
-            faces_snap = [copy.copy(f) for f in faces]
-            idents = {}
-            for f in faces_snap:
-                pid = tracker.get_person_id(f.track_id)
-                if pid is not None:
-                    idents[f.track_id] = (pid, tracker.get_confidence(f.track_id))
-            focus_id_local = tracker.focus_track_id
-            local_result_id += 1
-            with state_lock:
-                latest["faces"] = faces_snap
-                latest["identities"] = idents
-                latest["focus_id"] = focus_id_local
-                latest["result_id"] = local_result_id
-                latest["process_ms"] = elapsed_ms
-                latest["result_time"] = time.time()
-            with stats_lock:
-                stats["processed"] += 1
-                stats["detector_busy_s"] += elapsed_ms / 1000.0
-
-    worker = threading.Thread(target=detector_worker, daemon=True, name="face-detector")
+            publish(faces, (time.time() - t0) * 1000.0)
+
+    pipeline = None
+    if args.workers > 0:
+        from face_pipeline import FacePipeline
+        pipeline = FacePipeline(tracker, workers=args.workers,
+                                detector_config={"backend": args.detector},
+                                embedder_config=embedder_config)
+
+    def pipeline_worker():
+        # Submit frames as they arrive; merge whatever the workers finished.
+        # process_ms in the HUD is submit-to-merge latency in this mode.
+        while not stop_event.is_set():
+            frame_signal.wait(timeout=0.01)
+            frame_signal.clear()
+            work = take_pending()
+            if work is not None and not pipeline.submit(work):
+                with stats_lock:
+                    stats["dropped"] += 1
+            for _, faces, latency_ms in pipeline.poll(timeout=0.005):
+                publish(faces, latency_ms)
+
+    worker = threading.Thread(target=pipeline_worker if pipeline else detector_worker,
+                              daemon=True, name="face-detector")
     worker.start()
 
     hud_text = ""
@@ -1337,6 +2348,12 @@ def main():
                 f"disp {d_disp/dt_hud:4.1f}fps  drop {drop_pct:4.0f}%  "
                 f"proc {process_ms:5.0f}ms  stale {stale_ms:4.0f}ms"
             )
+            if args.lazy_encoding:
+                enc_stats = tracker.encoding_stats
+                enc_total = enc_stats["computed"] + enc_stats["skipped"]
+                skip_pct = 100.0 * enc_stats["skipped"] / enc_total if enc_total else 0.0
+                hud_text += f"  enc-skip {skip_pct:3.0f}%"
+            hud_text += f"  det/{tracker.detect_interval}"
             hud_last_time = now_t
             hud_last_snapshot = snap
 
@@ -1386,6 +2403,8 @@ def main():
     stop_event.set()
     frame_signal.set()
     worker.join(timeout=2.0)
+    if pipeline is not None:
+        pipeline.close()
     cap.release()
     cv2.destroyAllWindows()
 
@@ -1403,6 +2422,22 @@ def main():
         100.0 * final["display_reused"] / disp,
         avg_proc_ms,
     )
+    enc_stats = tracker.encoding_stats
+    logger.info("Encoding stats: computed=%d skipped=%d",
+                enc_stats["computed"], enc_stats["skipped"])
+    face_db.close()
+    p_stats = face_db.persistence_stats
+    logger.info("Gallery writes: ops=%d batches=%d max_depth=%d flush avg=%.1fms max=%.1fms errors=%d",
+                p_stats["ops"], p_stats["batches"], p_stats["max_depth"],
+                p_stats["avg_flush_ms"], p_stats["max_flush_ms"], p_stats["errors"])
+    crop_stats = tracker.crop_pool_stats
+    logger.info("Crop pool: entries=%d bytes=%d peak=%d cap=%d evictions=%d",
+                crop_stats["entries"], crop_stats["bytes"], crop_stats["peak_bytes"],
+                crop_stats["max_bytes"], crop_stats["evictions"])
+    for exporter in exporters:
+        exporter.close()
+    logger.info("Stage timings (last %d frames):\n%s",
+                tracker.stage_metrics.window, format_summary(tracker.metrics()))
     logger.info("Done.")
 
 
@@ -409,6 +409,25 @@ If nothing new was revealed, say "Nothing new." """
             # problematic retry that Ollama can't handle.
             return "Tools executed."
 
+    def summarize_dialogue(self, name: Optional[str], summary: str,
+                           entries: list) -> str:
+        """Fold dialogue leaving the hot window into the relationship summary.
+
+        Set as ``PeopleMemory.summarizer``; runs on the memory's background
+        summary thread. Keeps the old summary if the LLM fails.
+        """
+        lines = "\n".join(
+            f"{'Them' if e.speaker == 'person' else 'Us'}: {e.text}" for e in entries)
+        prompt = f"""Update the summary of our relationship with {name or 'this person'}.
+
+Current summary: {summary or '(none yet)'}
+
+Older conversation to fold in:
+{lines}
+
+Reply with the updated summary only: at most 3 sentences, in English, about who they are, what we talked about and anything to follow up on. No markdown."""
+        return self._call_llm(prompt, "summary", summary)
+
     def generate_ask_name(self, track_id: int, language: str = "en") -> str:
         """Return a random 'what's your name?' prompt. Always canned."""
         cfg = get_language_config(language)
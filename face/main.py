@@ -8,22 +8,28 @@ agent.py.  This file only handles:
   - Keyboard controls (L=learn, T=talk, C=continuous, A=auto-ask, etc.)
 """
 
+import copy
 import cv2
 import numpy as np
 import os
+import shutil
 import sys
 import time
 import threading
 import logging
 import argparse
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Optional
 
-from face_tracker import FaceTracker, FaceDatabase, EmotionDetector
+from face_config import get_metrics_config
+from face_tracker import build_from_config
 from voice_input import VoiceInput, AudioMonitor
 from voice_output import VoiceOutput
 from people_memory import PeopleMemory
 from agent import Agent, AgentEvent, AgentEventType
 from llm import ConversationLLM
+import replay
 
 # ---------------------------------------------------------------------------
 # Logging
@@ -264,19 +270,21 @@ def get_name_from_gui(frame, existing_match=None):
             name += chr(key)
 
 
-def draw_faces(frame, tracker, memory):
+def draw_faces(frame, result, memory):
     """Draw face boxes, names, emotions, and focus indicator.
 
-    Display names are resolved via ``memory`` (the tracker only knows
-    stable person IDs). Also draws a fading ghost box for the focused
-    face if it briefly disappears (grace period before track is evicted).
+    ``result`` is the processing worker's latest ``FrameResult`` (a
+    snapshot, so drawing never touches the live tracker). Display names
+    are resolved via ``memory`` (the tracker only knows stable person
+    IDs). Also draws a fading ghost box for the focused face if it
+    briefly disappears (grace period before track is evicted).
     """
-    faces = tracker.get_visible_faces()
-    focus_id = tracker.focus_track_id
+    faces = [f for f in result.faces if f.is_visible]
+    focus_id = result.focus_id
 
     # Ghost box for the focused face if it's in the grace period
     if focus_id is not None:
-        focus_face = tracker.get_face_by_id(focus_id)
+        focus_face = next((f for f in result.faces if f.track_id == focus_id), None)
         if focus_face and not focus_face.is_visible:
             elapsed = time.time() - focus_face.last_seen
             alpha = max(0.0, 1.0 - elapsed / 2.0)
@@ -305,7 +313,7 @@ def draw_faces(frame, tracker, memory):
         is_focus = (face.track_id == focus_id)
         person = memory.get(face.track_id)
         name = person.name if person and person.is_identified else None
-        conf = tracker.get_confidence(face.track_id)
+        conf = result.confidences.get(face.track_id, 0.0)
         top, right, bottom, left = face.bbox
         color = (0, 255, 100) if is_focus else (0, 200, 0) if name else (0, 0, 200)
         thickness = 4 if is_focus else 2
@@ -325,6 +333,187 @@ def draw_faces(frame, tracker, memory):
                         cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 100), 2)
 
 
+# ---------------------------------------------------------------------------
+# Capture / process / render pipeline
+# ---------------------------------------------------------------------------
+
+class LatestSlot:
+    """Single-value handoff between two threads.
+
+    ``put`` overwrites whatever is waiting (counted in ``drops``) and
+    ``take`` empties the slot, so the consumer always gets the newest
+    value and never works through a backlog.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self.puts = 0
+        self.drops = 0
+
+    def put(self, value):
+        with self._cond:
+            if self._value is not None:
+                self.drops += 1
+            self._value = value
+            self.puts += 1
+            self._cond.notify()
+
+    def take(self, timeout: Optional[float] = None):
+        with self._cond:
+            if self._value is None:
+                self._cond.wait(timeout)
+            value, self._value = self._value, None
+            return value
+
+
+@dataclass
+class FrameResult:
+    """Snapshot of the tracker after one processed frame, for drawing."""
+    result_id: int
+    frame_id: int
+    faces: list = field(default_factory=list)      # TrackedFace copies, focus order
+    focus_id: Optional[int] = None
+    confidences: dict = field(default_factory=dict)  # track_id -> confidence
+    process_ms: float = 0.0
+    done_at: float = 0.0
+
+
+class FramePipeline:
+    """Capture thread, processing worker and a render-side view of both.
+
+    The capture thread reads the camera at its own rate and hands every
+    frame to two ``LatestSlot``s: one for the processing worker (tracker +
+    ``agent.check_unknown_faces``) and one for the render loop on the main
+    thread. The worker publishes a ``FrameResult`` per processed frame;
+    the render loop draws the newest result over the newest frame, so the
+    window runs at camera rate while detection runs as fast as the CPU
+    allows. Frames carry a capture ``frame_id`` and results a
+    ``result_id``; drops on either slot are counted.
+
+    With a ``replay.ReplaySession`` the worker reads the clip itself and
+    processes every frame in order (the replay clock must not run ahead
+    of the tracker); the render loop then shows processed frames.
+    """
+
+    def __init__(self, cap, tracker, agent, fps: float = 0.0, session=None):
+        """``fps`` caps the processing rate (0 = as fast as possible); in
+        replay mode it is the clip's playback rate."""
+        self.cap = cap
+        self.tracker = tracker
+        self.agent = agent
+        self.session = session
+        self._interval = 1.0 / fps if fps > 0 else 0.0
+        self._to_process = LatestSlot()
+        self._to_render = LatestSlot()
+        self._result = FrameResult(result_id=0, frame_id=0)
+        self._result_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.finished = threading.Event()   # camera/clip ended
+        self._frame_id = 0
+        self._processed = 0
+        self._busy_s = 0.0
+        self._threads = []
+
+    def start(self):
+        targets = ([self._replay_loop] if self.session is not None
+                   else [self._capture_loop, self._process_loop])
+        for target in targets:
+            t = threading.Thread(target=target, daemon=True, name=target.__name__.strip("_"))
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=2.0)
+
+    # --- Threads ---
+
+    def _pace(self, last: float) -> float:
+        if self._interval > 0:
+            delay = self._interval - (time.time() - last)
+            if delay > 0:
+                self._stop.wait(delay)
+        return time.time()
+
+    def _capture_loop(self):
+        # Unpaced: cap.read() blocks at the camera's rate, and reading as
+        # fast as frames arrive keeps the driver's buffer from going stale.
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                logger.warning("Camera stopped delivering frames")
+                break
+            self._frame_id += 1
+            self._to_process.put((self._frame_id, frame))
+            # The renderer draws in place while the tracker may still be
+            # encoding and cropping this frame, so it gets its own copy.
+            self._to_render.put((self._frame_id, frame.copy()))
+        self.finished.set()
+
+    def _process_loop(self):
+        last = 0.0
+        while not self._stop.is_set():
+            item = self._to_process.take(timeout=0.1)
+            if item is not None:
+                self._process(*item)
+                last = self._pace(last)
+
+    def _replay_loop(self):
+        last = 0.0
+        while not self._stop.is_set():
+            last = self._pace(last)
+            ret, frame = self.session.read()
+            if not ret:
+                break
+            self._frame_id += 1
+            faces = self._process(self._frame_id, frame)
+            self.session.record(faces)
+            self._to_render.put((self._frame_id, frame))
+        self.finished.set()
+
+    def _process(self, frame_id, frame):
+        t0 = time.perf_counter()
+        faces = self.tracker.process_frame(frame)
+        self.agent.check_unknown_faces(frame)
+        elapsed = time.perf_counter() - t0
+        result = FrameResult(
+            result_id=self._result.result_id + 1, frame_id=frame_id,
+            faces=[copy.copy(f) for f in faces],
+            focus_id=self.tracker.focus_track_id,
+            confidences={f.track_id: self.tracker.get_confidence(f.track_id) for f in faces},
+            process_ms=elapsed * 1000.0, done_at=time.time(),
+        )
+        with self._result_lock:
+            self._result = result
+            self._processed += 1
+            self._busy_s += elapsed
+        return faces
+
+    # --- Render side ---
+
+    def next_frame(self, timeout: float):
+        """Newest captured frame as ``(frame_id, frame)``, or None."""
+        return self._to_render.take(timeout)
+
+    @property
+    def result(self) -> FrameResult:
+        with self._result_lock:
+            return self._result
+
+    def stats(self) -> dict:
+        with self._result_lock:
+            processed, busy_s = self._processed, self._busy_s
+        return {
+            "captured": self._frame_id,
+            "processed": processed,
+            "process_dropped": self._to_process.drops,
+            "render_dropped": self._to_render.drops,
+            "avg_process_ms": busy_s * 1000.0 / processed if processed else 0.0,
+        }
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -333,8 +522,11 @@ def main():
     parser = argparse.ArgumentParser(description="Face Agent UI")
     parser.add_argument("--db-dir", default=os.path.join(_SOURCE_DIR, "known_faces"))
     parser.add_argument("--people-dir", default=os.path.join(_SOURCE_DIR, "people"))
+    parser.add_argument("--people-backend", choices=["json", "sqlite"], default="json",
+                        help="People memory storage: JSON files or SQLite/WAL (see people_store.py)")
     parser.add_argument("--camera", type=int, default=0)
-    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--fps", type=int, default=15,
+                        help="Max face processing rate (0 = unlimited); the window runs at camera rate")
     parser.add_argument("--no-auto-ask", action="store_true")
     parser.add_argument("--no-auto-greet", action="store_true")
     parser.add_argument("--llm-model", default="qwen3:8b")
@@ -346,6 +538,18 @@ def main():
     parser.add_argument("--smart-greeting", action="store_true",
                         help="Use the LLM for greetings (slower, but can reference facts). "
                              "Default is canned templates — instant.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve face pipeline stage timings (Prometheus) on this port "
+                             "(default: [metrics] port in face_config.toml)")
+    parser.add_argument("--metrics-jsonl", default=None,
+                        help="Append face pipeline stage timings to this file "
+                             "(default: [metrics] jsonl in face_config.toml)")
+    parser.add_argument("--replay", default="",
+                        help="Play a video file or image directory instead of the camera, at "
+                             "its own frame rate, on a scratch copy of the face gallery; prints "
+                             "a replay report (see replay.py) on exit")
+    parser.add_argument("--replay-events", default="",
+                        help="With --replay, write the recorded face events to this JSONL file")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO,
@@ -353,10 +557,21 @@ def main():
                         datefmt="%H:%M:%S")
 
     # --- Initialize components ---
-    face_db = FaceDatabase(db_dir=args.db_dir)
-    face_db.load()
-    emotion_detector = EmotionDetector()
-    tracker = FaceTracker(db=face_db, emotion_detector=emotion_detector)
+    db_dir, clock = args.db_dir, time.time
+    if args.replay:
+        # Clip time is anchored at startup so the agent's own time.time()
+        # comparisons against tracker timestamps still make sense.
+        clock = replay.ReplayClock(start=time.time())
+        db_dir = replay.scratch_db_dir(args.db_dir)
+    tracker = build_from_config(db_dir, clock=clock)
+    face_db = tracker.db
+    from metrics import start_exporters
+    _mc = get_metrics_config()
+    metrics_exporters = start_exporters(
+        tracker.stage_metrics,
+        _mc.get("port", 0) if args.metrics_port is None else args.metrics_port,
+        _mc.get("jsonl", "") if args.metrics_jsonl is None else args.metrics_jsonl,
+        _mc.get("interval_s", 10.0))
 
     voice_in = VoiceInput()
     voice_out = VoiceOutput(model_name=args.en_voice)
@@ -370,7 +585,7 @@ def main():
         print(f"ERROR: {voice_out.load_error}", file=sys.stderr)
         sys.exit(1)
 
-    memory = PeopleMemory(storage_dir=args.people_dir)
+    memory = PeopleMemory(storage_dir=args.people_dir, backend=args.people_backend)
     memory.load()
 
     audio_monitor = AudioMonitor()
@@ -431,7 +646,9 @@ def main():
         elif event.type == FaceEventType.EMOTION_CHANGED:
             name = _resolve_name(getattr(p, 'person_id', None)) or f"track {event.track_id}"
             event_log.add("emotion", f"{name}: {p.old_emotion} -> {p.new_emotion}")
-    tracker.subscribe(on_face_event)
+    # The event log is display-only: deliver off the frame loop and drop
+    # the oldest entries if the UI falls behind.
+    tracker.subscribe(on_face_event, mode="async", max_queue=128)
 
     # Bridge agent events to the event log
     def on_agent_event(event: AgentEvent):
@@ -457,10 +674,16 @@ def main():
     agent.start()
 
     # --- Camera + UI loop ---
-    cap = cv2.VideoCapture(args.camera)
-    if not cap.isOpened():
-        logger.error(f"Could not open camera {args.camera}")
-        return
+    session = None
+    if args.replay:
+        source = replay.FrameSource(args.replay)
+        session = cap = replay.ReplaySession(tracker, clock, source)
+        args.fps = source.fps
+    else:
+        cap = cv2.VideoCapture(args.camera)
+        if not cap.isOpened():
+            logger.error(f"Could not open camera {args.camera}")
+            return
 
     cv2.namedWindow("Face Recognition", cv2.WINDOW_NORMAL)
     cv2.resizeWindow("Face Recognition", 800, 600)
@@ -468,40 +691,41 @@ def main():
     cv2.resizeWindow("Event Log", 700, 600)
     cv2.moveWindow("Event Log", 820, 0)
 
-    frame_interval = 1.0 / args.fps if args.fps > 0 else 0
-    last_frame = 0.0
+    pipeline = FramePipeline(cap, tracker, agent, fps=args.fps, session=session)
+    pipeline.start()
 
-    print(f"Running at {args.fps} FPS.")
+    print(f"Processing at up to {args.fps:g} FPS.")
     print("  L=learn  T=talk  C=continuous  A=auto-ask  TAB=select  D=delete  Q=quit\n")
 
+    displayed = reused = 0
+    last_result_id = -1
+    hud_text, hud_time, hud_snap = "", time.time(), dict(pipeline.stats(), displayed=0)
+
     try:
         while True:
-            if frame_interval > 0:
-                now = time.time()
-                if now - last_frame < frame_interval:
-                    wait_ms = max(1, int((frame_interval - (now - last_frame)) * 1000))
-                    key = cv2.waitKey(wait_ms) & 0xFF
-                    if key == ord("q") or key == 27:
-                        break
-                    continue
-                last_frame = now
-
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # --- Face tracking ---
-            tracker.process_frame(frame)
-            agent.check_unknown_faces(frame)
+            item = pipeline.next_frame(timeout=0.02)
+            if item is None:
+                if pipeline.finished.is_set():
+                    break
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord("q") or key == 27:
+                    break
+                continue
+            _, frame = item
+            result = pipeline.result
+            displayed += 1
+            if result.result_id == last_result_id:
+                reused += 1
+            last_result_id = result.result_id
 
             # --- Draw ---
-            draw_faces(frame, tracker, memory)
+            draw_faces(frame, result, memory)
             draw_audio_meter(frame, audio_monitor, voice_in)
             draw_event_log_window(event_log)
 
             # Status bar
-            visible = tracker.get_visible_faces()
-            status = f"Faces: {len(visible)} | Known: {len(face_db.known_person_ids)} | People: {memory.active_count}"
+            visible = sum(1 for f in result.faces if f.is_visible)
+            status = f"Faces: {visible} | Known: {len(face_db.known_person_ids)} | People: {memory.active_count}"
             if agent.busy:
                 status += " | BUSY"
             if agent.auto_ask:
@@ -509,6 +733,26 @@ def main():
             cv2.putText(frame, status, (10, 25),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
 
+            # Pipeline HUD, recomputed at ~1 Hz from counter deltas
+            now = time.time()
+            if now - hud_time >= 1.0:
+                snap = dict(pipeline.stats(), displayed=displayed)
+                dt = now - hud_time
+                d_cap = snap["captured"] - hud_snap["captured"]
+                d_drop = snap["process_dropped"] - hud_snap["process_dropped"]
+                hud_text = (
+                    f"cap {d_cap / dt:4.1f}fps  "
+                    f"det {(snap['processed'] - hud_snap['processed']) / dt:4.1f}fps  "
+                    f"disp {(snap['displayed'] - hud_snap['displayed']) / dt:4.1f}fps  "
+                    f"drop {100.0 * d_drop / d_cap if d_cap else 0.0:3.0f}%  "
+                    f"proc {result.process_ms:4.0f}ms  "
+                    f"stale {max(0.0, now - result.done_at) * 1000.0 if result.done_at else 0.0:4.0f}ms"
+                )
+                hud_time, hud_snap = now, snap
+            if hud_text:
+                cv2.putText(frame, hud_text, (10, 45),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (180, 255, 180), 1, cv2.LINE_AA)
+
             keys_hint = "L=learn T=talk C=continuous A=auto-ask D=delete Q=quit"
             cv2.putText(frame, keys_hint, (10, frame.shape[0] - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.4, (180, 180, 180), 1)
@@ -586,9 +830,23 @@ def main():
 
     # --- Shutdown ---
     event_log.add("system", "App shutting down")
+    pipeline.stop()
+    final = pipeline.stats()
+    logger.info(
+        "Pipeline stats: captured=%d processed=%d dropped=%d displayed=%d reused=%d "
+        "render_dropped=%d avg_proc=%.1fms",
+        final["captured"], final["processed"], final["process_dropped"], displayed, reused,
+        final["render_dropped"], final["avg_process_ms"],
+    )
     agent.stop()
+    for exporter in metrics_exporters:
+        exporter.close()
     audio_monitor.stop()
-    cap.release()
+    if session is not None:
+        replay.finish(session.finish(), events_path=args.replay_events)
+        shutil.rmtree(db_dir, ignore_errors=True)
+    else:
+        cap.release()
     cv2.destroyAllWindows()
     logger.info(f"Session log saved to {LOG_FILE}")
     print(f"\nLog saved to {LOG_FILE}")
@@ -0,0 +1,289 @@
+"""
+Per-stage timing metrics for the face pipeline.
+
+``StageMetrics`` records durations per named stage (``detect``,
+``encode``, ``recognize``, ...) in two forms:
+
+    rolling     the last ``window`` samples per stage, for p50/p95/p99,
+                mean and max over recent frames (what changed just now)
+    cumulative  Prometheus-style bucket counters, sum and count since start
+
+``FaceTracker`` owns one and fills it on every frame; read it with
+``tracker.metrics()``. Two optional exporters publish the same data
+without attaching a profiler:
+
+    MetricsServer   Prometheus text format on ``http://host:port/metrics``
+                    (JSON snapshot on ``/metrics.json``)
+    JsonlSink       one JSON snapshot per ``interval`` seconds appended to
+                    a file, for offline comparison between cameras/models
+
+Can be run standalone (serves synthetic timings):
+    python metrics.py [--port 9108] [--jsonl metrics.jsonl]
+"""
+
+import argparse
+import bisect
+import collections
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logger = logging.getLogger("metrics")
+
+# Bucket upper bounds in milliseconds (Prometheus ``le`` labels, in seconds).
+DEFAULT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000)
+
+
+class _Stage:
+    __slots__ = ("recent", "buckets", "count", "total")
+
+    def __init__(self, window: int, n_buckets: int):
+        self.recent = collections.deque(maxlen=window)
+        self.buckets = [0] * (n_buckets + 1)   # last one is +Inf
+        self.count = 0
+        self.total = 0.0
+
+
+class StageMetrics:
+    """Rolling and cumulative duration histograms per stage. Thread-safe."""
+
+    def __init__(self, window: int = 600, buckets_ms: tuple = DEFAULT_BUCKETS_MS):
+        self.window = window
+        self.buckets_ms = tuple(buckets_ms)
+        self._stages: dict[str, _Stage] = {}
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        """Record one duration for ``stage``."""
+        ms = seconds * 1000.0
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = _Stage(self.window, len(self.buckets_ms))
+            s.recent.append(ms)
+            s.buckets[bisect.bisect_left(self.buckets_ms, ms)] += 1
+            s.count += 1
+            s.total += ms
+
+    def count(self, name: str, n: int = 1):
+        """Bump a plain counter (frames, detections, ...)."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def timer(self, stage: str) -> "_Timer":
+        """``with metrics.timer("detect"): ...``"""
+        return _Timer(self, stage)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._started = time.time()
+
+    def snapshot(self) -> dict:
+        """``{"stages": {stage: {...}}, "counters": {...}}`` with rolling
+        percentiles (ms) and cumulative count/sum per stage."""
+        with self._lock:
+            stages = {name: (sorted(s.recent), list(s.buckets), s.count, s.total)
+                      for name, s in self._stages.items()}
+            counters = dict(self._counters)
+        out = {}
+        for name, (recent, buckets, count, total) in stages.items():
+            n = len(recent)
+            out[name] = {
+                "count": count,
+                "sum_ms": total,
+                "window": n,
+                "mean_ms": sum(recent) / n if n else 0.0,
+                "p50_ms": _percentile(recent, 0.50),
+                "p95_ms": _percentile(recent, 0.95),
+                "p99_ms": _percentile(recent, 0.99),
+                "max_ms": recent[-1] if n else 0.0,
+                "buckets": dict(zip([*map(str, self.buckets_ms), "+Inf"], buckets)),
+            }
+        return {"time": time.time(), "uptime_s": time.time() - self._started,
+                "stages": out, "counters": counters}
+
+    def prometheus(self, prefix: str = "face") -> str:
+        """Cumulative histograms and counters in Prometheus text format."""
+        with self._lock:
+            stages = {name: (list(s.buckets), s.count, s.total)
+                      for name, s in self._stages.items()}
+            counters = dict(self._counters)
+        metric = f"{prefix}_stage_duration_seconds"
+        lines = [f"# HELP {metric} Time spent per pipeline stage.",
+                 f"# TYPE {metric} histogram"]
+        for name in sorted(stages):
+            buckets, count, total = stages[name]
+            cumulative = 0
+            for le, n in zip(self.buckets_ms, buckets):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{stage="{name}",le="{le / 1000:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {total / 1000:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+        for name in sorted(counters):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {counters[name]}")
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    __slots__ = ("_metrics", "_stage", "_t0")
+
+    def __init__(self, metrics: StageMetrics, stage: str):
+        self._metrics, self._stage = metrics, stage
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._stage, time.perf_counter() - self._t0)
+        return False
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def format_summary(snapshot: dict, stages: Optional[list] = None) -> str:
+    """One line per stage: ``detect  p50 12.1  p95 18.0  max 25.3 ms (n=600)``."""
+    rows = []
+    for name in stages or sorted(snapshot["stages"]):
+        s = snapshot["stages"].get(name)
+        if s is None:
+            continue
+        rows.append(f"  {name:<10} p50 {s['p50_ms']:7.2f}  p95 {s['p95_ms']:7.2f}  "
+                    f"max {s['max_ms']:7.2f} ms  (n={s['count']})")
+    return "\n".join(rows)
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+class MetricsServer:
+    """Serve ``/metrics`` (Prometheus) and ``/metrics.json`` from a daemon thread."""
+
+    def __init__(self, metrics: StageMetrics, port: int = 9108, host: str = "127.0.0.1",
+                 prefix: str = "face"):
+        self.metrics = metrics
+        self.prefix = prefix
+        server_self = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = server_self.metrics.prometheus(server_self.prefix).encode()
+                    ctype = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(server_self.metrics.snapshot()).encode()
+                    ctype = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                logger.debug("metrics http: " + fmt, *args)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        daemon=True, name="metrics-http")
+        self._thread.start()
+        logger.info(f"Metrics on http://{host}:{self._httpd.server_address[1]}/metrics")
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class JsonlSink:
+    """Append ``metrics.snapshot()`` to ``path`` every ``interval`` seconds."""
+
+    def __init__(self, metrics: StageMetrics, path: str, interval: float = 10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="metrics-jsonl")
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(self.metrics.snapshot()) + "\n")
+        except OSError as e:
+            logger.warning(f"Metrics sink write failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self.write()
+
+
+def start_exporters(metrics: StageMetrics, port: int = 0, jsonl: str = "",
+                    interval: float = 10.0) -> list:
+    """Start whichever exporters are configured. Returns them for ``close()``."""
+    exporters = []
+    if port:
+        exporters.append(MetricsServer(metrics, port))
+    if jsonl:
+        exporters.append(JsonlSink(metrics, jsonl, interval))
+    return exporters
+
+
+# ---------------------------------------------------------------------------
+# Standalone
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic stage metrics")
+    parser.add_argument("--port", type=int, default=9108)
+    parser.add_argument("--jsonl", default="", help="Also append snapshots to this file")
+    parser.add_argument("--interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    metrics = StageMetrics()
+    exporters = start_exporters(metrics, args.port, args.jsonl, args.interval)
+    typical_ms = {"resize": 0.8, "detect": 25.0, "encode": 12.0, "match": 0.3,
+                  "recognize": 0.5, "emotion": 6.0, "focus": 0.1, "dispatch": 0.1}
+    try:
+        while True:
+            for stage, ms in typical_ms.items():
+                metrics.observe(stage, random.expovariate(1.0 / ms) / 1000.0)
+            metrics.count("frames")
+            time.sleep(1 / 30)
+    except KeyboardInterrupt:
+        print("\n" + format_summary(metrics.snapshot(), list(typical_ms)))
+    finally:
+        for e in exporters:
+            e.close()
+
+
+if __name__ == "__main__":
+    main()
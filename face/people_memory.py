@@ -2,12 +2,22 @@
 People memory module: stores per-person data (dialogues, facts, asked topics).
 
 People are keyed by a stable ``person_id`` (e.g. ``p001``) that never
-changes, even on rename. Each person has one JSON file at
-``{storage_dir}/{person_id}.json``; the display name lives inside that
-JSON and is the single source of truth for what to call the person.
+changes, even on rename. Records are persisted by a ``people_store``
+backend: one JSON file per person at ``{storage_dir}/{person_id}.json``
+(default), or a SQLite database with append-only dialogue rows. The
+display name lives inside the record and is the single source of truth
+for what to call the person.
 
 At runtime the active session maps ``track_id -> Person`` via
-``identify(track_id, person_id)``.
+``identify(track_id, person_id)``. Only a small index (name, last_seen,
+fact count) is loaded for every known person; full records are read on
+demand and an LRU bounds how many of them stay resident.
+
+Dialogue is tiered: a record holds only the newest ``hot_dialogues``
+entries. Older ones move in batches to compressed per-person segments
+(``dialogue_archive.py``), an optional ``summarizer`` folds them into
+``Person.summary``, and ``dialogue_history()`` pages back through all of
+it.
 """
 
 import json
@@ -16,9 +26,13 @@ import re
 import time
 import threading
 import logging
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
+
+from dialogue_archive import DialogueArchive
+from people_store import PeopleStore, index_entry, make_people_store
 
 logger = logging.getLogger("people_memory")
 
@@ -39,6 +53,15 @@ INTERVIEW_TOPICS: list[str] = [
 ]
 
 
+@dataclass
+class _PendingWrite:
+    """Changes to one person accumulated since the last flush."""
+    full: bool = False                                  # write the whole record
+    fields: dict = field(default_factory=dict)          # latest value per changed key
+    dialogues: list = field(default_factory=list)       # appended entries, in order
+    archive: list = field(default_factory=list)         # entries leaving the hot window
+
+
 def _is_person_id(name: str) -> bool:
     """Return True if name looks like a person ID (e.g. 'p001')."""
     return bool(re.match(r"^p\d+$", name))
@@ -53,6 +76,15 @@ class DialogueEntry:
     language: str = ""
     emotion: str = ""
 
+    def to_dict(self) -> dict:
+        return {
+            "timestamp": self.timestamp,
+            "speaker": self.speaker,
+            "text": self.text,
+            "language": self.language,
+            "emotion": self.emotion,
+        }
+
 
 @dataclass
 class Person:
@@ -90,16 +122,7 @@ class Person:
             "facts": self.facts,
             "asked_topics": self.asked_topics,
             "summary": self.summary,
-            "dialogues": [
-                {
-                    "timestamp": e.timestamp,
-                    "speaker": e.speaker,
-                    "text": e.text,
-                    "language": e.language,
-                    "emotion": e.emotion,
-                }
-                for e in self.dialogues
-            ],
+            "dialogues": [e.to_dict() for e in self.dialogues],
         }
 
     @staticmethod
@@ -217,55 +240,109 @@ def _jaccard(a: set, b: set) -> float:
 
 
 class PeopleMemory:
-    """In-memory people database with JSON file persistence.
+    """In-memory people database persisted through a ``PeopleStore``.
 
     Each stored person has a stable ``person_id`` (e.g. ``p001``) which
-    is the filename and the key in ``_stored``. Display names live inside
-    the JSON and can be changed freely without touching the ID.
+    is the key in ``_index``, ``_stored`` and the store. Display names
+    live inside the record and can be changed freely without touching
+    the ID.
+
+    ``_index`` holds a summary of every known person; ``_stored`` is an
+    LRU of full records, faulted in by ``identify``/``get_by_id`` and
+    capped at ``max_resident``. Records of active tracks, records with
+    unwritten changes and enrolled placeholders are never evicted.
+
+    Saves say what changed (see ``_save``), so the sqlite backend writes a
+    row per change instead of the whole record. Writes happen behind the
+    caller: changes mark the person dirty, and a background thread writes
+    each dirty person once per ``flush_interval``, so conversation turns
+    never wait on disk. ``flush()`` forces pending writes out.
     """
 
     _DEFAULT_DIR = os.path.join(
         os.path.dirname(os.path.abspath(__file__)), "people"
     )
+    _SUMMARY_MAX_CHUNKS = 4   # summarizer calls per backlog, see __init__
 
-    def __init__(self, storage_dir: str = _DEFAULT_DIR):
+    def __init__(self, storage_dir: str = _DEFAULT_DIR, backend: str = "json",
+                 store: Optional[PeopleStore] = None, flush_interval: float = 0.5,
+                 max_resident: int = 256, hot_dialogues: int = 40,
+                 archive: Optional[DialogueArchive] = None):
         self._dir = storage_dir
+        self._store = store or make_people_store(storage_dir, backend)
         # Active session: track_id -> Person
         self._active: dict[int, Person] = {}
-        # Persistent store: person_id -> Person dict (loaded from disk)
-        self._stored: dict[str, dict] = {}
+        # Every known person: person_id -> index_entry (name, last_seen, n_facts)
+        self._index: dict[str, dict] = {}
+        # Resident full records, least recently used first
+        self._stored: OrderedDict[str, dict] = OrderedDict()
+        self._max_resident = max_resident
+        self._cache_stats = {"faults": 0, "evictions": 0}
+        # Lookup indexes: casefolded name -> person_ids, person_id -> active
+        # track, and Person objects built from resident records (dropped
+        # with the record or when it changes).
+        self._name_ids: dict[str, list[str]] = {}
+        self._track_of: dict[str, int] = {}
+        self._people: dict[str, Person] = {}
+        self._known_names: Optional[tuple] = None
+        self._known_ids: Optional[frozenset] = None
+        # person_ids whose full record is in the store; anything else
+        # (enrolled placeholders) needs a whole-record save first.
+        self._persisted: set[str] = set()
         self._lock = threading.Lock()
 
+        # Write-behind: changes mark a person dirty and a background thread
+        # writes each dirty person once per ``flush_interval`` seconds
+        # (0 = write synchronously in the caller).
+        self._flush_interval = flush_interval
+        self._dirty: dict[str, _PendingWrite] = {}
+        self._flush_lock = threading.Lock()     # one flush at a time; held by delete
+        self._flush_wake = threading.Event()
+        self._flush_stop = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_stats = {"saves": 0, "writes": 0, "flushes": 0, "errors": 0,
+                             "total_ms": 0.0, "last_ms": 0.0, "max_ms": 0.0}
+
+        # Tiered dialogue: records keep the newest ``hot_dialogues`` entries;
+        # once half as many again have piled up, the older ones go to the
+        # archive and (if set) ``summarizer(name, summary, entries) -> str``
+        # folds them into the person's summary on a background thread, at
+        # most ``hot_dialogues`` entries per call with the summary carried
+        # forward. A longer backlog (a legacy record's whole history) is cut
+        # to its newest ``_SUMMARY_MAX_CHUNKS`` calls' worth; the rest stays
+        # readable in the archive.
+        self._hot_dialogues = max(1, hot_dialogues)
+        self._spill_at = self._hot_dialogues + max(1, self._hot_dialogues // 2)
+        self._archive = archive or DialogueArchive(os.path.join(storage_dir, "archive"))
+        self.summarizer: Optional[Callable[[Optional[str], str, list], str]] = None
+        self._to_summarize: dict[str, list[DialogueEntry]] = {}
+
     def load(self):
-        """Load all person files from disk into the persistent store."""
-        os.makedirs(self._dir, exist_ok=True)
-        count = 0
-        for fname in os.listdir(self._dir):
-            if not fname.endswith(".json"):
-                continue
-            fpath = os.path.join(self._dir, fname)
-            pid = fname[:-5]
-            try:
-                with open(fpath, "r") as f:
-                    content = f.read().strip()
-                if not content:
-                    raise ValueError("empty file")
-                data = json.loads(content)
-                data["persistent_id"] = pid
-                self._stored[pid] = data
-                count += 1
-            except Exception as e:
-                logger.warning(f"Failed to load {fpath}: {e}, creating skeleton record")
-                data = {"persistent_id": pid, "name": None}
-                self._stored[pid] = data
-                count += 1
-        logger.info(f"People memory loaded: {count} people from {self._dir}/")
+        """Load the index of stored people (full records are read on demand)."""
+        t0 = time.perf_counter()
+        index = self._store.load_index()
+        with self._lock:
+            for pid, entry in index.items():
+                self._set_index(pid, entry)
+            self._persisted.update(index)
+        logger.info(f"People memory indexed: {len(index)} people from "
+                    f"{self._dir}/ ({self._store.name}) in "
+                    f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    def close(self):
+        """Stop the flusher, write pending changes and close the backend."""
+        self._flush_stop.set()
+        self._flush_wake.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=5.0)
+        self.flush()
+        self._store.close()
 
     def next_person_id(self) -> str:
-        """Allocate the next free p### ID by scanning stored records."""
+        """Allocate the next free p### ID by scanning known IDs."""
         with self._lock:
             max_n = 0
-            for pid in self._stored:
+            for pid in self._index:
                 m = _PERSON_ID_RE.match(pid)
                 if m:
                     max_n = max(max_n, int(m.group(1)))
@@ -280,7 +357,7 @@ class PeopleMemory:
         person_id = self.next_person_id()
         person = self.get_or_create(track_id)
         person.name = name
-        person.persistent_id = person_id
+        self._bind(track_id, person, person_id)
         logger.info(f"Created person {person_id!r} ({name}) for track {track_id}")
         self._save(person)
         return person_id
@@ -298,12 +375,12 @@ class PeopleMemory:
         person = self.get_or_create(track_id)
         if person.persistent_id == person_id:
             return person
-        person.persistent_id = person_id
+        self._bind(track_id, person, person_id)
         with self._lock:
-            self._stored.setdefault(person_id, {
-                "persistent_id": person_id,
-                "name": None,
-            })
+            if person_id not in self._index:
+                record = {"persistent_id": person_id, "name": None}
+                self._stored[person_id] = record
+                self._set_index(person_id, index_entry(record))
         logger.info(f"Registered enrolled face {person_id!r} for track {track_id}")
         return person
 
@@ -348,15 +425,14 @@ class PeopleMemory:
     def identify(self, track_id: int, person_id: str):
         """Link a track_id to a stored person by ID.
 
-        Loads the JSON record, uses its stored ``name`` as the display
-        name, and restores facts / asked_topics / dialogues. If no JSON
+        Faults in the stored record, uses its ``name`` as the display
+        name, and restores facts / asked_topics / dialogues. If no record
         exists for ``person_id``, treats it as an enrolled-but-unnamed
         person (the face tracker auto-saves encodings before a name is
         learned, so the tracker may report a person_id we've never
         written to disk).
         """
-        with self._lock:
-            stored = self._stored.get(person_id)
+        stored = self._record(person_id)
         if not stored:
             self.register_enrolled(track_id, person_id)
             return
@@ -365,7 +441,7 @@ class PeopleMemory:
         if person.persistent_id == person_id:
             return  # already identified
 
-        person.persistent_id = person_id
+        self._bind(track_id, person, person_id)
         person.name = stored.get("name") or None
         person.facts = list(stored.get("facts", []))
         person.asked_topics = list(stored.get("asked_topics", []))
@@ -381,40 +457,65 @@ class PeopleMemory:
             f"Identified track {track_id} as {person.name} ({person_id}, "
             f"restored {len(person.dialogues)} dialogues, {len(person.facts)} facts)"
         )
-        self._save(person)
+        self._save(person, ("times_seen", "first_met"))
+        if len(person.dialogues) > self._spill_at:
+            self._spill(person)  # record from before the hot window existed
 
     def remove_track(self, track_id: int):
         """Remove a track_id from active session (e.g. face disappeared).
         Persists data if person was identified."""
         with self._lock:
             person = self._active.pop(track_id, None)
+            if person and self._track_of.get(person.persistent_id) == track_id:
+                del self._track_of[person.persistent_id]
         if person and person.is_identified:
-            self._save(person)
+            self._save(person, self._SESSION_FIELDS)
+        with self._lock:
+            self._evict(keep_last=False)
 
     # --- Lookup by name or ID (for persistent queries) ---
 
     def get_by_id(self, person_id: str) -> Optional[Person]:
-        """Find a stored person by ID, loading from disk if needed."""
+        """Find a person by ID: the active one if in view, else a cached
+        Person built from the stored record (loaded from disk if needed).
+
+        The cached object is shared between callers and rebuilt whenever
+        the stored record changes; write through the memory's methods.
+        """
         with self._lock:
-            for p in self._active.values():
-                if p.persistent_id == person_id:
-                    return p
-            stored = self._stored.get(person_id)
-        if stored:
-            return Person.from_dict(stored)
-        return None
+            person = self._active_person(person_id) or self._people.get(person_id)
+            if person is not None:
+                if person_id in self._stored:
+                    self._stored.move_to_end(person_id)
+                return person
+        stored = self._record(person_id)
+        if not stored:
+            return None
+        with self._lock:
+            person = self._people.get(person_id)
+            if person is None:
+                person = Person.from_dict(stored)
+                if person_id in self._stored:
+                    self._people[person_id] = person
+            return person
 
     def get_by_name(self, name: str) -> Optional[Person]:
-        """Find a person by display name (case-insensitive linear scan)."""
-        needle = name.lower()
+        """Find a person by display name (case-insensitive), preferring
+        one that is in view when several share the name."""
+        with self._lock:
+            pids = self._name_ids.get(name.casefold())
+            if not pids:
+                return None
+            match = next((pid for pid in pids if self._active_person(pid)), pids[0])
+        return self.get_by_id(match)
+
+    def get_record(self, person_id: str) -> Optional[dict]:
+        """A copy of the stored record for ``person_id`` (read on demand)."""
+        stored = self._record(person_id)
+        if stored is None:
+            return None
         with self._lock:
-            for p in self._active.values():
-                if p.name and p.name.lower() == needle:
-                    return p
-            for stored in self._stored.values():
-                if (stored.get("name") or "").lower() == needle:
-                    return Person.from_dict(stored)
-        return None
+            return dict(stored)
 
     @property
     def active_ids(self) -> list[int]:
@@ -422,21 +523,132 @@ class PeopleMemory:
             return list(self._active.keys())
 
     @property
-    def known_names(self) -> list[str]:
-        """All names that have been persisted."""
-        with self._lock:
-            return [d.get("name", pid) for pid, d in self._stored.items()]
+    def known_names(self) -> tuple:
+        """All names that have been persisted (cached)."""
+        names = self._known_names
+        if names is None:
+            with self._lock:
+                if self._known_names is None:
+                    self._known_names = tuple(e.get("name", pid)
+                                              for pid, e in self._index.items())
+                names = self._known_names
+        return names
 
     @property
-    def known_person_ids(self) -> list[str]:
-        """All stored person IDs."""
-        with self._lock:
-            return list(self._stored.keys())
+    def known_person_ids(self) -> frozenset:
+        """All stored person IDs (cached)."""
+        ids = self._known_ids
+        if ids is None:
+            with self._lock:
+                if self._known_ids is None:
+                    self._known_ids = frozenset(self._index)
+                ids = self._known_ids
+        return ids
 
     @property
     def active_count(self) -> int:
         return len(self._active)
 
+    @property
+    def cache_stats(self) -> dict:
+        """Known people vs full records resident, plus fault/eviction counts."""
+        with self._lock:
+            return {"known": len(self._index), "resident": len(self._stored),
+                    "max_resident": self._max_resident, **self._cache_stats}
+
+    # --- Lookup indexes (caller holds ``_lock``) ---
+
+    def _set_index(self, person_id: str, entry: Optional[dict]):
+        """Replace (or with None, remove) a person's index entry and keep
+        the name index and the cached name/ID lists in step."""
+        old = self._index.pop(person_id, None) if entry is None \
+            else self._index.get(person_id)
+        old_name = old.get("name") if old else None
+        new_name = entry.get("name") if entry else None
+        if entry is not None:
+            self._index[person_id] = entry
+        if old is None or entry is None:
+            self._known_ids = None
+        if old is None or entry is None or old_name != new_name:
+            self._known_names = None
+            if old_name:
+                ids = self._name_ids.get(old_name.casefold(), [])
+                if person_id in ids:
+                    ids.remove(person_id)
+                    if not ids:
+                        del self._name_ids[old_name.casefold()]
+            if new_name:
+                self._name_ids.setdefault(new_name.casefold(), []).append(person_id)
+
+    def _active_person(self, person_id: str) -> Optional[Person]:
+        tid = self._track_of.get(person_id)
+        person = self._active.get(tid) if tid is not None else None
+        return person if person is not None and person.persistent_id == person_id else None
+
+    def _bind(self, track_id: int, person: Person, person_id: str):
+        """Give an active track's Person its persistent ID."""
+        with self._lock:
+            if person.persistent_id and self._track_of.get(person.persistent_id) == track_id:
+                del self._track_of[person.persistent_id]
+            person.persistent_id = person_id
+            self._track_of[person_id] = track_id
+
+    # --- Resident records ---
+
+    def _record(self, person_id: str) -> Optional[dict]:
+        """The full stored record for ``person_id``, read from the store on
+        a miss. Returns the resident dict itself (callers copy what they keep)."""
+        with self._lock:
+            stored = self._stored.get(person_id)
+            if stored is not None:
+                self._stored.move_to_end(person_id)
+                return stored
+            if person_id not in self._index:
+                return None
+        # Hold the flush lock so no batch lands between reading the store
+        # and re-applying the changes that are still queued.
+        with self._flush_lock:
+            record = self._store.get(person_id)
+            with self._lock:
+                if person_id not in self._index:
+                    return None  # deleted meanwhile
+                stored = self._stored.get(person_id)
+                if stored is not None:
+                    return stored
+                if record is None:
+                    logger.warning(f"Person {person_id} is indexed but not in the store")
+                    record = {"persistent_id": person_id,
+                              "name": self._index[person_id].get("name")}
+                pending = self._dirty.get(person_id)
+                if pending is not None:
+                    record.update(pending.fields)
+                    record.setdefault("dialogues", []).extend(pending.dialogues)
+                self._stored[person_id] = record
+                self._cache_stats["faults"] += 1
+                self._evict()
+                return record
+
+    def _evict(self, keep_last: bool = True):
+        """Drop least recently used full records beyond ``max_resident``.
+        Dirty and in-view records are skipped; they go once flushed or
+        their track is removed. Caller holds ``_lock``."""
+        excess = len(self._stored) - self._max_resident
+        if excess <= 0:
+            return
+        pinned = {p.persistent_id for p in self._active.values()}
+        candidates = list(self._stored)
+        if keep_last:
+            candidates = candidates[:-1]   # never the one just used
+        for pid in candidates:
+            if excess <= 0:
+                break
+            if pid in pinned or pid in self._dirty or pid not in self._persisted:
+                continue
+            del self._stored[pid]
+            self._people.pop(pid, None)
+            self._cache_stats["evictions"] += 1
+            excess -= 1
+
     # --- Updates (all by track_id) ---
 
     def update_seen(self, track_id: int, emotion: str = ""):
@@ -453,13 +665,18 @@ class PeopleMemory:
                      language: str = "", emotion: str = ""):
         """Add a dialogue entry."""
         person = self.get_or_create(track_id)
-        person.dialogues.append(DialogueEntry(
+        entry = DialogueEntry(
             timestamp=time.time(), speaker=speaker, text=text,
             language=language, emotion=emotion,
-        ))
+        )
+        person.dialogues.append(entry)
         person.last_talked = time.time()
-        if person.is_identified:
-            self._save(person)
+        if not person.is_identified:
+            return
+        if len(person.dialogues) > self._spill_at:
+            self._spill(person)
+        else:
+            self._save(person, ("last_talked",), dialogue=entry)
 
     @staticmethod
     def _fact_similar(a: str, b: str, person_name: Optional[str] = None) -> bool:
@@ -499,7 +716,7 @@ class PeopleMemory:
         person.facts.append(normalized)
         logger.info(f"New fact about track {track_id} ({person.name or '?'}): {normalized}")
         if person.is_identified:
-            self._save(person)
+            self._save(person, ("facts",))
 
     def replace_fact(self, track_id: int, old_fact: str, new_fact: str):
         """Replace an existing fact with an updated version (normalized)."""
@@ -517,7 +734,7 @@ class PeopleMemory:
             self.add_fact(track_id, new_fact)
             return
         if person.is_identified:
-            self._save(person)
+            self._save(person, ("facts",))
 
     def mark_topic_asked(self, track_id: int, topic: str):
         """Record that we've asked this person about ``topic``."""
@@ -526,13 +743,13 @@ class PeopleMemory:
             person.asked_topics.append(topic)
             logger.info(f"Asked track {track_id} ({person.name or '?'}) about {topic}")
             if person.is_identified:
-                self._save(person)
+                self._save(person, ("asked_topics",))
 
     def update_summary(self, track_id: int, summary: str):
         person = self.get_or_create(track_id)
         person.summary = summary
         if person.is_identified:
-            self._save(person)
+            self._save(person, ("summary",))
 
     # --- Context for LLM ---
 
@@ -610,68 +827,310 @@ class PeopleMemory:
             parts.append(person.facts[0])
         return ", ".join(parts)
 
+    # --- Dialogue history ---
+
+    def _spill(self, person: Person):
+        """Move all but the newest ``hot_dialogues`` entries of an identified
+        person to the archive (written by the flusher, ahead of the trimmed
+        record) and queue them for the summarizer."""
+        pid = person.persistent_id
+        with self._lock:
+            old = person.dialogues[:-self._hot_dialogues]
+            if not old:
+                return
+            del person.dialogues[:-self._hot_dialogues]
+            pending = self._dirty.setdefault(pid, _PendingWrite())
+            pending.archive.extend(e.to_dict() for e in old)
+            pending.full = True
+            self._stored[pid] = person.to_dict()
+            self._stored.move_to_end(pid)
+            self._persisted.add(pid)
+            if self._people.get(pid) is not person:
+                self._people.pop(pid, None)
+            self._flush_stats["saves"] += 1
+        logger.info(f"Archiving {len(old)} older dialogue entries of {pid}")
+        self._schedule_flush()
+        if self.summarizer is not None:
+            self._queue_summary(pid, old)
+
+    def _queue_summary(self, person_id: str, entries: list):
+        with self._lock:
+            queued = self._to_summarize.get(person_id)
+            if queued is not None:
+                queued.extend(entries)  # a summarizer thread is already running
+                return
+            self._to_summarize[person_id] = list(entries)
+        threading.Thread(target=self._summarize_loop, args=(person_id,),
+                         daemon=True, name=f"summary-{person_id}").start()
+
+    def _summarize_loop(self, person_id: str):
+        while True:
+            with self._lock:
+                entries = self._to_summarize.get(person_id)
+                if not entries:
+                    self._to_summarize.pop(person_id, None)
+                    return
+                limit = self._hot_dialogues * self._SUMMARY_MAX_CHUNKS
+                if len(entries) > limit:
+                    logger.info(f"Summarizing only the newest {limit} of {len(entries)} "
+                                f"archived dialogue entries of {person_id}")
+                    entries = entries[-limit:]
+                self._to_summarize[person_id] = entries[self._hot_dialogues:]
+                entries = entries[:self._hot_dialogues]
+            # Fault the record in: an evicted person still has a summary.
+            stored = self._record(person_id) or {}
+            with self._lock:
+                name, summary = stored.get("name"), stored.get("summary", "")
+            try:
+                new_summary = self.summarizer(name, summary, entries)
+            except Exception as e:
+                logger.warning(f"Summarizing dialogue of {person_id} failed: {e}")
+                continue
+            if new_summary and new_summary != summary:
+                self._update_stored(person_id, summary=new_summary)
+
+    def dialogue_count(self, person_id: str) -> int:
+        """Dialogue entries for a person, hot window plus archive."""
+        person = self.get_by_id(person_id)
+        # The flush lock keeps entries from being between queue and archive.
+        with self._flush_lock:
+            with self._lock:
+                pending = self._dirty.get(person_id)
+                queued = len(pending.archive) if pending else 0
+                hot = len(person.dialogues) if person else 0
+            return self._archive.count(person_id) + queued + hot
+
+    def dialogue_history(self, person_id: str, offset: int = 0,
+                         limit: int = 50) -> list[DialogueEntry]:
+        """Page back through a person's whole dialogue history.
+
+        ``offset`` counts entries back from the newest; the page comes
+        back oldest first. Recent pages are served from memory, older
+        ones are read from the archive segments that cover them.
+        """
+        person = self.get_by_id(person_id)
+        with self._flush_lock:
+            with self._lock:
+                pending = self._dirty.get(person_id)
+                queued = [DialogueEntry(**e) for e in pending.archive] if pending else []
+                recent = queued + (list(person.dialogues) if person else [])
+            end = len(recent) - offset
+            page = recent[max(0, end - limit):max(0, end)]
+            if len(page) < limit:
+                older = self._archive.read(person_id, max(0, offset - len(recent)),
+                                           limit - len(page))
+                page = [DialogueEntry(**e) for e in older] + page
+        return page
+
     # --- Persistence ---
 
-    def _save(self, person: Person):
-        """Save a person to disk (only if identified).
+    # Fields that change while a person is merely in view.
+    _SESSION_FIELDS = ("last_seen", "times_seen", "emotion", "last_talked")
 
-        Uses atomic write (temp file + rename) to prevent corruption
-        from concurrent saves.
+    def _save(self, person: Person, fields: Optional[tuple] = None,
+              dialogue: Optional[DialogueEntry] = None):
+        """Mark a person dirty (only if identified); the flusher writes it.
+
+        ``fields`` names the record keys that changed and ``dialogue`` a
+        newly appended line, so incremental stores write just those.
+        Without them, or before the person's first full save, the whole
+        record is written. The index and any resident record are updated
+        immediately.
         """
         if not person.is_identified or not person.persistent_id:
             return
         pid = person.persistent_id
-        data = person.to_dict()
         with self._lock:
-            self._stored[pid] = data
-        os.makedirs(self._dir, exist_ok=True)
-        fpath = os.path.join(self._dir, f"{pid}.json")
-        tmp_path = fpath + ".tmp"
-        with open(tmp_path, "w") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        os.replace(tmp_path, fpath)
+            pending = self._dirty.setdefault(pid, _PendingWrite())
+            if fields is not None and pid in self._persisted:
+                values = {}
+                for f in fields:
+                    v = getattr(person, f)
+                    values[f] = list(v) if isinstance(v, list) else v
+                # A non-resident record picks these up when faulted in.
+                stored = self._stored.get(pid)
+                if stored is not None:
+                    stored.update(values)
+                pending.fields.update(values)
+                if dialogue is not None:
+                    entry = dialogue.to_dict()
+                    if stored is not None:
+                        stored.setdefault("dialogues", []).append(entry)
+                    pending.dialogues.append(entry)
+            else:
+                self._stored[pid] = person.to_dict()
+                self._stored.move_to_end(pid)
+                self._persisted.add(pid)
+                pending.full = True
+                self._evict()
+            if self._people.get(pid) is not person:
+                self._people.pop(pid, None)
+            self._set_index(pid, {"persistent_id": pid, "name": person.name,
+                                  "last_seen": person.last_seen,
+                                  "n_facts": len(person.facts)})
+            self._flush_stats["saves"] += 1
+        self._schedule_flush()
 
     def save_all(self):
         """Save all identified active people."""
         with self._lock:
             people = [p for p in self._active.values() if p.is_identified]
         for p in people:
-            self._save(p)
+            self._save(p, self._SESSION_FIELDS)
+
+    def _update_stored(self, person_id: str, **fields) -> bool:
+        """Set top-level fields on a stored record (and on any active
+        Person with that ID), then mark just those fields dirty."""
+        stored = self._record(person_id)
+        if not stored:
+            return False
+        with self._lock:
+            if person_id not in self._index:
+                return False  # deleted meanwhile
+            stored.update(fields)
+            self._people.pop(person_id, None)
+            self._set_index(person_id, index_entry(stored))
+            p = self._active_person(person_id)
+            if p is not None:
+                for key, value in fields.items():
+                    setattr(p, key, list(value) if isinstance(value, list) else value)
+            pending = self._dirty.setdefault(person_id, _PendingWrite())
+            pending.fields.update(fields)
+            if person_id not in self._persisted:
+                self._persisted.add(person_id)
+                pending.full = True
+            self._flush_stats["saves"] += 1
+        self._schedule_flush()
+        return True
+
+    # --- Write-behind ---
+
+    def _schedule_flush(self):
+        if self._flush_interval <= 0:
+            self._flush_pending()
+            return
+        if self._flush_thread is None or not self._flush_thread.is_alive():
+            self._flush_stop.clear()
+            self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True,
+                                                  name="people-flush")
+            self._flush_thread.start()
+        self._flush_wake.set()
+
+    def _flush_loop(self):
+        while not self._flush_stop.is_set():
+            self._flush_wake.wait()
+            self._flush_wake.clear()
+            # Coalescing window: later changes to the same person within
+            # it ride along in the same write.
+            self._flush_stop.wait(self._flush_interval)
+            self._flush_pending()
+
+    def _flush_pending(self) -> bool:
+        """Write every dirty person once. Returns False if any write failed
+        (those stay dirty and are retried on the next flush)."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._dirty = self._dirty, {}
+                whole = {}
+                for pid, w in batch.items():
+                    stored = self._stored.get(pid)
+                    if stored is not None and (w.full or not self._store.incremental):
+                        whole[pid] = {**stored, "dialogues": list(stored.get("dialogues", []))}
+            if not batch:
+                return True
+            t0 = time.perf_counter()
+            failed = {}
+            for pid, w in batch.items():
+                try:
+                    if w.archive:
+                        self._archive.append(pid, w.archive)
+                        w.archive = []  # written; a retry must not repeat it
+                    if pid in whole:
+                        self._store.save(whole[pid])
+                    elif pid not in self._index:
+                        continue  # deleted while queued
+                    elif w.dialogues:
+                        self._store.append_dialogues(pid, w.dialogues, w.fields)
+                    elif w.fields:
+                        self._store.update(pid, w.fields)
+                except Exception as e:
+                    logger.error(f"Failed to write person {pid}: {e}")
+                    failed[pid] = w
+            try:
+                self._store.sync()
+            except Exception as e:
+                logger.error(f"People store sync failed: {e}")
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            with self._lock:
+                st = self._flush_stats
+                st["flushes"] += 1
+                st["writes"] += len(batch) - len(failed)
+                st["errors"] += len(failed)
+                st["total_ms"] += elapsed_ms
+                st["last_ms"] = elapsed_ms
+                st["max_ms"] = max(st["max_ms"], elapsed_ms)
+                for pid, w in failed.items():
+                    newer = self._dirty.pop(pid, None)
+                    if newer is not None:
+                        w.full |= newer.full
+                        w.fields.update(newer.fields)
+                        w.dialogues.extend(newer.dialogues)
+                        w.archive.extend(newer.archive)
+                    self._dirty[pid] = w
+                self._evict(keep_last=False)
+            return not failed
+
+    def flush(self) -> bool:
+        """Write all pending changes now (blocking). Returns False on write errors."""
+        return self._flush_pending()
+
+    @property
+    def flush_stats(self) -> dict:
+        """Write-behind counters: ``saves`` requested vs ``writes`` done
+        (the difference was coalesced), flush latency in ms, errors."""
+        with self._lock:
+            st = dict(self._flush_stats)
+            st["pending"] = len(self._dirty)
+        st["avg_ms"] = st.pop("total_ms") / st["flushes"] if st["flushes"] else 0.0
+        return st
 
     def delete(self, person_id: str) -> bool:
         """Remove a person from memory and disk by ID."""
         removed = False
-        with self._lock:
-            if person_id in self._stored:
-                del self._stored[person_id]
+        with self._flush_lock:
+            with self._lock:
+                if person_id in self._index:
+                    self._set_index(person_id, None)
+                    removed = True
+                self._stored.pop(person_id, None)
+                self._people.pop(person_id, None)
+                self._track_of.pop(person_id, None)
+                self._persisted.discard(person_id)
+                self._dirty.pop(person_id, None)
+                for tid in [t for t, p in self._active.items()
+                            if p.persistent_id == person_id]:
+                    del self._active[tid]
+                    removed = True
+            if self._store.delete(person_id):
                 removed = True
-            for tid in [t for t, p in self._active.items()
-                        if p.persistent_id == person_id]:
-                del self._active[tid]
-                removed = True
-        fpath = os.path.join(self._dir, f"{person_id}.json")
-        if os.path.exists(fpath):
-            os.remove(fpath)
-            removed = True
+            self._archive.delete(person_id)
         return removed
 
     def rename(self, person_id: str, new_name: str) -> bool:
         """Update the display name of a stored person. ID stays the same."""
-        with self._lock:
-            stored = self._stored.get(person_id)
-            if not stored:
-                return False
-            stored["name"] = new_name
-            for p in self._active.values():
-                if p.persistent_id == person_id:
-                    p.name = new_name
-
-        fpath = os.path.join(self._dir, f"{person_id}.json")
-        with open(fpath, "w") as f:
-            json.dump(stored, f, indent=2, ensure_ascii=False)
+        if not self._update_stored(person_id, name=new_name):
+            return False
         logger.info(f"Renamed {person_id} -> {new_name!r}")
         return True
 
+    def set_facts(self, person_id: str, facts: list[str]) -> bool:
+        """Replace a stored person's facts (offline dedupe / compression)."""
+        return self._update_stored(person_id, facts=list(facts))
+
+    def reset_topics(self, person_id: str) -> bool:
+        """Clear asked_topics so the interview questions get asked again."""
+        return self._update_stored(person_id, asked_topics=[])
+
 
 # ---------------------------------------------------------------------------
 # Offline cleanup helpers (used by `dedupe` and `compress` CLI commands)
@@ -715,34 +1174,17 @@ def _dedupe_person_facts(
     return kept, changes
 
 
-def _load_face_encodings_by_person(db_dir: str) -> dict:
-    """Load ``known_faces/faces.pkl`` and return {person_id: [encoding, ...]}."""
-    path = os.path.join(db_dir, "faces.pkl")
-    if not os.path.exists(path):
-        return {}
-    import pickle
-    with open(path, "rb") as fh:
-        db = pickle.load(fh)
+def _load_face_encodings_by_person(db_dir: str) -> tuple[dict, str]:
+    """Load the face gallery in ``db_dir``. Returns ``({person_id: [encoding,
+    ...]}, metric)``."""
+    if not os.path.isdir(db_dir):
+        return {}, "euclidean"
+    from face_store import read_gallery, read_metric
+    encodings, person_ids = read_gallery(db_dir)
     out: dict = {}
-    for pid, enc in zip(db.get("person_ids", []), db.get("encodings", [])):
+    for pid, enc in zip(person_ids, encodings):
         out.setdefault(pid, []).append(enc)
-    return out
-
-
-def _pair_face_distances(encs_a: list, encs_b: list) -> tuple[float, float]:
-    """Return (min, mean) L2 distance between two encoding sets.
-
-    ``(inf, inf)`` if either set is empty.
-    """
-    if not encs_a or not encs_b:
-        return float("inf"), float("inf")
-    import numpy as _np
-    A = _np.asarray(encs_a)
-    B = _np.asarray(encs_b)
-    # Pairwise L2: ||a-b|| for every a in A, b in B
-    diffs = A[:, None, :] - B[None, :, :]
-    d = _np.linalg.norm(diffs, axis=2)
-    return float(d.min()), float(d.mean())
+    return out, read_metric(db_dir)
 
 
 def _name_similarity(a: Optional[str], b: Optional[str]) -> float:
@@ -752,20 +1194,13 @@ def _name_similarity(a: Optional[str], b: Optional[str]) -> float:
     return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
 
-def _facts_similarity(facts_a: list[str], facts_b: list[str]) -> float:
-    if not facts_a or not facts_b:
-        return 0.0
-    toks_a: set = set()
-    toks_b: set = set()
-    for f in facts_a:
-        toks_a |= _fact_tokens(f)
-    for f in facts_b:
-        toks_b |= _fact_tokens(f)
-    return _jaccard(toks_a, toks_b)
-
-
 def _similarity_verdict(face_min: float, name: float, facts: float) -> Optional[str]:
-    """Classify a pair. Returns a short label or None to hide."""
+    """Classify a pair. Returns a short label or None to hide.
+
+    ``face_min`` is in the gallery's own distance (dlib L2, or ``1 - cos``
+    for ArcFace-style galleries); the thresholds are relative to the 0.6
+    recognition tolerance both embedders share.
+    """
     if face_min < 0.40:
         return "LIKELY SAME"
     if face_min < 0.55 and (name > 0.85 or facts > 0.30):
@@ -829,6 +1264,8 @@ def main():
 
     parser = argparse.ArgumentParser(description="People memory CLI")
     parser.add_argument("--dir", default="people", help="Storage directory")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json",
+                        help="Storage backend (see people_store.py)")
     sub = parser.add_subparsers(dest="command")
 
     sub.add_parser("list", help="List all known people")
@@ -857,6 +1294,12 @@ def main():
         help="Face encoding database directory (default: known_faces)")
     similar_p.add_argument("--all", action="store_true",
         help="Show every pair, even ones below the verdict thresholds")
+    similar_p.add_argument("--workers", type=int, default=0,
+        help="Threads for face distances (default: all cores)")
+    history_p = sub.add_parser("history", help="Page through a person's whole dialogue")
+    history_p.add_argument("name", help="person_id or name")
+    history_p.add_argument("--page", type=int, default=0, help="0 = most recent")
+    history_p.add_argument("--limit", type=int, default=20, help="Entries per page")
     sub.add_parser("shell", help="Interactive shell for poking at people memory")
 
     args = parser.parse_args()
@@ -865,7 +1308,8 @@ def main():
                         format="%(asctime)s [%(levelname)s] %(message)s",
                         datefmt="%H:%M:%S")
 
-    mem = PeopleMemory(storage_dir=args.dir)
+    # One-shot commands: write through, no background flusher.
+    mem = PeopleMemory(storage_dir=args.dir, backend=args.backend, flush_interval=0)
     mem.load()
 
     if args.command == "list" or args.command is None:
@@ -916,10 +1360,10 @@ def main():
         print(f"Added fact about {args.name}: {args.fact}")
 
     elif args.command == "dedupe":
-        pids = [args.person] if args.person else sorted(mem._stored.keys())
+        pids = [args.person] if args.person else sorted(mem.known_person_ids)
         total_before = total_after = total_changes = 0
         for pid in pids:
-            stored = mem._stored.get(pid)
+            stored = mem.get_record(pid)
             if not stored:
                 print(f"  {pid}: not found")
                 continue
@@ -946,12 +1390,7 @@ def main():
                     print(f"  * replaced {a!r}")
                     print(f"    with     {b!r}")
             if args.apply:
-                stored["facts"] = new_facts
-                fpath = os.path.join(mem._dir, f"{pid}.json")
-                tmp = fpath + ".tmp"
-                with open(tmp, "w") as f:
-                    json.dump(stored, f, indent=2, ensure_ascii=False)
-                os.replace(tmp, fpath)
+                mem.set_facts(pid, new_facts)
                 print("  [written]")
         suffix = "" if args.apply else "  (dry-run; pass --apply to write)"
         print(f"\nTotal: {total_before} -> {total_after} facts, "
@@ -984,64 +1423,67 @@ def main():
         for f in new_facts:
             print(f"  - {f}")
         if args.apply:
-            stored = mem._stored.get(pid, {})
-            stored["facts"] = new_facts
-            mem._stored[pid] = stored
-            fpath = os.path.join(mem._dir, f"{pid}.json")
-            tmp = fpath + ".tmp"
-            with open(tmp, "w") as f:
-                json.dump(stored, f, indent=2, ensure_ascii=False)
-            os.replace(tmp, fpath)
-            print(f"\n[written to {fpath}]")
+            mem.set_facts(pid, new_facts)
+            print(f"\n[written {pid}]")
         else:
             print("\n(dry-run; pass --apply to write)")
 
     elif args.command == "similar":
-        pids = sorted(mem._stored.keys())
+        pids = sorted(mem.known_person_ids)
         if not pids:
             print("No people records.")
             return
-        encs_by_pid = _load_face_encodings_by_person(args.db_dir)
+        encs_by_pid, metric = _load_face_encodings_by_person(args.db_dir)
         if not encs_by_pid:
-            print(f"Warning: no face encodings loaded from {args.db_dir}/faces.pkl — "
+            print(f"Warning: no face encodings loaded from {args.db_dir} — "
                   "falling back to name+facts only.")
 
-        def meta(pid):
-            s = mem._stored.get(pid, {})
-            return s.get("name"), list(s.get("facts", []))
-
-        focus = [args.person] if args.person else pids
-        shown = 0
-        for i, pid_a in enumerate(focus):
-            if pid_a not in mem._stored:
-                print(f"  {pid_a}: not found"); continue
-            name_a, facts_a = meta(pid_a)
-            encs_a = encs_by_pid.get(pid_a, [])
-            start = 0 if args.person else i + 1
-            for pid_b in pids[start:]:
-                if pid_b == pid_a:
-                    continue
-                name_b, facts_b = meta(pid_b)
-                encs_b = encs_by_pid.get(pid_b, [])
-                face_min, face_mean = _pair_face_distances(encs_a, encs_b)
-                name_sim = _name_similarity(name_a, name_b)
-                facts_sim = _facts_similarity(facts_a, facts_b)
-                verdict = _similarity_verdict(face_min, name_sim, facts_sim)
-                if verdict is None and not args.all:
-                    continue
-                shown += 1
-                face_txt = (f"{face_min:.2f}/{face_mean:.2f}"
-                            if face_min != float("inf") else "n/a")
-                label = verdict or "below thresholds"
-                print(f"{pid_a} ({name_a or '?'})  ~  {pid_b} ({name_b or '?'})")
-                print(f"  face min/mean: {face_txt}  "
-                      f"name: {name_sim:.2f}  facts: {facts_sim:.2f}  "
-                      f"-> {label}")
-        if shown == 0:
+        from people_similarity import find_similar, merge_clusters
+
+        if args.person and args.person not in pids:
+            print(f"  {args.person}: not found")
+            return
+        records = {pid: mem.get_record(pid) or {} for pid in pids}
+        names = {pid: records[pid].get("name") for pid in pids}
+        facts = {pid: list(records[pid].get("facts", [])) for pid in pids}
+        t0 = time.perf_counter()
+        pairs = find_similar(pids, names, facts, encs_by_pid,
+                             focus=[args.person] if args.person else None,
+                             include_all=args.all, workers=args.workers, metric=metric)
+        elapsed = time.perf_counter() - t0
+        for p in pairs:
+            face_txt = (f"{p.face_min:.2f}/{p.face_mean:.2f}"
+                        if p.face_min != float("inf") else "n/a")
+            label = p.verdict or "below thresholds"
+            print(f"{p.a} ({names[p.a] or '?'})  ~  {p.b} ({names[p.b] or '?'})")
+            print(f"  face min/mean: {face_txt}  "
+                  f"name: {p.name:.2f}  facts: {p.facts:.2f}  "
+                  f"-> {label}")
+        if not pairs:
             print("No suspicious pairs."
                   " Use --all to see every pair regardless of threshold.")
         else:
-            print(f"\n{shown} pair(s) shown.")
+            print(f"\n{len(pairs)} pair(s) shown ({len(pids)} people, {elapsed:.2f} s).")
+        clusters = merge_clusters(pairs)
+        if clusters:
+            print("\nMerge candidates (LIKELY SAME, transitively):")
+            for group in clusters:
+                print("  " + ", ".join(f"{pid} ({names[pid] or '?'})" for pid in group))
+
+    elif args.command == "history":
+        person = mem.get_by_id(args.name) or mem.get_by_name(args.name)
+        if not person:
+            print(f"No person found for {args.name!r}")
+            return
+        pid = person.persistent_id
+        total = mem.dialogue_count(pid)
+        pages = max(1, -(-total // args.limit))
+        entries = mem.dialogue_history(pid, offset=args.page * args.limit, limit=args.limit)
+        print(f"{pid} ({person.name}): {total} dialogue entries, "
+              f"page {args.page + 1}/{pages}\n")
+        for d in entries:
+            ts = datetime.fromtimestamp(d.timestamp).strftime("%Y-%m-%d %H:%M")
+            print(f"  [{ts}] {d.speaker}: {d.text}")
 
     elif args.command == "shell":
         from debug_shell import run_shell
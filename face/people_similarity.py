@@ -0,0 +1,382 @@
+"""
+All-pairs person similarity for ``people_memory.py similar``.
+
+Finds people records that may be the same person, from three signals:
+face distance (min / mean over both people's gallery encodings, L2 or
+``1 - cos`` following the gallery's metric), name similarity and shared
+fact tokens. The verdict rules are
+``people_memory._similarity_verdict``; this module only makes them cheap
+to evaluate for every pair:
+
+    faces   every encoding is stacked once, grouped by person, and the
+            person x person min/mean distance matrices are filled in blocks
+            of whole people, one matrix product per block pair, spread
+            over a thread pool (numpy releases the GIL in the products)
+    names   a ratio above the threshold implies many shared character
+            bigrams, so candidates come from a prefix-filtered bigram
+            index and must pass ``SequenceMatcher``'s cheap bounds
+    facts   Jaccard candidates come from a prefix-filtered token index, so
+            pairs that cannot reach the threshold are never compared
+
+String similarity is computed only for pairs that some signal flags.
+Pairs judged ``LIKELY SAME`` are joined into merge clusters (union-find).
+
+Can be run standalone (synthetic benchmark):
+    python people_similarity.py --people 2000 [--samples 10] [--workers 4]
+"""
+
+import argparse
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Optional
+
+import numpy as np
+
+from people_memory import _fact_tokens, _jaccard, _name_similarity, _similarity_verdict
+
+logger = logging.getLogger("people_similarity")
+
+# Lowest values at which ``_similarity_verdict`` can label a pair on that
+# signal alone; pairs below all three are never shown without ``--all``.
+FACE_CANDIDATE = 0.55
+NAME_CANDIDATE = 0.90
+FACTS_CANDIDATE = 0.50
+
+
+@dataclass
+class SimilarPair:
+    a: str
+    b: str
+    face_min: float
+    face_mean: float
+    name: float
+    facts: float
+    verdict: Optional[str]
+
+
+# ---------------------------------------------------------------------------
+# Face distances
+# ---------------------------------------------------------------------------
+
+@dataclass
+class FaceDistances:
+    """Person x person face distances. ``inf`` where either person has no
+    encodings and on the diagonal."""
+    pids: list
+    min: np.ndarray
+    mean: np.ndarray
+
+    def __post_init__(self):
+        self.index = {pid: i for i, pid in enumerate(self.pids)}
+
+    def get(self, a: str, b: str) -> tuple[float, float]:
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return float("inf"), float("inf")
+        return float(self.min[i, j]), float(self.mean[i, j])
+
+
+def _person_blocks(offsets: np.ndarray, block_rows: int) -> list[tuple[int, int]]:
+    """Split people into consecutive ranges of about ``block_rows`` encodings."""
+    blocks, start = [], 0
+    for p in range(1, len(offsets)):
+        if offsets[p] - offsets[start] >= block_rows or p == len(offsets) - 1:
+            blocks.append((start, p))
+            start = p
+    return blocks
+
+
+def face_distance_matrix(encodings_by_pid: dict, pids: list,
+                         focus: Optional[list] = None,
+                         block_rows: int = 2048, workers: int = 0,
+                         metric: str = "euclidean") -> FaceDistances:
+    """Min/mean face distance for every pair of ``pids``: L2, or ``1 - cos``
+    (half the squared L2 of normalised vectors) with ``metric="cosine"``.
+
+    With ``focus`` only the rows of those people are filled (the rest stay
+    ``inf``), which is what ``similar --person`` needs.
+    """
+    P = len(pids)
+    counts = np.array([len(encodings_by_pid.get(pid, ())) for pid in pids], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    min_d = np.full((P, P), np.inf, dtype=np.float32)
+    mean_d = np.full((P, P), np.inf, dtype=np.float32)
+    if offsets[-1] == 0:
+        return FaceDistances(list(pids), min_d, mean_d)
+
+    stacked = np.concatenate([np.asarray(encodings_by_pid[pid], dtype=np.float32)
+                              for pid, n in zip(pids, counts) if n])
+    sq = np.einsum("ij,ij->i", stacked, stacked)
+    blocks = _person_blocks(offsets, block_rows)
+    cosine = metric == "cosine"
+
+    def fill(p0: int, p1: int, q0: int, q1: int, mirror: bool):
+        r0, r1, c0, c1 = offsets[p0], offsets[p1], offsets[q0], offsets[q1]
+        if r1 == r0 or c1 == c0:
+            return
+        d = stacked[r0:r1] @ stacked[c0:c1].T
+        d *= -2.0
+        d += sq[r0:r1, None]
+        d += sq[None, c0:c1]
+        np.maximum(d, 0.0, out=d)
+        if cosine:
+            d *= 0.5
+        else:
+            np.sqrt(d, out=d)
+        # Reduce columns then rows per person. reduceat needs non-empty
+        # segments, so people without encodings are skipped here.
+        cols = [q for q in range(q0, q1) if counts[q]]
+        rows = [p for p in range(p0, p1) if counts[p]]
+        col_at = offsets[cols] - c0
+        row_at = offsets[rows] - r0
+        mins = np.minimum.reduceat(np.minimum.reduceat(d, col_at, axis=1), row_at, axis=0)
+        sums = np.add.reduceat(np.add.reduceat(d, col_at, axis=1, dtype=np.float64),
+                               row_at, axis=0)
+        means = sums / np.outer(counts[rows], counts[cols])
+        ix = np.ix_(rows, cols)
+        min_d[ix] = mins
+        mean_d[ix] = means
+        if mirror:
+            min_d[np.ix_(cols, rows)] = mins.T
+            mean_d[np.ix_(cols, rows)] = means.T
+
+    tasks = []
+    if focus is None:
+        for bi, (p0, p1) in enumerate(blocks):
+            for q0, q1 in blocks[bi:]:
+                tasks.append((p0, p1, q0, q1, True))
+    else:
+        for pid in focus:
+            p = pids.index(pid)
+            tasks.extend((p, p + 1, q0, q1, False) for q0, q1 in blocks)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        list(pool.map(lambda t: fill(*t), tasks))
+    np.fill_diagonal(min_d, np.inf)
+    np.fill_diagonal(mean_d, np.inf)
+    return FaceDistances(list(pids), min_d, mean_d)
+
+
+# ---------------------------------------------------------------------------
+# String candidates
+# ---------------------------------------------------------------------------
+
+def _tagged_bigrams(s: str) -> list:
+    """Bigrams as a set-like multiset: repeats are tagged with their occurrence."""
+    seen: dict = {}
+    out = []
+    for i in range(len(s) - 1):
+        g = s[i:i + 2]
+        out.append((g, seen.get(g, 0)))
+        seen[g] = seen.get(g, 0) + 1
+    return out or [(s, 0)]
+
+
+def _prefix_filter(items: dict, overlap) -> set:
+    """Pairs of keys whose token sets can share ``overlap(key)`` tokens.
+
+    Tokens are ordered rarest first; a set that must share ``o`` of its
+    ``n`` tokens with another shares one of its first ``n - o + 1``, so
+    only those prefixes are indexed and probed.
+    """
+    freq: dict = {}
+    for toks in items.values():
+        for t in toks:
+            freq[t] = freq.get(t, 0) + 1
+    postings: dict = {}
+    out: set = set()
+    for key, toks in items.items():
+        if not toks:
+            continue
+        ordered = sorted(toks, key=lambda t: (freq[t], t))
+        o = max(1, min(len(ordered), overlap(key)))
+        for t in ordered[:len(ordered) - o + 1]:
+            for other in postings.get(t, ()):
+                out.add((other, key) if other < key else (key, other))
+            postings.setdefault(t, []).append(key)
+    return out
+
+
+def name_candidates(names: dict, threshold: float = NAME_CANDIDATE) -> set:
+    """Pairs ``(a, b)`` whose name ratio exceeds ``threshold``.
+
+    ``ratio = 2M / L`` with ``M`` matched characters and ``L`` the total
+    length. Matched characters form blocks separated by unmatched ones,
+    and a block of ``k`` characters contributes ``k - 1`` bigrams to both
+    names, so the pair shares more than ``(1.5t - 1) L - 1`` bigrams; with
+    ``L >= 2 len(a) / (2 - t)`` that bounds the prefix filter per name.
+    Survivors are checked with ``SequenceMatcher``.
+    """
+    lowered = {pid: n.lower() for pid, n in names.items() if n}
+    grams = {pid: _tagged_bigrams(n) for pid, n in lowered.items()}
+    t = threshold
+
+    def overlap(pid):
+        min_total = 2.0 * len(lowered[pid]) / (2.0 - t)
+        return math.ceil((1.5 * t - 1.0) * min_total - 1.0)
+
+    out: set = set()
+    for a, b in _prefix_filter(grams, overlap):
+        na, nb = lowered[a], lowered[b]
+        if 2.0 * min(len(na), len(nb)) / (len(na) + len(nb)) <= t:
+            continue
+        m = SequenceMatcher(None, na, nb)
+        if m.real_quick_ratio() > t and m.quick_ratio() > t and m.ratio() > t:
+            out.add((a, b))
+    return out
+
+
+def facts_candidates(tokens: dict, threshold: float = FACTS_CANDIDATE) -> set:
+    """Pairs ``(a, b)`` whose fact-token Jaccard reaches ``threshold``.
+
+    Two sets with Jaccard >= t share at least ``ceil(t |x|)`` tokens of
+    each, which is the prefix-filter overlap.
+    """
+    pairs = _prefix_filter(tokens, lambda pid: math.ceil(threshold * len(tokens[pid])))
+    return {(a, b) for a, b in pairs
+            if min(len(tokens[a]), len(tokens[b])) >= threshold * max(len(tokens[a]), len(tokens[b]))
+            and _jaccard(tokens[a], tokens[b]) >= threshold}
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+def find_similar(pids: list, names: dict, facts: dict, encodings_by_pid: dict,
+                 focus: Optional[list] = None, include_all: bool = False,
+                 workers: int = 0, block_rows: int = 2048,
+                 metric: str = "euclidean") -> list[SimilarPair]:
+    """Score person pairs and return the ones ``_similarity_verdict`` labels
+    (every pair with ``include_all``), in ``pids`` order.
+
+    ``names`` maps pid -> name, ``facts`` pid -> list of fact strings.
+    With ``focus``, only pairs involving those people are considered.
+    ``metric`` is the gallery's (``face_store.read_metric``).
+    """
+    pids = sorted(pids)
+    order = {pid: i for i, pid in enumerate(pids)}
+    faces = face_distance_matrix(encodings_by_pid, pids, focus, block_rows, workers, metric)
+    tokens = {}
+    for pid in pids:
+        toks: set = set()
+        for f in facts.get(pid, ()):
+            toks |= _fact_tokens(f)
+        tokens[pid] = toks
+
+    def ordered(a, b):
+        return (a, b) if order[a] < order[b] else (b, a)
+
+    if include_all:
+        if focus is None:
+            pairs = {(a, b) for i, a in enumerate(pids) for b in pids[i + 1:]}
+        else:
+            pairs = {(f, b) for f in focus for b in pids if b != f}
+    else:
+        close = np.argwhere(faces.min < FACE_CANDIDATE)
+        pairs = {ordered(pids[i], pids[j]) for i, j in close if i != j}
+        pairs |= name_candidates({pid: names.get(pid) for pid in pids})
+        pairs |= facts_candidates(tokens)
+        pairs = {ordered(a, b) for a, b in pairs}
+        if focus is not None:
+            focus_set = set(focus)
+            pairs = {p for p in pairs if p[0] in focus_set or p[1] in focus_set}
+            pairs = {(a, b) if a in focus_set else (b, a) for a, b in pairs}
+
+    out = []
+    for a, b in pairs:
+        face_min, face_mean = faces.get(a, b)
+        name = _name_similarity(names.get(a), names.get(b))
+        fact = _jaccard(tokens[a], tokens[b]) if facts.get(a) and facts.get(b) else 0.0
+        verdict = _similarity_verdict(face_min, name, fact)
+        if verdict is None and not include_all:
+            continue
+        out.append(SimilarPair(a, b, face_min, face_mean, name, fact, verdict))
+    out.sort(key=lambda p: (order[p.a], order[p.b]))
+    return out
+
+
+def merge_clusters(pairs: list[SimilarPair], verdicts: tuple = ("LIKELY SAME",)) -> list[list[str]]:
+    """Union-find over pairs with one of ``verdicts``. Clusters of 2+ people, sorted."""
+    parent: dict = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for p in pairs:
+        if p.verdict in verdicts:
+            ra, rb = find(p.a), find(p.b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+    groups: dict = {}
+    for x in parent:
+        groups.setdefault(find(x), []).append(x)
+    return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+
+
+# ---------------------------------------------------------------------------
+# Standalone: synthetic benchmark
+# ---------------------------------------------------------------------------
+
+def _pairwise_reference(encs_a, encs_b) -> tuple[float, float]:
+    """The old per-pair computation, for timing comparisons."""
+    d = np.linalg.norm(np.asarray(encs_a)[:, None, :] - np.asarray(encs_b)[None, :, :], axis=2)
+    return float(d.min()), float(d.mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Person similarity benchmark")
+    parser.add_argument("--people", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=10, help="Encodings per person")
+    parser.add_argument("--duplicates", type=float, default=0.05,
+                        help="Fraction of people that are re-enrolled duplicates")
+    parser.add_argument("--workers", type=int, default=0, help="Threads (default: all cores)")
+    parser.add_argument("--reference-people", type=int, default=150,
+                        help="People used to time the per-pair loop (extrapolated)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(400)]
+    centers = rng.normal(size=(args.people, 128)).astype(np.float32) * 0.1
+    n_dup = int(args.people * args.duplicates)
+    centers[-n_dup or len(centers):] = centers[:n_dup]
+    pids = [f"p{i + 1:04d}" for i in range(args.people)]
+    encs = {pid: list(c + rng.normal(size=(args.samples, 128)).astype(np.float32) * 0.02)
+            for pid, c in zip(pids, centers)}
+    syllables = ["an", "na", "jo", "ak", "im", "li", "sa", "ma", "er", "ik", "ol", "ve", "ra", "to"]
+    base = [" ".join("".join(rng.choice(syllables, rng.integers(2, 4))).title() for _ in range(2))
+            for _ in range(args.people - n_dup)]
+    names = {pid: base[i % len(base)] for i, pid in enumerate(pids)}
+    facts = {pid: [f"likes {' '.join(rng.choice(words, 3))}" for _ in range(4)] for pid in pids}
+
+    t0 = time.perf_counter()
+    pairs = find_similar(pids, names, facts, encs, workers=args.workers)
+    clusters = merge_clusters(pairs)
+    engine_s = time.perf_counter() - t0
+
+    m = min(args.reference_people, args.people)
+    t0 = time.perf_counter()
+    for i in range(m):
+        for j in range(i + 1, m):
+            _pairwise_reference(encs[pids[i]], encs[pids[j]])
+            _name_similarity(names[pids[i]], names[pids[j]])
+    ref_s = (time.perf_counter() - t0) * (args.people * (args.people - 1)) / max(1, m * (m - 1))
+
+    print(f"{args.people} people x {args.samples} encodings: "
+          f"{len(pairs)} flagged pairs, {len(clusters)} merge clusters")
+    print(f"engine:          {engine_s:8.2f} s")
+    print(f"per-pair loop:   {ref_s:8.2f} s (extrapolated from {m} people)")
+
+
+if __name__ == "__main__":
+    main()
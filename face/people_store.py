@@ -0,0 +1,499 @@
+"""
+Storage backends for PeopleMemory.
+
+A record is the dict ``Person.to_dict()`` produces (``persistent_id``,
+``name``, timestamps, ``facts``, ``asked_topics``, ``summary``,
+``dialogues``). ``PeopleMemory`` tells the backend what changed, so a
+backend can write only that:
+
+    save(record)                          whole record
+    update(pid, fields)                   changed top-level fields only
+    append_dialogues(pid, entries, fields)  new dialogue lines (+ fields)
+
+Backends with ``incremental = False`` cannot do better than rewriting the
+record, so ``PeopleMemory`` just hands them the whole record.
+
+``load_index()`` returns one small summary per person (``index_entry``:
+name, last_seen, fact count) without reading dialogue histories;
+``PeopleMemory`` loads that at startup and fetches full records with
+``get()`` on demand.
+
+Backends:
+    json    one ``{person_id}.json`` per person, rewritten on every change
+            (the original format; O(history) per dialogue line), plus a
+            ``people.idx`` summary file validated against file mtimes
+    sqlite  ``people.sqlite3`` in WAL mode: people, facts and topics as
+            tables, dialogues as append-only rows. ``update`` is a
+            single-row upsert, ``append_dialogues`` one INSERT per line.
+
+The first time the sqlite backend opens a directory that still holds
+``*.json`` records they are imported (the files are left in place, so
+the json backend keeps working as a fallback).
+
+Can be run standalone:
+    python people_store.py info [--dir people]
+    python people_store.py migrate [--dir people] [--force]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger("people_store")
+
+SQLITE_FILENAME = "people.sqlite3"
+INDEX_FILENAME = "people.idx"
+
+# Scalar columns of the ``people`` table, in record-key order.
+_SCALARS = ("name", "first_met", "last_seen", "last_talked", "times_seen",
+            "emotion", "summary")
+_SCALAR_DEFAULTS = {"name": None, "first_met": 0.0, "last_seen": 0.0, "last_talked": 0.0,
+                    "times_seen": 0, "emotion": "", "summary": ""}
+_DIALOGUE_KEYS = ("timestamp", "speaker", "text", "language", "emotion")
+
+
+def index_entry(record: dict) -> dict:
+    """The part of a record kept resident for every known person."""
+    return {
+        "persistent_id": record["persistent_id"],
+        "name": record.get("name"),
+        "last_seen": record.get("last_seen", 0.0),
+        "n_facts": len(record.get("facts", [])),
+    }
+
+
+class PeopleStore:
+    """Backend interface. Records are ``Person.to_dict()`` dicts."""
+
+    name = "base"
+    incremental = False
+
+    def load_all(self) -> dict:
+        """``{person_id: record}`` for every stored person."""
+        raise NotImplementedError
+
+    def load_index(self) -> dict:
+        """``{person_id: index_entry(record)}`` for every stored person."""
+        return {pid: index_entry(r) for pid, r in self.load_all().items()}
+
+    def get(self, person_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def save(self, record: dict):
+        """Write a whole record (insert or replace)."""
+        raise NotImplementedError
+
+    def update(self, person_id: str, fields: dict):
+        """Write changed top-level fields of an existing record."""
+        record = self.get(person_id)
+        if record is None:
+            logger.warning(f"update of unknown person {person_id!r} ignored")
+            return
+        record.update(fields)
+        self.save(record)
+
+    def append_dialogues(self, person_id: str, entries: list, fields: Optional[dict] = None):
+        """Append dialogue lines (and write ``fields``, e.g. ``last_talked``)."""
+        record = self.get(person_id)
+        if record is None:
+            logger.warning(f"dialogue for unknown person {person_id!r} ignored")
+            return
+        record.setdefault("dialogues", []).extend(entries)
+        record.update(fields or {})
+        self.save(record)
+
+    def delete(self, person_id: str) -> bool:
+        raise NotImplementedError
+
+    def sync(self):
+        """Called after each batch of writes (e.g. to persist an index)."""
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# JSON files (original format)
+# ---------------------------------------------------------------------------
+
+class JsonPeopleStore(PeopleStore):
+    """One pretty-printed JSON file per person, written atomically.
+
+    The index lives in ``people.idx`` with each file's mtime; at load only
+    files whose mtime changed (or that are new) are parsed, so a crash or
+    a hand-edited record just costs re-reading those files.
+    """
+
+    name = "json"
+
+    def __init__(self, storage_dir: str):
+        self.storage_dir = storage_dir
+        self._lock = threading.Lock()
+        self._index: dict[str, dict] = {}
+        self._index_dirty = False
+
+    def _path(self, person_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{person_id}.json")
+
+    def _read(self, person_id: str) -> Optional[dict]:
+        with open(self._path(person_id), "r") as f:
+            content = f.read().strip()
+        if not content:
+            raise ValueError("empty file")
+        data = json.loads(content)
+        data["persistent_id"] = person_id
+        return data
+
+    def load_all(self) -> dict:
+        os.makedirs(self.storage_dir, exist_ok=True)
+        records = {}
+        for fname in os.listdir(self.storage_dir):
+            if not fname.endswith(".json"):
+                continue
+            pid = fname[:-5]
+            try:
+                records[pid] = self._read(pid)
+            except Exception as e:
+                logger.warning(f"Failed to load {self._path(pid)}: {e}, creating skeleton record")
+                records[pid] = {"persistent_id": pid, "name": None}
+        return records
+
+    def load_index(self) -> dict:
+        os.makedirs(self.storage_dir, exist_ok=True)
+        index_path = os.path.join(self.storage_dir, INDEX_FILENAME)
+        try:
+            with open(index_path, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        index, reread = {}, 0
+        with os.scandir(self.storage_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                pid = entry.name[:-5]
+                mtime = entry.stat().st_mtime_ns
+                item = cached.get(pid)
+                if item is None or item.get("mtime_ns") != mtime:
+                    try:
+                        record = self._read(pid)
+                    except Exception as e:
+                        logger.warning(f"Failed to load {entry.path}: {e}, indexing as unnamed")
+                        record = {"persistent_id": pid, "name": None}
+                    item = {**index_entry(record), "mtime_ns": mtime}
+                    reread += 1
+                index[pid] = item
+        with self._lock:
+            self._index = index
+            self._index_dirty = reread > 0 or len(cached) != len(index)
+        if reread:
+            logger.info(f"Indexed {reread} changed people records")
+        self.sync()
+        return {pid: {k: v for k, v in item.items() if k != "mtime_ns"}
+                for pid, item in index.items()}
+
+    def get(self, person_id: str) -> Optional[dict]:
+        try:
+            return self._read(person_id)
+        except FileNotFoundError:
+            return None
+
+    def save(self, record: dict):
+        os.makedirs(self.storage_dir, exist_ok=True)
+        fpath = self._path(record["persistent_id"])
+        tmp_path = fpath + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(record, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, fpath)
+            self._index[record["persistent_id"]] = {
+                **index_entry(record), "mtime_ns": os.stat(fpath).st_mtime_ns}
+            self._index_dirty = True
+
+    def delete(self, person_id: str) -> bool:
+        fpath = self._path(person_id)
+        with self._lock:
+            if self._index.pop(person_id, None) is not None:
+                self._index_dirty = True
+        if os.path.exists(fpath):
+            os.remove(fpath)
+            return True
+        return False
+
+    def sync(self):
+        """Rewrite ``people.idx`` if any record changed since the last sync."""
+        with self._lock:
+            if not self._index_dirty:
+                return
+            index_path = os.path.join(self.storage_dir, INDEX_FILENAME)
+            try:
+                with open(index_path + ".tmp", "w") as f:
+                    json.dump(self._index, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(index_path + ".tmp", index_path)
+                self._index_dirty = False
+            except OSError as e:
+                logger.warning(f"Failed to write {index_path}: {e}")
+
+    def close(self):
+        self.sync()
+
+
+# ---------------------------------------------------------------------------
+# SQLite (WAL)
+# ---------------------------------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    person_id   TEXT PRIMARY KEY,
+    name        TEXT,
+    first_met   REAL NOT NULL DEFAULT 0,
+    last_seen   REAL NOT NULL DEFAULT 0,
+    last_talked REAL NOT NULL DEFAULT 0,
+    times_seen  INTEGER NOT NULL DEFAULT 0,
+    emotion     TEXT NOT NULL DEFAULT '',
+    summary     TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS facts (
+    person_id TEXT NOT NULL REFERENCES people(person_id) ON DELETE CASCADE,
+    seq       INTEGER NOT NULL,
+    fact      TEXT NOT NULL,
+    PRIMARY KEY (person_id, seq)
+);
+CREATE TABLE IF NOT EXISTS topics (
+    person_id TEXT NOT NULL REFERENCES people(person_id) ON DELETE CASCADE,
+    seq       INTEGER NOT NULL,
+    topic     TEXT NOT NULL,
+    PRIMARY KEY (person_id, seq)
+);
+CREATE TABLE IF NOT EXISTS dialogues (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    person_id TEXT NOT NULL REFERENCES people(person_id) ON DELETE CASCADE,
+    timestamp REAL NOT NULL,
+    speaker   TEXT NOT NULL,
+    text      TEXT NOT NULL,
+    language  TEXT NOT NULL DEFAULT '',
+    emotion   TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS dialogues_by_person ON dialogues (person_id, id);
+"""
+
+
+class SqlitePeopleStore(PeopleStore):
+    """SQLite database in WAL mode; one connection shared under a lock.
+
+    ``synchronous=NORMAL`` keeps commits cheap: with WAL a power loss can
+    drop the last transactions but cannot corrupt the database.
+    """
+
+    name = "sqlite"
+    incremental = True
+
+    def __init__(self, storage_dir: str, filename: str = SQLITE_FILENAME,
+                 import_json: bool = True):
+        self.storage_dir = storage_dir
+        self.path = os.path.join(storage_dir, filename)
+        os.makedirs(storage_dir, exist_ok=True)
+        is_new = not os.path.exists(self.path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        if is_new and import_json:
+            n = migrate_json_to_sqlite(storage_dir, self)
+            if n:
+                logger.info(f"Imported {n} JSON people records into {self.path}")
+
+    # --- Reads ---
+
+    def _records(self, where: str = "", args: tuple = ()) -> dict:
+        cols = ", ".join(_SCALARS)
+        records = {}
+        for row in self._db.execute(f"SELECT person_id, {cols} FROM people {where}", args):
+            record = {"persistent_id": row[0], **dict(zip(_SCALARS, row[1:])),
+                      "facts": [], "asked_topics": [], "dialogues": []}
+            records[row[0]] = record
+        if not records:
+            return records
+        pid_filter = f"WHERE person_id = ?" if args else ""
+        for pid, fact in self._db.execute(
+                f"SELECT person_id, fact FROM facts {pid_filter} ORDER BY person_id, seq", args):
+            if pid in records:
+                records[pid]["facts"].append(fact)
+        for pid, topic in self._db.execute(
+                f"SELECT person_id, topic FROM topics {pid_filter} ORDER BY person_id, seq", args):
+            if pid in records:
+                records[pid]["asked_topics"].append(topic)
+        for row in self._db.execute(
+                f"SELECT person_id, {', '.join(_DIALOGUE_KEYS)} FROM dialogues {pid_filter} "
+                f"ORDER BY id", args):
+            if row[0] in records:
+                records[row[0]]["dialogues"].append(dict(zip(_DIALOGUE_KEYS, row[1:])))
+        return records
+
+    def load_all(self) -> dict:
+        with self._lock:
+            return self._records()
+
+    def load_index(self) -> dict:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT person_id, name, last_seen, "
+                "(SELECT COUNT(*) FROM facts f WHERE f.person_id = p.person_id) "
+                "FROM people p").fetchall()
+        return {pid: {"persistent_id": pid, "name": name, "last_seen": last_seen,
+                      "n_facts": n_facts}
+                for pid, name, last_seen, n_facts in rows}
+
+    def get(self, person_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._records("WHERE person_id = ?", (person_id,)).get(person_id)
+
+    # --- Writes ---
+
+    def _upsert_scalars(self, person_id: str, fields: dict):
+        cols = [k for k in _SCALARS if k in fields]
+        if not cols:
+            self._db.execute("INSERT OR IGNORE INTO people (person_id) VALUES (?)", (person_id,))
+            return
+        values = [fields[k] if fields[k] is not None or k == "name" else _SCALAR_DEFAULTS[k]
+                  for k in cols]
+        updates = ", ".join(f"{k} = excluded.{k}" for k in cols)
+        self._db.execute(
+            f"INSERT INTO people (person_id, {', '.join(cols)}) "
+            f"VALUES (?, {', '.join('?' * len(cols))}) "
+            f"ON CONFLICT(person_id) DO UPDATE SET {updates}",
+            (person_id, *values))
+
+    def _replace_list(self, table: str, column: str, person_id: str, items: list):
+        self._db.execute(f"DELETE FROM {table} WHERE person_id = ?", (person_id,))
+        self._db.executemany(
+            f"INSERT INTO {table} (person_id, seq, {column}) VALUES (?, ?, ?)",
+            [(person_id, i, item) for i, item in enumerate(items)])
+
+    def _insert_dialogues(self, person_id: str, entries: list):
+        self._db.executemany(
+            f"INSERT INTO dialogues (person_id, {', '.join(_DIALOGUE_KEYS)}) "
+            f"VALUES (?, ?, ?, ?, ?, ?)",
+            [(person_id, *(e.get(k, "") for k in _DIALOGUE_KEYS)) for e in entries])
+
+    def _write_fields(self, person_id: str, fields: dict):
+        self._upsert_scalars(person_id, fields)
+        if "facts" in fields:
+            self._replace_list("facts", "fact", person_id, fields["facts"])
+        if "asked_topics" in fields:
+            self._replace_list("topics", "topic", person_id, fields["asked_topics"])
+
+    def save(self, record: dict):
+        pid = record["persistent_id"]
+        with self._lock, self._db:
+            self._write_fields(pid, {**_SCALAR_DEFAULTS, "facts": [], "asked_topics": [],
+                                     **record})
+            self._db.execute("DELETE FROM dialogues WHERE person_id = ?", (pid,))
+            self._insert_dialogues(pid, record.get("dialogues", []))
+
+    def update(self, person_id: str, fields: dict):
+        with self._lock, self._db:
+            self._write_fields(person_id, fields)
+
+    def append_dialogues(self, person_id: str, entries: list, fields: Optional[dict] = None):
+        with self._lock, self._db:
+            self._write_fields(person_id, fields or {})
+            self._insert_dialogues(person_id, entries)
+
+    def delete(self, person_id: str) -> bool:
+        with self._lock, self._db:
+            cur = self._db.execute("DELETE FROM people WHERE person_id = ?", (person_id,))
+        return cur.rowcount > 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {t: self._db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                      for t in ("people", "facts", "topics", "dialogues")}
+        size = sum(os.path.getsize(self.path + ext) for ext in ("", "-wal")
+                   if os.path.exists(self.path + ext))
+        return {**counts, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            try:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.warning(f"WAL checkpoint failed: {e}")
+            self._db.close()
+
+
+STORES = {
+    "json": JsonPeopleStore,
+    "sqlite": SqlitePeopleStore,
+}
+
+
+def make_people_store(storage_dir: str, backend: str = "json") -> PeopleStore:
+    if backend not in STORES:
+        raise ValueError(f"unknown people store {backend!r} (expected one of {sorted(STORES)})")
+    return STORES[backend](storage_dir)
+
+
+def migrate_json_to_sqlite(storage_dir: str, store: Optional[SqlitePeopleStore] = None) -> int:
+    """Copy every ``{storage_dir}/*.json`` record into the sqlite store.
+
+    Records already in the database are overwritten. Returns the count.
+    """
+    records = JsonPeopleStore(storage_dir).load_all()
+    own = store is None
+    store = store or SqlitePeopleStore(storage_dir, import_json=False)
+    try:
+        for record in records.values():
+            store.save(record)
+    finally:
+        if own:
+            store.close()
+    return len(records)
+
+
+# ---------------------------------------------------------------------------
+# Standalone
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="People store tools")
+    parser.add_argument("--dir", default="people", help="Storage directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="Record counts per backend")
+    migrate_p = sub.add_parser("migrate", help="Import people/*.json into people.sqlite3")
+    migrate_p.add_argument("--force", action="store_true",
+                           help="Re-import even if the database already exists")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    db_path = os.path.join(args.dir, SQLITE_FILENAME)
+    if args.command == "info":
+        n_json = len([f for f in os.listdir(args.dir) if f.endswith(".json")]) \
+            if os.path.isdir(args.dir) else 0
+        print(f"json:   {n_json} files in {args.dir}/")
+        if os.path.exists(db_path):
+            store = SqlitePeopleStore(args.dir, import_json=False)
+            s = store.stats()
+            store.close()
+            print(f"sqlite: {s['people']} people, {s['facts']} facts, {s['topics']} topics, "
+                  f"{s['dialogues']} dialogue lines, {s['bytes'] / 1e6:.2f} MB ({db_path})")
+        else:
+            print(f"sqlite: no database at {db_path}")
+    elif args.command == "migrate":
+        if os.path.exists(db_path) and not args.force:
+            raise SystemExit(f"{db_path} exists; pass --force to re-import")
+        t0 = time.perf_counter()
+        n = migrate_json_to_sqlite(args.dir)
+        print(f"Imported {n} people into {db_path} in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+"""
+Deterministic replay of recorded clips through FaceTracker.
+
+Reads a video file or a directory of images (sorted by name), feeds every
+frame to ``FaceTracker.process_frame`` and records all ``FaceEvent``s.
+The tracker runs on a ``ReplayClock`` driven by frame timestamps
+(``index / fps``) instead of ``time.time()``, so confirm/revoke
+hysteresis, focus switching and event timestamps depend only on the
+clip, not on how fast this machine processes it. Auto-enrollment writes
+into a scratch copy of the gallery unless ``--keep-db`` is given.
+
+The report covers:
+    throughput       frames per wall-clock second, and realtime factor
+    stages           per-stage latency percentiles (``tracker.metrics()``)
+    identity         switches (a track's person_id changing A -> B),
+                     losses, and time-to-confirm per track (clip seconds
+                     from FACE_APPEARED to the first identity)
+
+Annotated clips double as regression fixtures. An annotation file holds
+ground truth per frame and the thresholds the run must meet; any failed
+check makes the process exit non-zero:
+
+    {
+      "frames": {"12": [{"box": [top, right, bottom, left], "person_id": "p1"}]},
+      "expect": {"min_recall": 0.9, "min_id_accuracy": 0.95,
+                 "max_identity_switches": 0, "max_time_to_confirm_s": 1.0,
+                 "max_stage_p95_ms": {"detect": 60}}
+    }
+
+Box-only files in the ``face_detectors.py`` format (``{"12": [[t, r, b, l]]}``)
+are accepted too.
+
+Can be run standalone:
+    python replay.py clip.mp4 [--annotations clip.json] [--events events.jsonl]
+                     [--report report.json] [--replay-fps 30] [--max-frames N]
+    python face_tracker.py --replay clip.mp4     (same, with the tracker's flags)
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+import cv2
+import numpy as np
+
+from face_detectors import iou
+
+logger = logging.getLogger("replay")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+DEFAULT_IMAGE_FPS = 15.0
+
+
+# ---------------------------------------------------------------------------
+# Clock and frame sources
+# ---------------------------------------------------------------------------
+
+class ReplayClock:
+    """A clock that only moves when the replay loop sets it.
+
+    Pass it as ``FaceTracker(clock=...)``; ``start`` anchors clip time 0
+    (0.0 for benchmarks, ``time.time()`` when the rest of the app compares
+    tracker timestamps with the wall clock).
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.start = start
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def set(self, clip_seconds: float):
+        self.now = self.start + clip_seconds
+
+
+class FrameSource:
+    """Frames of a video file or an image directory with clip timestamps.
+
+    Iterating yields ``(index, clip_seconds, frame)``. Timestamps are
+    ``index / fps``: the container's frame rate for videos (``fps``
+    overrides it), ``fps`` or ``DEFAULT_IMAGE_FPS`` for image directories.
+    """
+
+    def __init__(self, path: str, fps: float = 0.0, max_frames: int = 0):
+        self.path = path
+        self.max_frames = max_frames
+        self._cap = None
+        self._files: list[str] = []
+        if os.path.isdir(path):
+            self._files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(IMAGE_EXTENSIONS))
+            if not self._files:
+                raise ValueError(f"no images in {path}")
+            self.fps = fps or DEFAULT_IMAGE_FPS
+        else:
+            self._cap = cv2.VideoCapture(path)
+            if not self._cap.isOpened():
+                raise ValueError(f"could not open {path}")
+            self.fps = fps or self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def __iter__(self) -> Iterator[tuple[int, float, np.ndarray]]:
+        index = 0
+        while not self.max_frames or index < self.max_frames:
+            if self._cap is not None:
+                ok, frame = self._cap.read()
+                if not ok:
+                    break
+            else:
+                if index >= len(self._files):
+                    break
+                frame = cv2.imread(self._files[index])
+                if frame is None:
+                    logger.warning(f"Skipping unreadable image {self._files[index]}")
+                    index += 1
+                    continue
+            yield index, index / self.fps, frame
+            index += 1
+
+    def close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+def scratch_db_dir(db_dir: str) -> str:
+    """Copy a gallery to a temp dir so a replay cannot modify it.
+
+    Face snapshots (``*.jpg``) are not copied; only the gallery files.
+    """
+    dst = tempfile.mkdtemp(prefix="replay_db_")
+    if os.path.isdir(db_dir):
+        shutil.copytree(db_dir, dst, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns("*.jpg"))
+    return dst
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ReplayResult:
+    source: str
+    fps: float
+    frames: int = 0
+    clip_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    events: list = field(default_factory=list)       # (frame_index, FaceEvent)
+    tracks: dict = field(default_factory=dict)       # frame_index -> [(track_id, bbox, person_id)]
+    metrics: dict = field(default_factory=dict)
+
+
+class ReplayRecorder:
+    """Collects every FaceEvent (synchronously, in order) with its frame index."""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.frame_index = 0
+        self.events: list = []
+        self._unsubscribe = tracker.subscribe(self._on_event)
+
+    def _on_event(self, event):
+        self.events.append((self.frame_index, event))
+
+    def snapshot_tracks(self, faces) -> list:
+        return [(f.track_id, tuple(int(v) for v in f.bbox), self.tracker.get_person_id(f.track_id))
+                for f in faces if f.is_visible]
+
+    def close(self):
+        self._unsubscribe()
+
+
+class ReplaySession:
+    """A ``cv2.VideoCapture``-like reader that also drives the clock and records.
+
+    ``read()`` advances the clock to the next frame's clip time; call
+    ``record(faces)`` with ``process_frame``'s result, and ``finish()`` at
+    the end. ``run()`` is the plain loop; ``main.py --replay`` uses a
+    session directly so its UI loop stays unchanged.
+    """
+
+    def __init__(self, tracker, clock: ReplayClock, source: FrameSource):
+        self.tracker = tracker
+        self.clock = clock
+        self.source = source
+        self.result = ReplayResult(source=source.path, fps=source.fps)
+        self._frames = iter(source)
+        self._index = -1
+        self._recorder = ReplayRecorder(tracker)
+        tracker.stage_metrics.reset()
+        self._t0 = time.perf_counter()
+
+    def read(self) -> tuple[bool, Optional[np.ndarray]]:
+        item = next(self._frames, None)
+        if item is None:
+            return False, None
+        self._index, clip_t, frame = item
+        self.clock.set(clip_t)
+        self._recorder.frame_index = self._index
+        self.result.clip_seconds = clip_t
+        return True, frame
+
+    def record(self, faces):
+        self.result.tracks[self._index] = self._recorder.snapshot_tracks(faces)
+        self.result.frames += 1
+
+    def finish(self) -> ReplayResult:
+        self.result.wall_seconds = time.perf_counter() - self._t0
+        self._recorder.close()
+        self.source.close()
+        self.result.events = self._recorder.events
+        self.result.metrics = self.tracker.metrics()
+        return self.result
+
+
+def run(tracker, clock: ReplayClock, source: FrameSource) -> ReplayResult:
+    """Drive ``tracker`` through every frame of ``source``."""
+    session = ReplaySession(tracker, clock, source)
+    try:
+        while True:
+            ok, frame = session.read()
+            if not ok:
+                break
+            session.record(tracker.process_frame(frame))
+    finally:
+        result = session.finish()
+    return result
+
+
+def write_events(result: ReplayResult, path: str):
+    """One JSON object per event: frame, clip time, type, track, payload."""
+    with open(path, "w") as f:
+        for index, e in result.events:
+            f.write(json.dumps({
+                "frame": index, "t": round(e.timestamp, 6), "type": e.type.name,
+                "track_id": e.track_id, "payload": dataclasses.asdict(e.payload),
+            }, default=str) + "\n")
+
+
+# ---------------------------------------------------------------------------
+# Report and regression checks
+# ---------------------------------------------------------------------------
+
+def identity_stats(result: ReplayResult) -> dict:
+    """Identity switches/losses and time-to-confirm, from recorded events.
+
+    A switch is a track's person_id changing from one person to another,
+    directly (IDENTITY_CHANGED) or via IDENTITY_LOST and a later
+    IDENTITY_CONFIRMED for someone else.
+    """
+    appeared: dict[int, float] = {}
+    confirm_s: dict[int, float] = {}
+    last_pid: dict[int, str] = {}
+    switches = losses = 0
+    for _, e in result.events:
+        name, tid, p = e.type.name, e.track_id, e.payload
+        if name == "FACE_APPEARED":
+            appeared[tid] = e.timestamp
+            if p.initial_person_id:
+                confirm_s[tid] = 0.0
+                last_pid[tid] = p.initial_person_id
+        elif name == "IDENTITY_CONFIRMED":
+            if tid in appeared and tid not in confirm_s:
+                confirm_s[tid] = e.timestamp - appeared[tid]
+            if last_pid.get(tid, p.person_id) != p.person_id:
+                switches += 1
+            last_pid[tid] = p.person_id
+        elif name == "IDENTITY_CHANGED":
+            switches += 1
+            last_pid[tid] = p.new_person_id
+        elif name == "IDENTITY_LOST":
+            losses += 1
+
+    times = sorted(confirm_s.values())
+    return {
+        "tracks": len(appeared),
+        "confirmed_tracks": len(times),
+        "identity_switches": switches,
+        "identity_losses": losses,
+        "time_to_confirm_s": {
+            "p50": times[len(times) // 2] if times else None,
+            "max": times[-1] if times else None,
+        },
+    }
+
+
+def _load_fixture(path: str) -> tuple[dict, dict]:
+    """Returns ``({frame: [(box, person_id|None), ...]}, expect)``."""
+    with open(path) as f:
+        raw = json.load(f)
+    frames = raw.get("frames", raw) if isinstance(raw, dict) else {}
+    expect = raw.get("expect", {}) if "frames" in raw else {}
+    truth = {}
+    for k, boxes in frames.items():
+        truth[int(k)] = [(tuple(b["box"]), b.get("person_id")) if isinstance(b, dict)
+                         else (tuple(b), None) for b in boxes]
+    return truth, expect
+
+
+def score_annotations(result: ReplayResult, truth: dict, iou_thresh: float = 0.5) -> dict:
+    """Track recall and identity accuracy against annotated boxes.
+
+    Each annotated box is greedily matched (one-to-one, IoU >= ``iou_thresh``)
+    to a visible track; identity accuracy counts matched boxes with an
+    annotated person_id whose track carries that person_id.
+    """
+    n_truth = hits = id_total = id_correct = 0
+    for index, expected in truth.items():
+        found = result.tracks.get(index)
+        if found is None:
+            continue
+        used = set()
+        for box, pid in expected:
+            n_truth += 1
+            best, best_iou = None, iou_thresh
+            for i, (_, bbox, _) in enumerate(found):
+                if i not in used and iou(bbox, box) >= best_iou:
+                    best, best_iou = i, iou(bbox, box)
+            if best is not None:
+                used.add(best)
+                hits += 1
+            if pid is not None:
+                id_total += 1
+                if best is not None and found[best][2] == pid:
+                    id_correct += 1
+    return {
+        "annotated_boxes": n_truth,
+        "recall": hits / n_truth if n_truth else None,
+        "id_accuracy": id_correct / id_total if id_total else None,
+    }
+
+
+def build_report(result: ReplayResult, truth: Optional[dict] = None) -> dict:
+    wall = result.wall_seconds or 1e-9
+    report = {
+        "source": result.source,
+        "frames": result.frames,
+        "clip_seconds": round(result.clip_seconds, 3),
+        "wall_seconds": round(result.wall_seconds, 3),
+        "fps": result.frames / wall,
+        "realtime_factor": (result.frames / result.fps) / wall if result.fps else None,
+        "events": len(result.events),
+        "stages": {name: {k: s[k] for k in ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms")}
+                   for name, s in result.metrics.get("stages", {}).items()},
+        "counters": result.metrics.get("counters", {}),
+    }
+    report.update(identity_stats(result))
+    if truth:
+        report.update(score_annotations(result, truth))
+    return report
+
+
+def check_expectations(report: dict, expect: dict) -> list[str]:
+    """Human-readable failures; empty when every expectation holds."""
+    failures = []
+
+    def at_least(key, value, limit):
+        if value is None or value < limit:
+            failures.append(f"{key}: {value} < {limit}")
+
+    def at_most(key, value, limit):
+        if value is None or value > limit:
+            failures.append(f"{key}: {value} > {limit}")
+
+    if "min_recall" in expect:
+        at_least("recall", report.get("recall"), expect["min_recall"])
+    if "min_id_accuracy" in expect:
+        at_least("id_accuracy", report.get("id_accuracy"), expect["min_id_accuracy"])
+    if "max_identity_switches" in expect:
+        at_most("identity_switches", report["identity_switches"], expect["max_identity_switches"])
+    if "max_time_to_confirm_s" in expect:
+        at_most("time_to_confirm_s.max", report["time_to_confirm_s"]["max"],
+                expect["max_time_to_confirm_s"])
+    if "min_fps" in expect:
+        at_least("fps", report["fps"], expect["min_fps"])
+    for stage, limit in expect.get("max_stage_p95_ms", {}).items():
+        s = report["stages"].get(stage)
+        at_most(f"{stage}.p95_ms", s["p95_ms"] if s else None, limit)
+    return failures
+
+
+def format_report(report: dict) -> str:
+    from metrics import format_summary
+    ttc = report["time_to_confirm_s"]
+    lines = [
+        f"{report['source']}: {report['frames']} frames, {report['clip_seconds']:.1f}s clip "
+        f"in {report['wall_seconds']:.1f}s",
+        f"  throughput {report['fps']:.1f} fps"
+        + (f"  ({report['realtime_factor']:.2f}x realtime)" if report["realtime_factor"] else ""),
+        f"  tracks {report['tracks']}  confirmed {report['confirmed_tracks']}  "
+        f"switches {report['identity_switches']}  losses {report['identity_losses']}",
+    ]
+    if ttc["p50"] is not None:
+        lines.append(f"  time-to-confirm p50 {ttc['p50']:.2f}s  max {ttc['max']:.2f}s")
+    if report.get("recall") is not None:
+        lines.append(f"  recall {report['recall']:.1%}"
+                     + (f"  id accuracy {report['id_accuracy']:.1%}"
+                        if report.get("id_accuracy") is not None else ""))
+    lines.append("  stages:")
+    lines.append(format_summary({"stages": report["stages"]}))
+    return "\n".join(lines)
+
+
+def finish(result: ReplayResult, annotations: str = "", events_path: str = "",
+           report_path: str = "") -> int:
+    """Print/write the report and check fixture expectations. Returns an exit code."""
+    truth, expect = _load_fixture(annotations) if annotations else ({}, {})
+    report = build_report(result, truth)
+    print(format_report(report))
+    if events_path:
+        write_events(result, events_path)
+    failures = check_expectations(report, expect)
+    report["failures"] = failures
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+    for msg in failures:
+        print(f"  FAIL {msg}")
+    if expect and not failures:
+        print("  all expectations met")
+    return 1 if failures else 0
+
+
+# ---------------------------------------------------------------------------
+# Standalone
+# ---------------------------------------------------------------------------
+
+def add_replay_arguments(parser: argparse.ArgumentParser):
+    """Flags shared by ``replay.py`` and ``face_tracker.py --replay``."""
+    parser.add_argument("--annotations", default="",
+                        help="Fixture JSON with ground truth and expectations (see replay.py)")
+    parser.add_argument("--events", default="", help="Write recorded events to this JSONL file")
+    parser.add_argument("--report", default="", help="Write the report to this JSON file")
+    parser.add_argument("--replay-fps", type=float, default=0.0,
+                        help="Clip frame rate (default: from the video, 15 for image dirs)")
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--keep-db", action="store_true",
+                        help="Let auto-enrollment write to the real gallery")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a clip through FaceTracker")
+    parser.add_argument("source", help="Video file or directory of images")
+    parser.add_argument("--db-dir", default="known_faces", help="Face database directory")
+    parser.add_argument("--scale", type=float, default=0.5, help="Detection scale factor")
+    parser.add_argument("--no-emotion", action="store_true", help="Disable emotion detection")
+    parser.add_argument("--detector", choices=["hog", "yunet", "onnx"], default="hog")
+    parser.add_argument("--embedder", choices=["dlib", "onnx"], default=None,
+                        help="Embedding backend (default: [embedder] in face_config.toml)")
+    parser.add_argument("--lazy-encoding", action="store_true")
+    parser.add_argument("--max-detect-interval", type=int, default=4)
+    parser.add_argument("--no-motion", action="store_true")
+    add_replay_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(message)s")
+
+    from face_config import get_embedder_config
+    from face_detectors import make_detector
+    from face_embedders import make_embedder
+    from face_tracker import EmotionDetector, FaceDatabase, FaceTracker
+
+    db_dir = args.db_dir if args.keep_db else scratch_db_dir(args.db_dir)
+    embedder_config = dict(get_embedder_config())
+    if args.embedder:
+        embedder_config["backend"] = args.embedder
+    embedder = make_embedder(embedder_config)
+    face_db = FaceDatabase(db_dir=db_dir, tolerance=embedder.tolerance, metric=embedder.metric)
+    face_db.load()
+    clock = ReplayClock()
+    tracker = FaceTracker(db=face_db,
+                          emotion_detector=None if args.no_emotion else EmotionDetector(),
+                          frame_scale=args.scale,
+                          detector=make_detector({"backend": args.detector}),
+                          embedder=embedder,
+                          lazy_encoding=args.lazy_encoding,
+                          max_detect_interval=args.max_detect_interval,
+                          motion_propagation=not args.no_motion,
+                          clock=clock)
+    try:
+        result = run(tracker, clock, FrameSource(args.source, args.replay_fps, args.max_frames))
+    finally:
+        face_db.close()
+        if db_dir != args.db_dir:
+            shutil.rmtree(db_dir, ignore_errors=True)
+    raise SystemExit(finish(result, args.annotations, args.events, args.report))
+
+
+if __name__ == "__main__":
+    main()
@@ -28,7 +28,7 @@ from typing import Optional, Callable, Union
 import sounddevice as sd
 from faster_whisper import WhisperModel
 
-from events import EventDispatcher
+from events import EventDispatcher, EventLogger
 
 logger = logging.getLogger("voice_input")
 
@@ -491,12 +491,13 @@ class VoiceInput:
         self.detected_language_prob: float = 0.0
 
         self._dispatcher = EventDispatcher(owner="voice_input")
+        self._event_log = EventLogger(logger)
 
     # --- Event API ---
 
     def subscribe(self, callback: VoiceEventCallback,
-                  event_types: Optional[set] = None) -> Callable[[], None]:
-        return self._dispatcher.subscribe(callback, event_types)
+                  event_types: Optional[set] = None, **delivery) -> Callable[[], None]:
+        return self._dispatcher.subscribe(callback, event_types, **delivery)
 
     def unsubscribe(self, callback: VoiceEventCallback) -> bool:
         return self._dispatcher.unsubscribe(callback)
@@ -785,7 +786,7 @@ class VoiceInput:
 
     def _emit(self, etype, payload):
         event = VoiceEvent(type=etype, timestamp=time.time(), payload=payload)
-        logger.info(f"[{etype.name}] {payload}")
+        self._event_log.log(etype, payload)
         self._dispatcher.dispatch(event)
 
 
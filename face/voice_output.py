@@ -26,7 +26,7 @@ from typing import Optional, Callable, Union
 import sounddevice as sd
 from piper import PiperVoice
 
-from events import EventDispatcher
+from events import EventDispatcher, EventLogger
 
 logger = logging.getLogger("voice_output")
 
@@ -134,12 +134,13 @@ class VoiceOutput:
         self._interrupted = False
         self._lock = threading.Lock()
         self._dispatcher = EventDispatcher(owner="voice_output")
+        self._event_log = EventLogger(logger)
 
     # --- Event API ---
 
     def subscribe(self, callback: TtsEventCallback,
-                  event_types: Optional[set] = None) -> Callable[[], None]:
-        return self._dispatcher.subscribe(callback, event_types)
+                  event_types: Optional[set] = None, **delivery) -> Callable[[], None]:
+        return self._dispatcher.subscribe(callback, event_types, **delivery)
 
     def unsubscribe(self, callback: TtsEventCallback) -> bool:
         return self._dispatcher.unsubscribe(callback)
@@ -337,7 +338,7 @@ class VoiceOutput:
 
     def _emit(self, etype, payload):
         event = TtsEvent(type=etype, timestamp=time.time(), payload=payload)
-        logger.info(f"[{etype.name}] {payload}")
+        self._event_log.log(etype, payload)
         self._dispatcher.dispatch(event)
 
 